@@ -92,7 +92,7 @@ class LikeMeditationInline(admin.TabularInline):
 
 class MeditationGenerateAdmin(admin.ModelAdmin):
     list_display = ('user', 'details_name', 'ritual_type_name', 'details_tone', 'details_voice', 'details_duration', 'file', 'created_at', 'is_deleted')
-    list_filter = ('ritual_type', 'created_at', 'details__ritual_type', 'details__tone', 'details__voice', 'details__duration', 'is_deleted')
+    list_filter = ('ritual_type', 'created_at', 'details__ritual_type', 'details__tone', 'details__voice', 'details__duration', 'is_deleted', 'is_pregenerated', 'is_fallback')
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'details__name', 'details__description', 'ritual_type__name', 'ritual_type__description')
     ordering = ('-created_at',)
     list_select_related = ('user', 'details', 'ritual_type')
@@ -105,11 +105,12 @@ class MeditationGenerateAdmin(admin.ModelAdmin):
         (_('Ritual Type Information'), {
             'fields': ('ritual_type_name_display', 'ritual_type_description_display'),
         }),
-        (_('File'), {'fields': ('file',)}),
-        (_('Status'), {'fields': ('is_deleted',)}),
+        (_('File'), {'fields': ('file', 'speech_file', 'music_bed', 'music_gain', 'speech_gain')}),
+        (_('Script'), {'fields': ('script',), 'classes': ('collapse',)}),
+        (_('Status'), {'fields': ('is_deleted', 'is_preview', 'hls_playlist', 'is_pregenerated', 'pregenerated_at', 'profile_fingerprint', 'is_fallback', 'fallback_reason')}),
         (_('Timestamps'), {'fields': ('created_at', 'updated_at'), 'classes': ('collapse',)}),
     )
-    readonly_fields = ('created_at', 'updated_at', 'details_name_display', 'details_description_display', 'details_tone_display', 'details_voice_display', 'details_duration_display', 'ritual_type_name_display', 'ritual_type_description_display')
+    readonly_fields = ('created_at', 'updated_at', 'pregenerated_at', 'profile_fingerprint', 'details_name_display', 'details_description_display', 'details_tone_display', 'details_voice_display', 'details_duration_display', 'ritual_type_name_display', 'ritual_type_description_display')
     inlines = [LikeMeditationInline]
     
     def details_name(self, obj):
@@ -288,6 +289,7 @@ class PlansAdmin(admin.ModelAdmin):
     fieldsets = (
         (None, {'fields': ('name', 'price')}),
         (_('Plan Type'), {'fields': ('is_monthly', 'is_annual', 'is_free_trial', 'discount')}),
+        (_('Generation Limits'), {'fields': ('generations_per_hour', 'generation_burst', 'max_concurrent_generations', 'plan_generations_per_hour')}),
     )
     inlines = [PlanDescriptionInline]
     
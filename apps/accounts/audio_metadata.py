@@ -0,0 +1,58 @@
+import logging
+
+from apps.accounts.generate.mp3_scan import scan_mp3, InvalidAudioError
+
+logger = logging.getLogger(__name__)
+
+AUDIO_METADATA_FIELDS = ['duration_seconds', 'bitrate_kbps', 'frame_count', 'file_size']
+
+
+def clear_audio_metadata(instance):
+    for field in AUDIO_METADATA_FIELDS:
+        setattr(instance, field, None)
+
+
+def update_audio_metadata(instance, force=False):
+    """
+    Fill duration, bitrate, frame count and size of instance.file from its MP3 frame headers.
+
+    Runs on files that are about to be saved (not yet committed to
+    storage) and on stored files that have no metadata yet, or always with
+    force=True. Non-MP3 or unreadable files get empty metadata.
+
+    Args:
+        instance: MeditationGenerate or MeditationLibrary
+        force: Rescan a stored file even if metadata is present
+
+    Returns:
+        bool: Whether the metadata fields were (re)computed
+    """
+    field_file = instance.file
+    if not field_file:
+        clear_audio_metadata(instance)
+        return True
+    if field_file._committed and instance.duration_seconds is not None and not force:
+        return False
+    if not field_file.name.lower().endswith('.mp3'):
+        clear_audio_metadata(instance)
+        return True
+
+    try:
+        if field_file._committed:
+            with field_file.storage.open(field_file.name, 'rb') as f:
+                info = scan_mp3(f)
+        else:
+            content = field_file.file
+            content.seek(0)
+            info = scan_mp3(content)
+            content.seek(0)
+    except (InvalidAudioError, OSError) as e:
+        logger.warning(f"Could not read audio metadata of {field_file.name}: {str(e)}")
+        clear_audio_metadata(instance)
+        return True
+
+    instance.duration_seconds = round(info.duration_seconds, 3)
+    instance.bitrate_kbps = info.bitrate_kbps
+    instance.frame_count = info.frame_count
+    instance.file_size = info.size
+    return True
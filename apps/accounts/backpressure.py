@@ -0,0 +1,94 @@
+import logging
+import math
+
+from django.conf import settings
+
+from apps.accounts.generate.timing import stage_stats
+from apps.accounts.scheduling import generation_scheduler
+from config.exceptions import GenerationCapacityError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGE_SECONDS = {
+    'llm': 20,
+    'tts': 60,
+    'mix': 10,
+}
+
+
+class GenerationLoadEstimator:
+    """
+    Estimate generation completion time from queue depth and recent stage durations.
+
+    A job's expected duration is the sum of the moving averages of the LLM, TTS
+    and mix stages (or of the whole external API round trip). A new request
+    waits for the jobs ahead of it in the scheduler to drain through the
+    available slots. When the estimate exceeds GENERATION_MAX_ESTIMATED_WAIT,
+    requests are shed with a 503 instead of piling up as stuck workers.
+    """
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler or generation_scheduler
+        self.stage_defaults = getattr(settings, 'GENERATION_STAGE_DEFAULT_SECONDS', DEFAULT_STAGE_SECONDS)
+        self.max_wait = getattr(settings, 'GENERATION_MAX_ESTIMATED_WAIT', 600)
+
+    def expected_job_seconds(self, pipeline='local'):
+        """
+        Expected duration of one generation for the given pipeline ('local' or 'external').
+        """
+        local_seconds = sum(
+            stage_stats.get(stage, default) for stage, default in self.stage_defaults.items()
+        )
+        if pipeline == 'external':
+            return stage_stats.get('external', local_seconds)
+        return local_seconds
+
+    def estimate(self, user, pipeline='local'):
+        """
+        Estimate how long a new generation request from the user would take.
+
+        Returns:
+            dict: Queue depth, jobs ahead and estimated queue/completion seconds.
+        """
+        slots = max(1, self.scheduler.max_concurrency)
+        job_seconds = self.expected_job_seconds(pipeline)
+        jobs_ahead = self.scheduler.jobs_ahead(user)
+
+        # Jobs ahead drain through the slots in waves of job_seconds each
+        waves = max(0, math.ceil((jobs_ahead - slots + 1) / slots))
+        queue_seconds = waves * job_seconds
+
+        return {
+            'queue_depth': self.scheduler.queue_depth(),
+            'jobs_ahead': jobs_ahead,
+            'expected_job_seconds': round(job_seconds, 1),
+            'estimated_queue_seconds': round(queue_seconds, 1),
+            'estimated_completion_seconds': round(queue_seconds + job_seconds, 1),
+        }
+
+    def admit(self, user, pipeline='local'):
+        """
+        Check the estimate against the load-shedding threshold.
+
+        Returns:
+            dict: The estimate for an admitted request.
+
+        Raises:
+            GenerationCapacityError: With a Retry-After hint in `wait` when overloaded.
+        """
+        estimate = self.estimate(user, pipeline)
+        eta = estimate['estimated_completion_seconds']
+        if eta > self.max_wait:
+            retry_after = max(estimate['expected_job_seconds'], eta - self.max_wait)
+            logger.warning(
+                f"Shedding generation request: estimated {eta:.0f}s exceeds {self.max_wait}s "
+                f"({estimate['jobs_ahead']} jobs ahead)"
+            )
+            raise GenerationCapacityError(
+                f"Meditation generation is busy (estimated wait {math.ceil(eta)}s). Please try again later.",
+                wait=retry_after
+            )
+        return estimate
+
+
+generation_estimator = GenerationLoadEstimator()
@@ -0,0 +1,208 @@
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.accounts.generate.dsp_pool import DSPQueueFullError
+from apps.accounts.generate.llm_router import AllBackendsFailedError
+from apps.accounts.generate.metrics import meditation_fallbacks
+from apps.accounts.generate.mp3_scan import scan_mp3, InvalidAudioError
+from apps.accounts.generate.synthesis import is_throttle
+from apps.accounts.models import MeditationGenerate
+from config.exceptions import GenerationCapacityError
+
+logger = logging.getLogger(__name__)
+
+# Shared pre-rendered files live here; records point at them instead of holding copies
+FALLBACK_DIRECTORY = 'meditations/fallback'
+DEFAULT_FALLBACK_CATALOG = [
+    {
+        'plan_type': 'Sleep Manifestation',
+        'voice': 'female',
+        'duration': 2,
+        'source': os.path.join(os.path.dirname(__file__), 'muzic', 'sleep_manifestation.mp3'),
+    },
+]
+# ElevenLabs detail statuses meaning the account is out of credits (engages the tier for everyone)
+QUOTA_STATUSES = {'quota_exceeded'}
+QUOTA_KEY = 'meditation-fallback:quota'
+
+
+def fallback_reason(error):
+    """
+    Classify a generation failure for the fallback tier.
+
+    Only exhausted credits (402 or quota_exceeded) count as QUOTA, which
+    engages the tier for every user; concurrency and rate throttles (429,
+    too_many_concurrent_requests, system_busy) are OVERLOAD and only affect
+    the failing request. The wrapped exception chain is searched too, since
+    the plan type functions re-raise ElevenLabs errors as plain Exceptions.
+
+    Returns:
+        str: A MeditationGenerate.FallbackReason value
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (DSPQueueFullError, GenerationCapacityError, AllBackendsFailedError)):
+            return MeditationGenerate.FallbackReason.OVERLOAD
+        body = getattr(error, 'body', None)
+        detail = body.get('detail') if isinstance(body, dict) else None
+        detail_status = detail.get('status') if isinstance(detail, dict) else None
+        if detail_status in QUOTA_STATUSES or getattr(error, 'status_code', None) == 402:
+            return MeditationGenerate.FallbackReason.QUOTA
+        if is_throttle(error):
+            # Still throttled after the TTS retries
+            return MeditationGenerate.FallbackReason.OVERLOAD
+        error = error.__cause__ or error.__context__
+    return MeditationGenerate.FallbackReason.ERROR
+
+
+class FallbackEntry:
+    """
+    A pre-rendered meditation in the fallback catalog, with its MP3 metadata.
+    """
+
+    def __init__(self, plan_type, voice, duration, name, info):
+        self.plan_type = plan_type
+        self.voice = voice
+        self.duration = duration
+        self.name = name
+        self.info = info
+
+    def score(self, voice, duration):
+        # Voice matters most; the closest duration breaks ties
+        return (voice == self.voice, -abs(duration - self.duration))
+
+
+class FallbackCatalog:
+    """
+    Generic pre-rendered meditations served when personalized generation is shed.
+
+    Each catalog entry (plan type, voice, duration) is copied once into
+    media storage under FALLBACK_DIRECTORY and scanned once; fallback
+    MeditationGenerate records then reference that storage name with
+    is_fallback=True, so a failure costs a database row and no file I/O.
+    Only entries of the requested plan type are served; among them the
+    closest voice and duration is picked when there is no exact match.
+
+    When a provider reports exhausted quota, the tier stays engaged for
+    MEDITATION_FALLBACK_QUOTA_COOLDOWN seconds so requests in the meantime
+    do not spend LLM calls on a generation that cannot finish.
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'MEDITATION_FALLBACK_ENABLED', True)
+
+    @property
+    def storage(self):
+        return MeditationGenerate._meta.get_field('file').storage
+
+    def entries(self):
+        """
+        Catalog entries, stored and scanned on first use.
+        """
+        with self._lock:
+            if self._entries is None:
+                catalog = self.catalog or getattr(settings, 'MEDITATION_FALLBACK_CATALOG', DEFAULT_FALLBACK_CATALOG)
+                self._entries = [entry for entry in map(self._load, catalog) if entry]
+            return self._entries
+
+    def _load(self, config):
+        source = config['source']
+        name = f"{FALLBACK_DIRECTORY}/{os.path.basename(source)}"
+        try:
+            target_path = self.storage.path(name)
+            if not os.path.isfile(target_path):
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                temp_path = f"{target_path}.part.{os.getpid()}"
+                shutil.copyfile(source, temp_path)
+                os.replace(temp_path, target_path)
+            with open(target_path, 'rb') as f:
+                info = scan_mp3(f)
+        except (OSError, InvalidAudioError) as e:
+            logger.error(f"Fallback meditation {source} is unavailable: {str(e)}")
+            return None
+        return FallbackEntry(config['plan_type'], config['voice'], int(config['duration']), name, info)
+
+    def select(self, plan_type, voice, duration):
+        """
+        Closest catalog entry of the plan type, or None if there is none or the catalog is disabled.
+        """
+        if not self.enabled:
+            return None
+        entries = [entry for entry in self.entries() if entry.plan_type == plan_type]
+        if not entries:
+            return None
+        return max(entries, key=lambda entry: entry.score(voice, duration))
+
+    def available(self, plan_type):
+        """
+        Whether a request for the plan type (RitualType name) can be served from the catalog.
+        """
+        return self.enabled and any(entry.plan_type == plan_type for entry in self.entries())
+
+    def is_shared(self, name):
+        """
+        Whether a storage name is a catalog file that other records point to (never delete it).
+        """
+        return bool(name) and name.startswith(f"{FALLBACK_DIRECTORY}/")
+
+    def trip_quota(self):
+        cache.set(QUOTA_KEY, 1, timeout=getattr(settings, 'MEDITATION_FALLBACK_QUOTA_COOLDOWN', 300))
+
+    def quota_exhausted(self):
+        return bool(cache.get(QUOTA_KEY))
+
+    def create_meditation(self, user, plan_type, ritual, reason):
+        """
+        Create a MeditationGenerate that points at the closest pre-rendered meditation.
+
+        Args:
+            user: Owner of the meditation
+            plan_type: RitualType requested
+            ritual: Rituals with the requested voice and duration
+            reason: MeditationGenerate.FallbackReason value
+
+        Returns:
+            MeditationGenerate or None if no fallback is available
+        """
+        voice = ritual.voice if ritual and ritual.voice else "female"
+        duration = int(ritual.duration) if ritual and ritual.duration else 2
+        entry = self.select(plan_type.name, voice, duration)
+        if entry is None:
+            return None
+        if reason == MeditationGenerate.FallbackReason.QUOTA:
+            self.trip_quota()
+
+        meditation = MeditationGenerate.objects.create(
+            user=user,
+            details=ritual,
+            ritual_type=plan_type,
+            file=entry.name,
+            # Known metadata, so the shared file is not rescanned for every record
+            duration_seconds=round(entry.info.duration_seconds, 3),
+            bitrate_kbps=entry.info.bitrate_kbps,
+            frame_count=entry.info.frame_count,
+            file_size=entry.info.size,
+            is_fallback=True,
+            fallback_reason=reason,
+        )
+        meditation_fallbacks.labels(reason).inc()
+        logger.warning(
+            f"Served fallback meditation {entry.name} to user {user.pk} "
+            f"({reason}, requested {plan_type.name}/{voice}/{duration} min)"
+        )
+        return meditation
+
+
+fallback_catalog = FallbackCatalog()
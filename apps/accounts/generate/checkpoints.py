@@ -0,0 +1,76 @@
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_DIR = os.getenv(
+    "GENERATION_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "vela_checkpoints")
+)
+
+
+class GenerationCheckpoint:
+    """
+    Durable per-job storage of completed pipeline stages.
+
+    Stages are "script" (LLM output), "speech" (raw TTS audio) and "mix"
+    (final audio). Each is written atomically under <directory>/<job_id>/
+    when it completes, so a retry with the same job id resumes after the
+    last completed stage instead of paying for the LLM and TTS again.
+    """
+
+    def __init__(self, job_id: str, directory: str = None):
+        # Job ids end up in paths, keep them to safe characters
+        self.job_id = re.sub(r'[^A-Za-z0-9_-]', '_', job_id)
+        self.path = os.path.join(directory or DEFAULT_CHECKPOINT_DIR, self.job_id)
+
+    def _stage_path(self, stage: str):
+        return os.path.join(self.path, f"{stage}.bin")
+
+    def has(self, stage: str):
+        return os.path.isfile(self._stage_path(stage))
+
+    def load(self, stage: str):
+        """
+        Returns:
+            bytes: Stored stage output, or None if the stage has not completed
+        """
+        try:
+            with open(self._stage_path(stage), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, stage: str, data: bytes):
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = f"{self._stage_path(stage)}.part"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._stage_path(stage))
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def prune_checkpoints(directory: str = None, max_age: int = 60 * 60 * 24):
+    """
+    Delete checkpoints of jobs untouched for more than max_age seconds.
+
+    Returns:
+        int: Number of removed jobs
+    """
+    directory = directory or DEFAULT_CHECKPOINT_DIR
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,219 @@
+import io
+import os
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .music import mix_music, mix_section
+from .waveform import _peaks_file, DEFAULT_BUCKETS
+from .profiling import GENERATION_MEMORY_PROFILE, profiled_call
+from .timing import current_trace
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DSP_OFFLOAD = os.getenv("DSP_OFFLOAD", "True").lower() == "true"
+DSP_WORKERS = int(os.getenv("DSP_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Jobs allowed to wait for a worker, beyond the ones running
+DSP_QUEUE_SIZE = int(os.getenv("DSP_QUEUE_SIZE", 8))
+# Seconds a caller waits for a queue slot before giving up
+DSP_QUEUE_TIMEOUT = float(os.getenv("DSP_QUEUE_TIMEOUT", 60))
+# Audio moves between processes as files; tmpfs keeps that in memory
+DSP_TEMP_DIR = os.getenv("DSP_TEMP_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+
+class DSPQueueFullError(Exception):
+    """Raised when the audio process pool queue stays full for DSP_QUEUE_TIMEOUT seconds"""
+
+
+def _mix_file(in_path: str, out_path: str, options: dict):
+    """Worker entry point: mix the speech in in_path and write the result to out_path"""
+    with open(in_path, "rb") as f:
+        speech = f.read()
+    mixed = mix_music(speech, **options)
+    with open(out_path, "wb") as f:
+        f.write(mixed)
+    return len(mixed)
+
+
+def _mix_section_file(in_path: str, out_path: str, options: dict):
+    """Worker entry point: mix_section() of the speech in in_path (empty for music only), written as WAV"""
+    with open(in_path, "rb") as f:
+        speech = f.read()
+    mix_section(speech or None, **options).export(out_path, format="wav")
+    return os.path.getsize(out_path)
+
+
+def _encode_file(in_path: str, out_path: str, options: dict):
+    """Worker entry point: transcode in_path to out_path (format, codec, bitrate, parameters in options)"""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(in_path, format=options.get("input_format", "mp3"))
+    audio.export(
+        out_path, format=options["format"], codec=options.get("codec"),
+        bitrate=options.get("bitrate"), parameters=options.get("parameters")
+    )
+    return os.path.getsize(out_path)
+
+
+class AudioProcessPool:
+    """
+    Process pool for CPU-bound audio work (mixing, speed change, encoding).
+
+    pydub's sample processing holds the GIL, so running it in request
+    threads slows every other request in the worker. Jobs run in separate
+    processes instead. Audio goes through files in DSP_TEMP_DIR (tmpfs
+    when available) rather than pickled byte strings, and at most
+    workers + queue_size jobs are admitted at once; callers past that wait
+    up to queue_timeout seconds and then get DSPQueueFullError.
+
+    Inside a multiprocessing child (e.g. the pre-generation pool) jobs run
+    inline, so pools are never nested.
+    """
+
+    def __init__(self, workers: int = DSP_WORKERS, queue_size: int = DSP_QUEUE_SIZE,
+                 queue_timeout: float = DSP_QUEUE_TIMEOUT, temp_dir: str = DSP_TEMP_DIR,
+                 enabled: bool = DSP_OFFLOAD):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.temp_dir = temp_dir
+        self.enabled = enabled
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded server process can copy held locks into the child
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _offload(self):
+        return self.enabled and multiprocessing.parent_process() is None
+
+    def run_file_job(self, job, in_path: str, out_path: str, options: dict):
+        """
+        Run a file-to-file job in the pool (or inline when offloading is off).
+
+        Raises:
+            DSPQueueFullError: If no queue slot frees up within queue_timeout
+        """
+        offload = self._offload()
+        with tracer.span(f"dsp{job.__name__}", attributes={"dsp.offloaded": offload}) as span:
+            if not offload:
+                return job(in_path, out_path, options)
+            return self._submit(job, in_path, out_path, options, span)
+
+    def _submit(self, job, in_path, out_path, options, span=None):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise DSPQueueFullError(f"Audio processing queue is full ({self.queue_timeout:.0f}s wait)")
+        if span:
+            span.set_attribute("dsp.queue_wait_ms", round((time.perf_counter() - started) * 1000, 1))
+        try:
+            if GENERATION_MEMORY_PROFILE:
+                # Measured in the worker, where the audio is decoded, and attached to the caller's trace
+                stage = f"dsp{job.__name__}"
+                result, seconds, memory = self._pool().submit(
+                    profiled_call, stage, job, in_path, out_path, options
+                ).result()
+                trace = current_trace.get()
+                if trace is not None:
+                    trace.add_stage(stage, seconds, memory)
+                return result
+            return self._pool().submit(job, in_path, out_path, options).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM killed); start a fresh pool for the next job
+            logger.error("Audio process pool broke, restarting it")
+            self._reset()
+            raise
+        finally:
+            self._slots.release()
+
+    def run_bytes_job(self, job, data: bytes, options: dict):
+        """
+        Run a file-to-file job on in-memory audio through temp files.
+
+        Returns:
+            bytes: Output audio
+        """
+        fd, in_path = tempfile.mkstemp(suffix=".in", dir=self.temp_dir)
+        out_path = f"{in_path[:-3]}.out"
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            self.run_file_job(job, in_path, out_path, options)
+            with open(out_path, "rb") as f:
+                return f.read()
+        finally:
+            for path in (in_path, out_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def mix(self, speech: bytes, **options):
+        """
+        mix_music() in the pool.
+
+        Args:
+            speech: Speech audio bytes
+            **options: mix_music() keyword arguments (music_path, music_gain, speech_gain...)
+
+        Returns:
+            bytes: Mixed MP3 audio
+        """
+        return self.run_bytes_job(_mix_file, speech, options)
+
+    def mix_section(self, speech: bytes, **options):
+        """
+        mix_section() in the pool.
+
+        Args:
+            speech: Speech audio bytes, empty for a music-only section
+            **options: mix_section() keyword arguments (position, duration, music_path...)
+
+        Returns:
+            bytes: The mixed section as WAV
+        """
+        return self.run_bytes_job(_mix_section_file, speech, options)
+
+    def export(self, audio, format: str, codec: str = None, bitrate: str = None, parameters: list = None):
+        """
+        Encode an in-memory AudioSegment in the pool; it crosses the process boundary as WAV.
+
+        Returns:
+            bytes: Encoded audio
+        """
+        buffer = io.BytesIO()
+        audio.export(buffer, format="wav")
+        return self.run_bytes_job(_encode_file, buffer.getvalue(), {
+            "input_format": "wav", "format": format, "codec": codec, "bitrate": bitrate, "parameters": parameters
+        })
+
+    def encode(self, in_path: str, out_path: str, format: str, codec: str = None, bitrate: str = None):
+        """
+        Transcode a file in the pool.
+        """
+        return self.run_file_job(_encode_file, in_path, out_path, {"format": format, "codec": codec, "bitrate": bitrate})
+
+    def peaks(self, in_path: str, out_path: str, buckets: int = DEFAULT_BUCKETS):
+        """
+        Write waveform peaks JSON of an audio file in the pool.
+        """
+        return self.run_file_job(_peaks_file, in_path, out_path, {"buckets": buckets})
+
+
+audio_pool = AudioProcessPool()
@@ -1,15 +1,43 @@
+import os
 import re
+import time
+import logging
 from .generation import generate_script
-from .synthesis import synthesize_audio
-from .music import mix_music
+from .synthesis import synthesize_audio, synthesize_sentences
+from .music import ProgressiveMix
+from .streaming import HLSWriter, split_script
+from .timing import timed_stage, record_stage, generation_trace
+from .profiling import profile_memory
+from .checkpoints import GenerationCheckpoint
+from .dsp_pool import audio_pool
+from .mp3_scan import validate_mp3
 from elevenlabs.core.api_error import ApiError
 from typing import Literal
 
+logger = logging.getLogger(__name__)
+
+# About 30 seconds of speech at 114 words/minute
+PREVIEW_WORD_COUNT = "60"
+
+# Pause between separately synthesized chunks in segmented mode
+CHUNK_PAUSE_MS = 700
+
+# Synthesize sentence by sentence through the TTS segment cache
+TTS_SENTENCE_CACHE = os.getenv("TTS_SENTENCE_CACHE", "True").lower() == "true"
+
+# Ritual type labels for token accounting, by plan type name
+PLAN_TYPE_LABELS = {
+    "Sleep Manifestation": "sleep",
+    "Morning Spark": "spark",
+    "Calming Reset": "calm",
+    "Dream Visualizer": "dream",
+}
+
 
 def sleep_function(name: str, goals: str, dreamlife: str, dream_activities: str, 
                   ritual_type: Literal["Story", "Guided"], tone: Literal["Dreamy", "ASMR"], 
                   voice: Literal["female", "male"], length: Literal[2, 5, 10], 
-                  check_in: str = None):
+                  check_in: str = None, checkpoint: GenerationCheckpoint = None):
     """
     Generate sleep manifestation audio using the provided parameters.
     
@@ -23,26 +51,21 @@ def sleep_function(name: str, goals: str, dreamlife: str, dream_activities: str,
         voice: Voice type ("female" or "male")
         length: Audio length in minutes (2, 5, or 10)
         check_in: Optional check-in text
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
     
     Returns:
         bytes: Audio data in WAV format
     """
-    script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    
     try:
-        synthesis = synthesize_audio(pauses, voice)
+        return generate_meditation_audio(name, goals, dreamlife, dream_activities, voice, length, checkpoint, label="sleep")
     except ApiError as e:
         raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
-    
-    mixed_audio = mix_music(synthesis)
-    return mixed_audio
 
 
 def spark_function(name: str, goals: str, dreamlife: str, dream_activities: str, 
                   ritual_type: Literal["Story", "Guided"], tone: Literal["Dreamy", "ASMR"], 
                   voice: Literal["female", "male"], length: Literal[2, 5, 10], 
-                  check_in: str = None):
+                  check_in: str = None, checkpoint: GenerationCheckpoint = None):
     """
     Generate morning spark audio using the provided parameters.
     
@@ -56,26 +79,21 @@ def spark_function(name: str, goals: str, dreamlife: str, dream_activities: str,
         voice: Voice type ("female" or "male")
         length: Audio length in minutes (2, 5, or 10)
         check_in: Optional check-in text
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
     
     Returns:
         bytes: Audio data in WAV format
     """
-    script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    
     try:
-        synthesis = synthesize_audio(pauses, voice)
+        return generate_meditation_audio(name, goals, dreamlife, dream_activities, voice, length, checkpoint, label="spark")
     except ApiError as e:
         raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
-    
-    mixed_audio = mix_music(synthesis)
-    return mixed_audio
 
 
 def calm_function(name: str, goals: str, dreamlife: str, dream_activities: str, 
                  ritual_type: Literal["Story", "Guided"], tone: Literal["Dreamy", "ASMR"], 
                  voice: Literal["female", "male"], length: Literal[2, 5, 10], 
-                 check_in: str = None):
+                 check_in: str = None, checkpoint: GenerationCheckpoint = None):
     """
     Generate calming reset audio using the provided parameters.
     
@@ -89,26 +107,21 @@ def calm_function(name: str, goals: str, dreamlife: str, dream_activities: str,
         voice: Voice type ("female" or "male")
         length: Audio length in minutes (2, 5, or 10)
         check_in: Optional check-in text
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
     
     Returns:
         bytes: Audio data in WAV format
     """
-    script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    
     try:
-        synthesis = synthesize_audio(pauses, voice)
+        return generate_meditation_audio(name, goals, dreamlife, dream_activities, voice, length, checkpoint, label="calm")
     except ApiError as e:
         raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
-    
-    mixed_audio = mix_music(synthesis)
-    return mixed_audio
 
 
 def dream_function(name: str, goals: str, dreamlife: str, dream_activities: str, 
                   ritual_type: Literal["Story", "Guided"], tone: Literal["Dreamy", "ASMR"], 
                   voice: Literal["female", "male"], length: Literal[2, 5, 10], 
-                  check_in: str = None):
+                  check_in: str = None, checkpoint: GenerationCheckpoint = None):
     """
     Generate dream visualizer audio using the provided parameters.
     
@@ -122,26 +135,21 @@ def dream_function(name: str, goals: str, dreamlife: str, dream_activities: str,
         voice: Voice type ("female" or "male")
         length: Audio length in minutes (2, 5, or 10)
         check_in: Optional check-in text
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
     
     Returns:
         bytes: Audio data in WAV format
     """
-    script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    
     try:
-        synthesis = synthesize_audio(pauses, voice)
+        return generate_meditation_audio(name, goals, dreamlife, dream_activities, voice, length, checkpoint, label="dream")
     except ApiError as e:
         raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
-    
-    mixed_audio = mix_music(synthesis)
-    return mixed_audio
 
 
 def check_in_function(name: str, goals: str, dreamlife: str, dream_activities: str, 
                      ritual_type: Literal["Story", "Guided"], tone: Literal["Dreamy", "ASMR"], 
                      voice: Literal["female", "male"], length: Literal[2, 5, 10], 
-                     check_in: str = None):
+                     check_in: str = None, checkpoint: GenerationCheckpoint = None):
     """
     Generate check-in audio using the provided parameters.
     
@@ -155,20 +163,209 @@ def check_in_function(name: str, goals: str, dreamlife: str, dream_activities: s
         voice: Voice type ("female" or "male")
         length: Audio length in minutes (2, 5, or 10)
         check_in: Optional check-in text
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
     
     Returns:
         bytes: Audio data in WAV format
     """
-    script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    
     try:
-        synthesis = synthesize_audio(pauses, voice)
+        return generate_meditation_audio(name, goals, dreamlife, dream_activities, voice, length, checkpoint, label="check_in")
     except ApiError as e:
         raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
+
+
+def add_pauses(script: str):
+    """
+    Insert pause markers between sentences for speech synthesis.
+    
+    Args:
+        script: Generated meditation script
+    
+    Returns:
+        str: Script with ' --- ' pauses after every sentence except the last
+    """
+    return re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
+
+
+def synthesize_script(script: str, voice: Literal["female", "male"]):
+    """
+    Synthesize a script, through the sentence cache unless TTS_SENTENCE_CACHE is off.
+    
+    Args:
+        script: Generated meditation script
+        voice: Voice type ("female" or "male")
+    
+    Returns:
+        bytes: Speech audio (MP3)
+    """
+    if TTS_SENTENCE_CACHE:
+        return synthesize_sentences(script, voice)
+    return synthesize_audio(add_pauses(script), voice)
+
+
+def generate_meditation_audio(name: str, goals: str, dreamlife: str, dream_activities: str,
+                              voice: Literal["female", "male"], length: Literal[2, 5, 10],
+                              checkpoint: GenerationCheckpoint = None, label: str = None):
+    """
+    Run the full generation pipeline: script, speech synthesis and music mix.
+    
+    Each stage is timed so queue wait estimates can use recent durations,
+    and recorded in the generation trace (with memory in profiling mode).
+    With a checkpoint, completed stages are stored and a retry of the same
+    job skips them.
     
-    mixed_audio = mix_music(synthesis)
-    return mixed_audio
+    Args:
+        name: User's name
+        goals: User's goals
+        dreamlife: User's dream life description
+        dream_activities: User's dream activities
+        voice: Voice type ("female" or "male")
+        length: Audio length in minutes (2, 5, or 10)
+        checkpoint: Optional GenerationCheckpoint to resume from / record stages in
+        label: Ritual type label for token accounting ("sleep", "spark", ...)
+    
+    Returns:
+        bytes: Mixed audio data
+    
+    Raises:
+        ApiError: If ElevenLabs rejects the synthesis request
+        InvalidAudioError: If the mixed audio fails the MP3 frame check
+    """
+    with generation_trace(label or "meditation"):
+        script = run_stage(checkpoint, "script", "llm", lambda: generate_script(
+            name, goals, dreamlife, dream_activities, get_word_count(length), label=label
+        ).encode("utf-8")).decode("utf-8")
+        
+        synthesis = run_stage(checkpoint, "speech", "tts", lambda: synthesize_script(script, voice))
+        return run_stage(checkpoint, "mix", "mix", lambda: validated(audio_pool.mix(synthesis)))
+
+
+def validated(audio: bytes):
+    """
+    Check mixed audio with the MP3 frame scanner before it is checkpointed or stored.
+    
+    Raises:
+        InvalidAudioError: If the audio is not a sane MP3 stream
+    """
+    info = validate_mp3(audio)
+    logger.info(f"Mixed audio: {info.duration_seconds:.1f}s, {info.bitrate_kbps} kbps, {info.frame_count} frames")
+    return audio
+
+
+def run_stage(checkpoint: GenerationCheckpoint, stage: str, timing: str, produce):
+    """
+    Run one pipeline stage, or load its output if the checkpoint already has it.
+    
+    Args:
+        checkpoint: GenerationCheckpoint or None
+        stage: Checkpoint stage name ("script", "speech" or "mix")
+        timing: Stage name for timing statistics
+        produce: Callable returning the stage output as bytes
+    
+    Returns:
+        bytes: Stage output
+    """
+    if checkpoint:
+        data = checkpoint.load(stage)
+        if data is not None:
+            logger.info(f"Resuming job {checkpoint.job_id}: '{stage}' loaded from checkpoint")
+            return data
+    
+    with timed_stage(timing):
+        data = produce()
+    if checkpoint:
+        checkpoint.save(stage, data)
+    return data
+
+
+def generate_segmented_audio(name: str, goals: str, dreamlife: str, dream_activities: str,
+                             voice: Literal["female", "male"], length: Literal[2, 5, 10],
+                             segment_dir: str, segment_seconds: int = 6, merge: bool = True,
+                             label: str = None):
+    """
+    Run the pipeline with progressive HLS output.
+    
+    The script is synthesized in sentence-aligned chunks; each chunk is mixed
+    and written as HLS segments to segment_dir right away, so playback can
+    start from the playlist before generation finishes.
+    
+    Args:
+        name: User's name
+        goals: User's goals
+        dreamlife: User's dream life description
+        dream_activities: User's dream activities
+        voice: Voice type ("female" or "male")
+        length: Audio length in minutes (2, 5, or 10)
+        segment_dir: Directory for index.m3u8 and the segments
+        segment_seconds: Segment length in seconds
+        merge: Also return the whole meditation as a single MP3
+        label: Ritual type label for token accounting
+    
+    Returns:
+        bytes: Mixed MP3 audio if merge is True, otherwise None
+    
+    Raises:
+        ApiError: If ElevenLabs rejects the synthesis request
+    """
+    with generation_trace(f"{label or 'meditation'}-segmented"):
+        with timed_stage("llm"):
+            script = generate_script(name, goals, dreamlife, dream_activities, get_word_count(length), label=label)
+        
+        # Section mixing and segment/MP3 encoding run in the audio process pool
+        writer = HLSWriter(segment_dir, segment_seconds=segment_seconds, pool=audio_pool)
+        try:
+            # Speech and mix interleave, so their memory is measured together
+            with profile_memory("tts+mix") as memory:
+                mix = ProgressiveMix(writer, pool=audio_pool)
+                tts_seconds = 0.0
+                mix_seconds = 0.0
+                for index, chunk in enumerate(split_script(script)):
+                    started = time.perf_counter()
+                    synthesis = synthesize_script(chunk, voice)
+                    tts_seconds += time.perf_counter() - started
+                    
+                    started = time.perf_counter()
+                    if index:
+                        mix.add_silence(CHUNK_PAUSE_MS)
+                    mix.add_speech(synthesis)
+                    mix_seconds += time.perf_counter() - started
+                
+                started = time.perf_counter()
+                mixed_audio = mix.finish(export=merge)
+                mix_seconds += time.perf_counter() - started
+        finally:
+            # End the playlist even on failure so players stop waiting for segments
+            writer.close()
+        
+        record_stage("tts", tts_seconds)
+        record_stage("mix", mix_seconds, memory)
+        return mixed_audio
+
+
+def generate_preview_audio(name: str, goals: str, dreamlife: str, dream_activities: str,
+                           voice: Literal["female", "male"]):
+    """
+    Generate a short (about 30 seconds) intro clip through the same pipeline.
+    
+    Used as a quick preview while the full-length meditation generates.
+    Stages are not timed so previews do not skew the full-run estimates.
+    
+    Args:
+        name: User's name
+        goals: User's goals
+        dreamlife: User's dream life description
+        dream_activities: User's dream activities
+        voice: Voice type ("female" or "male")
+    
+    Returns:
+        bytes: Mixed audio data
+    
+    Raises:
+        ApiError: If ElevenLabs rejects the synthesis request
+    """
+    script = generate_script(name, goals, dreamlife, dream_activities, PREVIEW_WORD_COUNT, label="preview")
+    synthesis = synthesize_script(script, voice)
+    return validated(audio_pool.mix(synthesis))
 
 
 def get_word_count(mins: int):
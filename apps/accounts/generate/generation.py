@@ -1,80 +1,319 @@
 import os
+import json
+import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
+from .llm_router import llm_router
+from .tokens import token_stats, usage_of
 
-def generate_script(name, goals, dreamlife, dream_activities, word_count):
-    template = """
-    Your name is Veela. You are a master storyteller, a gentle guide into the world of dreams. Your sole purpose is to create a deeply personalized sleep story that helps the user relax and drift into a peaceful slumber.
+logger = logging.getLogger(__name__)
 
-    ### PART 1: THE STYLE GUIDE
+# Concurrent Groq requests for batched generation
+BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+# Per-request timeout; failover and hedging replace the client's own retries
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))
+# Narration speed the word budgets are based on (see functions.get_word_count)
+WORDS_PER_MINUTE = 114
+# Scripts may run this much over their word budget
+WORD_COUNT_TOLERANCE = 0.15
 
-    First, I will provide you with examples of sleep stories.
+STATIC_PREFIX = """\
+Your name is Veela. You are a master storyteller, a gentle guide into the world of dreams. Your sole purpose is to create a deeply personalized sleep story that helps the user relax and drift into a peaceful slumber.
 
-    Your task is to analyze these examples to understand the required **style, tone, and pacing**. Pay close attention to:
-    - **The Soothing Tone:** Calm, reassuring, and gentle.
-    - **The Deliberate Pacing:** Slow, meandering, and unhurried. There is no rush.
-    - **The Simple Language:** Use clear, simple sentences that are easy to follow in a relaxed state.
-    - **The Sensory Details:** Notice how they focus on gentle sounds, soft textures, and peaceful sights.
+### PART 1: THE STYLE GUIDE
 
-    Here are the style examples:
+First, I will provide you with examples of sleep stories.
 
-    ---
-    **<Example 1: Beneath the Starlit Dome>**
+Your task is to analyze these examples to understand the required **style, tone, and pacing**. Pay close attention to:
+- **The Soothing Tone:** Calm, reassuring, and gentle.
+- **The Deliberate Pacing:** Slow, meandering, and unhurried. There is no rush.
+- **The Simple Language:** Use clear, simple sentences that are easy to follow in a relaxed state.
+- **The Sensory Details:** Notice how they focus on gentle sounds, soft textures, and peaceful sights.
 
-    Hello, I'm Veela, and tonight we travel to one of the southernmost places in the world, to a remote field by a flowing river, where the scent of eucalyptus wafts through the air and the stars shine down by the millions. Before we get started, take a moment to settle down and relax. Feel your body get soft and heavy in your bed. Take a few cleansing breaths, letting go of any tension from the day. Allow your eyes to drift gently closed. Now, let's begin tonight's sleep story, Beneath the Starlit Dome. It is a picture of rural tranquility. The quiet country lane before you unfurls like a silken ribbon, lined with rich farmland and forests, softly undulating and growing ever more narrow towards the horizon. You follow this ribbon of unpaved road a little farther, a few cows low in the distance....
-    ---
+Here are the style examples:
 
-    ---
-    **<Example 2: Drifting Off with Gratitude>**
+---
+**<Example 1: Beneath the Starlit Dome>**
 
-    Hi, I'm Veela. Tonight's meditation will help you open your heart to gratitude so you fall asleep with a sense of deep appreciation and peace. Start by finding a comfortable position. Stretching out in your bed in whatever way is comfortable. And whenever you're ready, close your eyes. And just start by bringing awareness to the length of your body. as you lie resting in your bed. Feel the warmth of the mattress beneath you, offering you support. and do your best to fully relax into this moment. Letting go of the day knowing that there's nothing else you need to do. This is the time to shift gears and begin to relax settling into here into now into this moment and begin to consciously relax any tension around your forehead, your eyes, your lips and jaw soften your neck And feel your shoulders dropping down just a little bit more....
-    ---
+Hello, I'm Veela, and tonight we travel to one of the southernmost places in the world, to a remote field by a flowing river, where the scent of eucalyptus wafts through the air and the stars shine down by the millions. Before we get started, take a moment to settle down and relax. Feel your body get soft and heavy in your bed. Take a few cleansing breaths, letting go of any tension from the day. Allow your eyes to drift gently closed. Now, let's begin tonight's sleep story, Beneath the Starlit Dome. It is a picture of rural tranquility. The quiet country lane before you unfurls like a silken ribbon, lined with rich farmland and forests, softly undulating and growing ever more narrow towards the horizon. You follow this ribbon of unpaved road a little farther, a few cows low in the distance....
+---
 
-    ### PART 2: THE CONTENT BLUEPRINT (THE USER'S STORY)
+---
+**<Example 2: Drifting Off with Gratitude>**
 
-    Now, you will write a completely original, soothing sleep story based on the style you've learned.
+Hi, I'm Veela. Tonight's meditation will help you open your heart to gratitude so you fall asleep with a sense of deep appreciation and peace. Start by finding a comfortable position. Stretching out in your bed in whatever way is comfortable. And whenever you're ready, close your eyes. And just start by bringing awareness to the length of your body. as you lie resting in your bed. Feel the warmth of the mattress beneath you, offering you support. and do your best to fully relax into this moment. Letting go of the day knowing that there's nothing else you need to do. This is the time to shift gears and begin to relax settling into here into now into this moment and begin to consciously relax any tension around your forehead, your eyes, your lips and jaw soften your neck And feel your shoulders dropping down just a little bit more....
+---
 
-    #### INSTRUCTIONS:
+### PART 2: THE CONTENT BLUEPRINT (THE USER'S STORY)
 
-    - Pretend you are a story teller reading out a novel of your own making trying to make sure the person you are reading the story to, falls gently asleep from your words
-    - Begin the story by gently introducing yourself: *"Hello, I’m Veela, and tonight..."*
-    - End the story naturally, wishing the user a peaceful sleep using their first name.
-    - To make the story more personal NEVER use their last name and only refer to the user using their first name.
-    - **Choose just a couple (1–3) of the user’s goals or dream life elements** that feel emotionally resonant or thematically cohesive.
-    - Weave those details subtly and naturally into the story through metaphor, scenery, character desires, or narrative arcs.  
-    - Do **not** try to incorporate every goal.
-    - Focus on **emotional depth** and **dreamlike imagery** that aligns with their deepest feelings or aspirations.
-    - Use **vivid sensory language** to engage the imagination and promote a calming, immersive experience.
-    - The narrative should feel like a **peaceful dream or a beloved fable**, something the user would love to live in or imagine as they fall asleep.
-    - The final word count must be {word_count}+ words.
+Now, you will write a completely original, soothing sleep story based on the style you've learned.
 
-    **User's Personal Details:**
-    * **Name:** {name}
-    * **Goals:** {goals}
-    * **Dream Life Vision:** {dreamlife}
-    * **They are the happiest when:** {dream_activities}
+#### INSTRUCTIONS:
 
-    Now, begin the personalized sleep story.
+- Pretend you are a story teller reading out a novel of your own making trying to make sure the person you are reading the story to, falls gently asleep from your words
+- Begin the story by gently introducing yourself: *"Hello, I’m Veela, and tonight..."*
+- End the story naturally, wishing the user a peaceful sleep using their first name.
+- To make the story more personal NEVER use their last name and only refer to the user using their first name.
+- **Choose just a couple (1–3) of the user’s goals or dream life elements** that feel emotionally resonant or thematically cohesive.
+- Weave those details subtly and naturally into the story through metaphor, scenery, character desires, or narrative arcs.
+- Do **not** try to incorporate every goal.
+- Focus on **emotional depth** and **dreamlike imagery** that aligns with their deepest feelings or aspirations.
+- Use **vivid sensory language** to engage the imagination and promote a calming, immersive experience.
+- The narrative should feel like a **peaceful dream or a beloved fable**, something the user would love to live in or imagine as they fall asleep.
+- Match the length target given with the user's details. The story is read aloud at about 114 words per minute, so write within the given word range: a shorter story ends before the meditation should, a longer one runs past it.
+"""
+
+USER_SUFFIX = """\
+**User's Personal Details:**
+* **Name:** {name}
+* **Goals:** {goals}
+* **Dream Life Vision:** {dreamlife}
+* **They are the happiest when:** {dream_activities}
+* **Length target:** {duration} read aloud, {word_count} to {max_word_count} words
+
+Now, begin the personalized sleep story.
+"""
+
+# Compiled once: the system message is byte-identical for every user so the
+# provider can cache it; only the short human message varies.
+PROMPT = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=STATIC_PREFIX),
+        ("human", USER_SUFFIX),
+    ]
+)
+
+
+DIGEST_PREFIX = """\
+You condense a user's profile for a personalized sleep story writer.
+Rewrite each field as a short, concrete summary (at most 30 words) that keeps the names, places, activities and feelings a storyteller could weave in, and drops everything else.
+Answer with a JSON object with exactly the keys "goals", "dreamlife" and "dream_activities", and nothing else. Use an empty string for an empty field.
+"""
+
+DIGEST_SUFFIX = """\
+Goals: {goals}
+Dream life: {dreamlife}
+Happiest when: {dream_activities}
+"""
+
+DIGEST_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        SystemMessage(content=DIGEST_PREFIX),
+        ("human", DIGEST_SUFFIX),
+    ]
+)
+
+
+@lru_cache(maxsize=None)
+def build_llm(backend):
+    load_dotenv()
+    return ChatGroq(
+        model = backend.model,
+        groq_api_key = os.getenv(backend.key_env),
+        timeout = REQUEST_TIMEOUT,
+        max_retries = 0,
+    )
+
+
+def build_backend_chain(backend):
+    return PROMPT|build_llm(backend)
+
+
+def build_chain():
+    """
+    Chain on the primary backend that falls back to the others in order on errors.
+    """
+    primary, *fallbacks = [build_backend_chain(backend) for backend in llm_router.backends]
+    return primary.with_fallbacks(fallbacks) if fallbacks else primary
+
+
+def _invoke_backend(backend, inputs):
+    return build_backend_chain(backend).invoke(inputs)
+
+
+def length_inputs(word_count):
     """
+    Prompt variables of the length target for a word budget.
+    
+    Args:
+        word_count: Word budget, e.g. "1200" from get_word_count or "1,700"
+    
+    Returns:
+        dict: word_count, max_word_count and the spoken duration ("2 minutes", "30 seconds")
+    """
+    words = int(str(word_count).replace(",", ""))
+    if words < WORDS_PER_MINUTE:
+        duration = f"about {round(words * 60 / WORDS_PER_MINUTE, -1):.0f} seconds"
+    else:
+        # Budgets are rounded up from the spoken length, and pauses add some time
+        minutes = words // WORDS_PER_MINUTE
+        duration = f"about {minutes} minute{'s' if minutes != 1 else ''}"
+    return {
+        "word_count": f"{words:,}",
+        "max_word_count": f"{round(words * (1 + WORD_COUNT_TOLERANCE)):,}",
+        "duration": duration,
+    }
+
+
+def generate_script(name, goals, dreamlife, dream_activities, word_count, label=None):
+    result, backend = llm_router.invoke(
+        _invoke_backend,
+        {**length_inputs(word_count), "name": name, "goals": goals, "dreamlife": dreamlife, "dream_activities": dream_activities}
+    )
+    logger.info(f"Script generated by {backend}")
+    token_stats.record(label, usage_of(result))
+
+    return result.content
+
 
-    prompt_template = ChatPromptTemplate.from_messages(
+def _invoke_digest(backend, inputs):
+    return (DIGEST_PROMPT|build_llm(backend)).invoke(inputs)
+
+
+def summarize_profile(goals, dreamlife, dream_activities):
+    """
+    Condense the free-text profile fields into short summaries for generation prompts.
+    
+    Args:
+        goals: User's goals
+        dreamlife: User's dream life description
+        dream_activities: User's dream activities
+    
+    Returns:
+        dict: goals, dreamlife and dream_activities summaries
+    
+    Raises:
+        ValueError: If the model does not answer with the expected JSON object
+    """
+    result, backend = llm_router.invoke(
+        _invoke_digest, {"goals": goals, "dreamlife": dreamlife, "dream_activities": dream_activities}
+    )
+    token_stats.record("digest", usage_of(result))
+    return _parse_digest(result.content, backend)
+
+
+def _parse_digest(content, backend):
+    content = content.strip()
+    # Some models wrap JSON in a code fence
+    content = content.strip("`").removeprefix("json").strip()
+    try:
+        digest = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Profile digest from {backend} is not JSON: {e}")
+    if not isinstance(digest, dict):
+        raise ValueError(f"Profile digest from {backend} is not a JSON object")
+    return {key: str(digest.get(key) or "") for key in ("goals", "dreamlife", "dream_activities")}
+
+
+def build_digest_chain():
+    """
+    Profile digest chain on the primary backend, falling back to the others in order on errors.
+    """
+    primary, *fallbacks = [DIGEST_PROMPT|build_llm(backend) for backend in llm_router.backends]
+    return primary.with_fallbacks(fallbacks) if fallbacks else primary
+
+
+def summarize_profiles(profiles, max_concurrency=None):
+    """
+    summarize_profile() for many profiles through one batched chain call.
+    
+    Args:
+        profiles: List of dicts with goals, dreamlife and dream_activities
+        max_concurrency: Concurrent requests (default LLM_BATCH_CONCURRENCY)
+    
+    Returns:
+        list: One entry per profile, in input order: the digest (dict) or the Exception it failed with
+    """
+    if not profiles:
+        return []
+    results = build_digest_chain().batch(
         [
-            ("system", template)
-        ]
+            {key: profile[key] for key in ("goals", "dreamlife", "dream_activities")}
+            for profile in profiles
+        ],
+        config={"max_concurrency": max_concurrency or BATCH_CONCURRENCY},
+        return_exceptions=True,
     )
+    digests = []
+    for result in results:
+        if isinstance(result, Exception):
+            digests.append(result)
+            continue
+        token_stats.record("digest", usage_of(result))
+        try:
+            digests.append(_parse_digest(result.content, "batch"))
+        except ValueError as e:
+            digests.append(e)
+    return digests
 
-    # 5 mins = 570, 
-    # 10 mins = 1,140
-    # 15 mins = 1,700
-    # 20 mins = 2,270
-    word_count = "1,700"
 
-    load_dotenv()
-    print(os.getenv("GROQ_API_Key"))
-    llm = ChatGroq(model = "gemma2-9b-it", groq_api_key = os.getenv("GROQ_API_Key"))
+def _batch_inputs(profiles):
+    return [
+        {
+            **length_inputs(profile["word_count"]),
+            "name": profile["name"],
+            "goals": profile["goals"],
+            "dreamlife": profile["dreamlife"],
+            "dream_activities": profile["dream_activities"],
+        }
+        for profile in profiles
+    ]
 
-    chain = prompt_template|llm
-    result = chain.invoke({"word_count": word_count,"name": name, "goals": goals, "dreamlife": dreamlife, "dream_activities": dream_activities})
 
-    return result.content
+def _batch_results(results, profiles):
+    scripts = []
+    failed = 0
+    for result, profile in zip(results, profiles):
+        if isinstance(result, Exception):
+            scripts.append(result)
+            failed += 1
+        else:
+            token_stats.record(profile.get("label"), usage_of(result))
+            scripts.append(result.content)
+    if failed:
+        logger.warning(f"Batched script generation: {failed} of {len(results)} failed")
+    return scripts
+
+
+def generate_scripts(profiles, max_concurrency=None):
+    """
+    Generate scripts for many profiles through one batched chain call.
+    
+    Runs chain.batch() with at most max_concurrency Groq requests in flight.
+    A failed profile does not fail the batch: its slot holds the exception.
+    
+    Args:
+        profiles: List of dicts with name, goals, dreamlife, dream_activities, word_count
+            and optionally label (ritual type for token accounting)
+        max_concurrency: Concurrent requests (default LLM_BATCH_CONCURRENCY)
+    
+    Returns:
+        list: One entry per profile, in input order: the script (str) or the Exception it failed with
+    """
+    if not profiles:
+        return []
+    chain = build_chain()
+    results = chain.batch(
+        _batch_inputs(profiles),
+        config={"max_concurrency": max_concurrency or BATCH_CONCURRENCY},
+        return_exceptions=True,
+    )
+    return _batch_results(results, profiles)
+
+
+async def agenerate_scripts(profiles, max_concurrency=None):
+    """
+    Async variant of generate_scripts() using chain.abatch().
+    """
+    if not profiles:
+        return []
+    chain = build_chain()
+    results = await chain.abatch(
+        _batch_inputs(profiles),
+        config={"max_concurrency": max_concurrency or BATCH_CONCURRENCY},
+        return_exceptions=True,
+    )
+    return _batch_results(results, profiles)
@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .tracing import tracer
+from .metrics import record_provider
+
+logger = logging.getLogger(__name__)
+
+# Ordered backends, "<model>:<env var holding the API key>", first is primary
+DEFAULT_BACKENDS = "gemma2-9b-it:GROQ_API_Key,llama-3.1-8b-instant:GROQ_API_Key"
+
+
+class LLMBackend:
+    """
+    One model/key pair plus a rolling window of its successful latencies.
+    """
+
+    def __init__(self, model: str, key_env: str, window: int = 100):
+        self.model = model
+        self.key_env = key_env
+        self.name = f"{model}@{key_env}"
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int = 20):
+        """
+        Returns:
+            float: Latency at the given percentile, or None with fewer than min_samples samples
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class AllBackendsFailedError(Exception):
+    """Raised when every configured LLM backend failed for a request"""
+
+
+class HedgedLLMRouter:
+    """
+    Send a completion to an ordered list of LLM backends with hedging and failover.
+
+    The request goes to the first backend. If it has not answered once its
+    hedge_percentile latency has passed (hedge_delay until enough samples
+    exist), a duplicate goes to the next backend and the first answer wins.
+    An error fails over to the next untried backend right away. The loser
+    of a hedge is left to finish in the background; since hedges only fire
+    past the tail percentile, extra spend stays around (100 - percentile)%.
+
+    Backends are called through call(backend, inputs), which the caller
+    supplies, so the router does not depend on a particular client.
+    """
+
+    def __init__(self, backends, hedge_percentile: float = 95, hedge_delay: float = 20.0,
+                 max_workers: int = 8):
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+        self._wins = {backend.name: 0 for backend in backends}
+        self._failures = {backend.name: 0 for backend in backends}
+        self._hedges = 0
+
+    def _hedge_after(self, backend):
+        threshold = backend.percentile(self.hedge_percentile)
+        return self.hedge_delay if threshold is None else threshold
+
+    def _timed(self, call, backend, inputs):
+        with tracer.span(f"llm {backend.name}", kind="client", attributes={"llm.model": backend.model}):
+            started = time.perf_counter()
+            try:
+                result = call(backend, inputs)
+            except Exception as e:
+                record_provider(f"llm:{backend.model}", e)
+                raise
+            record_provider(f"llm:{backend.model}")
+            backend.record(time.perf_counter() - started)
+            return result
+
+    def invoke(self, call, inputs):
+        """
+        Run call(backend, inputs) with hedging and failover.
+
+        Args:
+            call: Callable(backend, inputs) performing one completion
+            inputs: Completion inputs passed through to call
+
+        Returns:
+            tuple: (result of the winning call, name of the winning backend)
+
+        Raises:
+            AllBackendsFailedError: If every backend failed
+        """
+        remaining = list(self.backends)
+        pending = {}
+        errors = []
+
+        def launch():
+            backend = remaining.pop(0)
+            pending[self._executor.submit(tracer.wrap(self._timed), call, backend, inputs)] = backend
+            return backend
+
+        current = launch()
+        while pending:
+            timeout = self._hedge_after(current) if remaining else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Slow past the tail threshold: hedge on the next backend
+                with self._lock:
+                    self._hedges += 1
+                logger.info(f"LLM request on {current.name} passed {timeout:.1f}s, hedging on {remaining[0].name}")
+                current = launch()
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    with self._lock:
+                        self._failures[backend.name] += 1
+                    logger.warning(f"LLM backend {backend.name} failed: {e}")
+                    continue
+                with self._lock:
+                    self._wins[backend.name] += 1
+                logger.info(f"LLM request won by {backend.name}")
+                return result, backend.name
+
+            if not pending and remaining:
+                current = launch()
+
+        raise AllBackendsFailedError("; ".join(errors) or "No LLM backends configured")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hedges": self._hedges,
+                "backends": {
+                    backend.name: {
+                        "wins": self._wins[backend.name],
+                        "failures": self._failures[backend.name],
+                        "p50_seconds": backend.percentile(50, min_samples=1),
+                        f"p{self.hedge_percentile:g}_seconds": backend.percentile(self.hedge_percentile, min_samples=1),
+                    }
+                    for backend in self.backends
+                },
+            }
+
+
+def parse_backends(spec: str):
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, _, key_env = entry.partition(":")
+        backends.append(LLMBackend(model.strip(), key_env.strip() or "GROQ_API_Key"))
+    return backends
+
+
+llm_router = HedgedLLMRouter(
+    parse_backends(os.getenv("LLM_BACKENDS", DEFAULT_BACKENDS)),
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", 95)),
+    hedge_delay=float(os.getenv("LLM_HEDGE_DELAY_SECONDS", 20)),
+)
@@ -1,11 +1,12 @@
-from fastapi import FastAPI, HTTPException
+import os
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Literal
-import re
-from .generation import generate_script
-from .synthesis import synthesize_audio
-from .music import mix_music
+from .functions import generate_meditation_audio
+from .checkpoints import GenerationCheckpoint, prune_checkpoints
+from .tracing import Tracer, SpanContext, tracer
+from .metrics import render_metrics, scrape_allowed
 from elevenlabs.core.api_error import ApiError
 
 class Request(BaseModel):
@@ -22,22 +23,44 @@ class Request(BaseModel):
     length: Literal[2, 5, 10]
     check_in: str = None
 
+    # Retries with the same job id resume from the last completed stage
+    job_id: str = None
+
 vela = FastAPI()
 
+# Spans from this process are told apart from the Django API's in the trace; stage,
+# LLM and TTS spans opened under a request span report the same service
+generator_tracer = Tracer("vela-generator", exporter=tracer.exporter)
+
+
+def run_generation(request: Request, label: str = None, traceparent: str = None):
+    # Continue the caller's trace (ExternalMeditationService sends traceparent)
+    with generator_tracer.span(f"POST /{label}", parent=SpanContext.parse(traceparent), kind="server",
+                               attributes={"generation.job_id": request.job_id or "", "generation.length": request.length}):
+        checkpoint = None
+        if request.job_id:
+            prune_checkpoints()
+            checkpoint = GenerationCheckpoint(request.job_id)
+        try:
+            mixed_audio = generate_meditation_audio(request.name,
+                                                    request.goals,
+                                                    request.dreamlife,
+                                                    request.dream_activities,
+                                                    request.voice,
+                                                    request.length,
+                                                    checkpoint,
+                                                    label=label)
+        except ApiError as e:
+            raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
+        # Only failed jobs resume; the same job id sent again after a success starts over
+        if checkpoint:
+            checkpoint.clear()
+        return mixed_audio
+
 
 @vela.post("/sleep")
-def sleep(request: Request):
-    script = generate_script(request.name, 
-                             request.goals, 
-                             request.dreamlife, 
-                             request.dream_activities, 
-                             get_word_count(request.length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    try:
-        synthesis = synthesize_audio(pauses, request.voice)
-    except ApiError as e:
-        raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
-    mixed_audio = mix_music(synthesis)
+def sleep(request: Request, traceparent: str = Header(None)):
+    mixed_audio = run_generation(request, "sleep", traceparent)
     
     return Response(
         content=mixed_audio,
@@ -47,18 +70,8 @@ def sleep(request: Request):
 
 
 @vela.post("/spark")
-def spark(request: Request):
-    script = generate_script(request.name, 
-                             request.goals, 
-                             request.dreamlife, 
-                             request.dream_activities, 
-                             get_word_count(request.length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    try:
-        synthesis = synthesize_audio(pauses, request.voice)
-    except ApiError as e:
-        raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
-    mixed_audio = mix_music(synthesis)
+def spark(request: Request, traceparent: str = Header(None)):
+    mixed_audio = run_generation(request, "spark", traceparent)
     
     return Response(
         content=mixed_audio,
@@ -68,18 +81,8 @@ def spark(request: Request):
 
 
 @vela.post("/calm")
-def calm(request: Request):
-    script = generate_script(request.name, 
-                             request.goals, 
-                             request.dreamlife, 
-                             request.dream_activities, 
-                             get_word_count(request.length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    try:
-        synthesis = synthesize_audio(pauses, request.voice)
-    except ApiError as e:
-        raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
-    mixed_audio = mix_music(synthesis)
+def calm(request: Request, traceparent: str = Header(None)):
+    mixed_audio = run_generation(request, "calm", traceparent)
     
     return Response(
         content=mixed_audio,
@@ -89,18 +92,8 @@ def calm(request: Request):
 
 
 @vela.post("/dream")
-def dream(request: Request):
-    script = generate_script(request.name, 
-                             request.goals, 
-                             request.dreamlife, 
-                             request.dream_activities, 
-                             get_word_count(request.length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    try:
-        synthesis = synthesize_audio(pauses, request.voice)
-    except ApiError as e:
-        raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
-    mixed_audio = mix_music(synthesis)
+def dream(request: Request, traceparent: str = Header(None)):
+    mixed_audio = run_generation(request, "dream", traceparent)
     
     return Response(
         content=mixed_audio,
@@ -110,18 +103,8 @@ def dream(request: Request):
 
 
 @vela.post("/check-in")
-def check_in(request: Request):
-    script = generate_script(request.name, 
-                             request.goals, 
-                             request.dreamlife, 
-                             request.dream_activities, 
-                             get_word_count(request.length))
-    pauses = re.sub(r'(?<=\.)\s(?![^.]*\.$)', ' --- ', script)
-    try:
-        synthesis = synthesize_audio(pauses, request.voice)
-    except ApiError as e:
-        raise HTTPException(status_code=500, detail=f"ElevenLabs API Error: {e.body['detail']['message']}")
-    mixed_audio = mix_music(synthesis)
+def check_in(request: Request, traceparent: str = Header(None)):
+    mixed_audio = run_generation(request, "check_in", traceparent)
     
     return Response(
         content=mixed_audio,
@@ -130,17 +113,12 @@ def check_in(request: Request):
     )
 
 
-def get_word_count(mins: int):
-    # Speech Rate = 114 words/minute
-    # 2 mins = 230
-    # 5 mins = 570 
-    # 10 mins = 1,140
-    # 15 mins = 1,700
-    # 20 mins = 2,270
-    match mins:
-        case 2:
-            return "250"
-        case 5:
-            return "600"
-        case 10:
-            return "1200"
\ No newline at end of file
+@vela.get("/metrics")
+def metrics(authorization: str = Header(None)):
+    # Stage durations and provider outcomes of generations run by this service
+    if not scrape_allowed(authorization, os.getenv("METRICS_TOKEN", "")):
+        raise HTTPException(status_code=404, detail="Not Found")
+    body, content_type = render_metrics()
+    if body is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,191 @@
+import os
+import hmac
+import time
+import logging
+import threading
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    Counter = Gauge = Histogram = None
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true" and PROMETHEUS_AVAILABLE
+# Shared by all gunicorn workers; must be set (and emptied) before the workers start
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+# Seconds between ElevenLabs subscription lookups for the quota gauges
+ELEVENLABS_QUOTA_REFRESH = float(os.getenv("METRICS_ELEVENLABS_QUOTA_REFRESH", 300))
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+STAGE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+class _NoopMetric:
+    """
+    Stands in for every metric when prometheus_client is missing or METRICS_ENABLED is off.
+    """
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+_NOOP = _NoopMetric()
+
+
+def _metric(metric_class, name, documentation, labelnames=(), **kwargs):
+    if not METRICS_ENABLED:
+        return _NOOP
+    return metric_class(name, documentation, labelnames, **kwargs)
+
+
+# Values are kept in memory-mapped files under PROMETHEUS_MULTIPROC_DIR when it is set, so an
+# update is a lock and a float write; gauges are summed over live workers (livesum) or take the
+# latest write (mostrecent).
+http_requests = _metric(
+    Counter, "vela_http_requests_total", "HTTP requests by view, method and status",
+    ["view", "method", "status"]
+)
+http_request_duration = _metric(
+    Histogram, "vela_http_request_duration_seconds", "HTTP request latency by view",
+    ["view", "method"], buckets=LATENCY_BUCKETS
+)
+db_queries = _metric(
+    Counter, "vela_db_queries_total", "Database queries run by requests, by view", ["view"]
+)
+db_query_duration = _metric(
+    Counter, "vela_db_query_seconds_total", "Time spent in database queries by requests, by view", ["view"]
+)
+db_queries_per_request = _metric(
+    Histogram, "vela_db_queries_per_request", "Database queries per request, by view",
+    ["view"], buckets=QUERY_COUNT_BUCKETS
+)
+generation_queued = _metric(
+    Gauge, "vela_generation_queued", "Generations waiting for a scheduler slot",
+    ["priority_class"], multiprocess_mode="livesum"
+)
+generation_active = _metric(
+    Gauge, "vela_generation_active", "Generations holding a scheduler slot", multiprocess_mode="livesum"
+)
+generation_queue_wait = _metric(
+    Histogram, "vela_generation_queue_wait_seconds", "Time waited for a generation slot",
+    ["priority_class"], buckets=LATENCY_BUCKETS
+)
+generation_stage_duration = _metric(
+    Histogram, "vela_generation_stage_duration_seconds", "Generation pipeline stage durations",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+provider_requests = _metric(
+    Counter, "vela_provider_requests_total", "Requests to external providers by outcome (ok, error, throttled)",
+    ["provider", "outcome"]
+)
+elevenlabs_characters_used = _metric(
+    Gauge, "vela_elevenlabs_characters_used", "ElevenLabs characters used in the current billing period",
+    multiprocess_mode="mostrecent"
+)
+elevenlabs_characters_limit = _metric(
+    Gauge, "vela_elevenlabs_characters_limit", "ElevenLabs character limit of the current billing period",
+    multiprocess_mode="mostrecent"
+)
+push_notifications = _metric(
+    Counter, "vela_push_notifications_total", "Push notification sends by transport and result (sent, failed, skipped)",
+    ["transport", "result"]
+)
+meditation_fallbacks = _metric(
+    Counter, "vela_meditation_fallbacks_total", "Pre-rendered meditations served instead of a generation",
+    ["reason"]
+)
+
+
+def provider_outcome(error=None):
+    """
+    Outcome label for a provider call: "ok", "throttled" (HTTP 402/429) or "error".
+    """
+    if error is None:
+        return "ok"
+    if getattr(error, "status_code", None) in (402, 429):
+        return "throttled"
+    return "error"
+
+
+def record_provider(provider, error=None):
+    provider_requests.labels(provider, provider_outcome(error)).inc()
+
+
+class _QuotaRefresher:
+    """
+    Update the ElevenLabs quota gauges from the subscription API, off the scrape path.
+
+    A scrape starts a background lookup when the last one is older than
+    ELEVENLABS_QUOTA_REFRESH seconds and is answered with the previous values.
+    """
+
+    def __init__(self, interval=ELEVENLABS_QUOTA_REFRESH):
+        self.interval = interval
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_refresh(self):
+        api_key = os.getenv("ELEVENLABS_API_KEY")
+        if not METRICS_ENABLED or not api_key:
+            return
+        with self._lock:
+            if time.monotonic() - self._refreshed < self.interval:
+                return
+            self._refreshed = time.monotonic()
+        threading.Thread(target=self._refresh, args=(api_key,), name="elevenlabs-quota", daemon=True).start()
+
+    def _refresh(self, api_key):
+        from .api_usage import check_api_usage
+
+        try:
+            character_limit, character_count, _ = check_api_usage(api_key)
+        except Exception as e:
+            logger.warning(f"Could not read ElevenLabs quota: {e}")
+            return
+        elevenlabs_characters_limit.set(character_limit)
+        elevenlabs_characters_used.set(character_count)
+
+
+quota_refresher = _QuotaRefresher()
+
+
+def scrape_allowed(authorization, token):
+    """
+    Whether a scrape may read /metrics: only with METRICS_TOKEN configured and sent as a bearer token.
+    """
+    return bool(token) and hmac.compare_digest(authorization or "", f"Bearer {token}")
+
+
+def render_metrics():
+    """
+    Prometheus text exposition of this process, or of all workers sharing PROMETHEUS_MULTIPROC_DIR.
+
+    Returns:
+        tuple: (body bytes, content type), or (None, None) when metrics are off
+    """
+    if not METRICS_ENABLED:
+        return None, None
+    quota_refresher.maybe_refresh()
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,198 @@
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bitrates in kbps by (MPEG version is 1, layer)
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by version bits (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+# Bytes searched for the next frame after garbage before giving up
+MAX_RESYNC_BYTES = 64 * 1024
+
+
+class InvalidAudioError(Exception):
+    """Raised when data does not look like a playable MP3 stream"""
+
+
+class MP3Info:
+    """
+    Stream properties computed from MP3 frame headers.
+    """
+
+    def __init__(self, frame_count, duration_seconds, bitrate_kbps, sample_rate, channels, size, junk_bytes):
+        self.frame_count = frame_count
+        self.duration_seconds = duration_seconds
+        self.bitrate_kbps = bitrate_kbps
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.size = size
+        self.junk_bytes = junk_bytes
+
+    def __repr__(self):
+        return (
+            f"MP3Info(frames={self.frame_count}, duration={self.duration_seconds:.2f}s, "
+            f"bitrate={self.bitrate_kbps}kbps, sample_rate={self.sample_rate}, size={self.size})"
+        )
+
+
+def _parse_header(header: bytes):
+    """
+    Returns:
+        tuple: (frame length in bytes, samples per frame, sample rate, channels), or None if not a frame header
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer_bits = (header[1] >> 1) & 0x03
+    bitrate_index = (header[2] >> 4) & 0x0F
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    channel_mode = (header[3] >> 6) & 0x03
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        # Reserved values, or "free" bitrate which has no computable frame length
+        return None
+
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, 1 if channel_mode == 3 else 2
+
+
+def _skip_id3v2(stream):
+    header = stream.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        # Syncsafe size: 7 bits per byte; flag 0x10 means a 10 byte footer follows
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        footer = 10 if header[5] & 0x10 else 0
+        stream.seek(size + footer, io.SEEK_CUR)
+    else:
+        stream.seek(-len(header), io.SEEK_CUR)
+
+
+def scan_mp3(source):
+    """
+    Compute duration, bitrate and frame count by walking MP3 frame headers.
+
+    Only the 4-byte header of each frame is read; frame payloads are
+    skipped with seek(), so nothing is decoded. An ID3v2 tag at the start
+    is skipped and short runs of garbage are resynchronized over.
+
+    Args:
+        source: MP3 bytes or a seekable binary file object
+
+    Returns:
+        MP3Info
+
+    Raises:
+        InvalidAudioError: If no MP3 frames are found
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    start = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell() - start
+    stream.seek(start)
+    _skip_id3v2(stream)
+
+    frame_count = 0
+    total_samples = 0
+    audio_bytes = 0
+    junk_bytes = 0
+    sample_rate = None
+    channels = None
+    while True:
+        position = stream.tell()
+        header = stream.read(4)
+        if len(header) < 4:
+            break
+        frame = _parse_header(header)
+        if frame is None:
+            if header[:3] == b"TAG" or header == b"LYRI" or header == b"APET":
+                # ID3v1 / Lyrics3 / APE tag at the end
+                break
+            # Lost sync: look for the next frame header nearby
+            stream.seek(position + 1)
+            window = stream.read(MAX_RESYNC_BYTES)
+            offset = 0
+            while True:
+                offset = window.find(b"\xff", offset)
+                if offset == -1 or _parse_header(window[offset:offset + 4]) is not None:
+                    break
+                offset += 1
+            if offset == -1:
+                junk_bytes += len(window) + 1
+                break
+            junk_bytes += offset + 1
+            stream.seek(position + 1 + offset)
+            continue
+
+        length, samples, rate, frame_channels = frame
+        if position + length > start + size:
+            # Truncated last frame
+            junk_bytes += start + size - position
+            break
+        stream.seek(position + length)
+        frame_count += 1
+        total_samples += samples
+        audio_bytes += length
+        sample_rate = sample_rate or rate
+        channels = channels or frame_channels
+
+    stream.seek(start)
+    if not frame_count:
+        raise InvalidAudioError("No MP3 frames found")
+
+    duration = total_samples / sample_rate
+    return MP3Info(
+        frame_count=frame_count,
+        duration_seconds=duration,
+        bitrate_kbps=int(round(audio_bytes * 8 / duration / 1000)) if duration else 0,
+        sample_rate=sample_rate,
+        channels=channels,
+        size=size,
+        junk_bytes=junk_bytes,
+    )
+
+
+def validate_mp3(data: bytes, min_duration: float = 1.0, max_junk_ratio: float = 0.05):
+    """
+    Reject audio that is not a sane MP3 before it is stored or served.
+
+    Args:
+        data: MP3 bytes
+        min_duration: Shortest acceptable duration in seconds
+        max_junk_ratio: Largest acceptable share of bytes outside frames
+
+    Returns:
+        MP3Info
+
+    Raises:
+        InvalidAudioError: If the audio is not MP3, too short, or mostly garbage
+    """
+    info = scan_mp3(data)
+    if info.duration_seconds < min_duration:
+        raise InvalidAudioError(f"Audio is too short ({info.duration_seconds:.2f}s)")
+    if info.size and info.junk_bytes / info.size > max_junk_ratio:
+        raise InvalidAudioError(f"{info.junk_bytes} of {info.size} bytes are not MP3 frames")
+    return info
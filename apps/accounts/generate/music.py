@@ -1,9 +1,82 @@
 import io
 import os
 import logging
+from collections import namedtuple
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MUSIC_PATH = "music.mp3"
+DEFAULT_MUSIC_GAIN = -6  # dB
+DEFAULT_SPEECH_GAIN = -4  # dB
+
+# PCM layout of decoded audio; 0 keeps a property as decoded
+AudioFormat = namedtuple("AudioFormat", ["sample_rate", "channels", "sample_width"])
+NATIVE_FORMAT = AudioFormat(0, 0, 0)
+# Mixing runs in this format (speech is mono, so mono 22.05 kHz 16-bit by default)...
+PROCESSING_FORMAT = AudioFormat(
+    int(os.getenv("MIX_SAMPLE_RATE", 22050)),
+    int(os.getenv("MIX_CHANNELS", 1)),
+    int(os.getenv("MIX_SAMPLE_WIDTH", 2)),
+)
+# ...and is converted to this one only by the encoder
+OUTPUT_FORMAT = AudioFormat(
+    int(os.getenv("MIX_OUTPUT_SAMPLE_RATE", 44100)),
+    int(os.getenv("MIX_OUTPUT_CHANNELS", 2)),
+    0,
+)
+MIX_OUTPUT_BITRATE = os.getenv("MIX_OUTPUT_BITRATE", "128k")
+
+
+def to_format(audio, audio_format):
+    """
+    Convert a pydub AudioSegment to audio_format (channels first, so resampling touches less data).
+    """
+    if audio_format.channels and audio.channels != audio_format.channels:
+        audio = audio.set_channels(audio_format.channels)
+    if audio_format.sample_rate and audio.frame_rate != audio_format.sample_rate:
+        audio = audio.set_frame_rate(audio_format.sample_rate)
+    if audio_format.sample_width and audio.sample_width != audio_format.sample_width:
+        audio = audio.set_sample_width(audio_format.sample_width)
+    return audio
+
+
+def encoder_parameters(audio_format):
+    """
+    ffmpeg arguments that make the encoder write audio_format.
+    """
+    parameters = []
+    if audio_format.sample_rate:
+        parameters += ["-ar", str(audio_format.sample_rate)]
+    if audio_format.channels:
+        parameters += ["-ac", str(audio_format.channels)]
+    return parameters
+
+
+def export_mp3(audio, output_format=OUTPUT_FORMAT, bitrate=MIX_OUTPUT_BITRATE):
+    """
+    Encode an AudioSegment as MP3 in output_format.
+
+    Returns:
+        bytes: MP3 audio
+    """
+    buffer = io.BytesIO()
+    audio.export(buffer, format="mp3", bitrate=bitrate, parameters=encoder_parameters(output_format))
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=4)
+def load_music(music_path, audio_format=PROCESSING_FORMAT):
+    """
+    Decode a music bed in audio_format.
+
+    Cached per process: the audio pool workers decode each bed once
+    instead of once per mix. AudioSegments are immutable, so sharing is safe.
+    """
+    from pydub import AudioSegment
+
+    return to_format(AudioSegment.from_file(music_path), audio_format)
+
 def convert_wav_to_mp3(wav_file_path, output_path=None):
     """
     Convert a .wav file to .mp3 format.
@@ -78,15 +151,27 @@ def convert_wav_bytes_to_mp3(wav_bytes):
         logger.error(f"Error converting .wav bytes to .mp3: {e}")
         raise
 
-def mix_music(meditation, input_format="mp3"):
+def mix_music(meditation, input_format="mp3", music_path=DEFAULT_MUSIC_PATH,
+              music_gain=DEFAULT_MUSIC_GAIN, speech_gain=DEFAULT_SPEECH_GAIN,
+              processing_format=PROCESSING_FORMAT, output_format=OUTPUT_FORMAT):
     """
     Mix meditation audio with background music.
     Supports both WAV and MP3 input formats.
     Fallback implementation when pydub is not available.
     
+    Speech and music are converted to processing_format right after
+    decoding, so speed change, fades and the overlay run on (by default)
+    mono 22.05 kHz samples; the encoder converts to output_format.
+    NATIVE_FORMAT for both keeps the audio as decoded.
+    
     Args:
         meditation: Audio bytes (WAV or MP3)
         input_format: Format of input audio ("wav" or "mp3")
+        music_path: Background music file (the music bed)
+        music_gain: Music gain in dB
+        speech_gain: Speech gain in dB
+        processing_format: AudioFormat the mix is computed in
+        output_format: AudioFormat of the MP3
     """
     try:
         from pydub import AudioSegment
@@ -96,7 +181,7 @@ def mix_music(meditation, input_format="mp3"):
         AudioSegment.ffprobe = os.path.join(base_dir, "ffprobe.exe") 
         
         # Load audio file
-        music = AudioSegment.from_file("music.mp3")
+        music = load_music(music_path, processing_format)
         
         # Load speech audio - detect format automatically or use specified format
         if input_format.lower() == "wav":
@@ -108,18 +193,19 @@ def mix_music(meditation, input_format="mp3"):
             except:
                 speech_original = AudioSegment.from_file(io.BytesIO(meditation), format="mp3")
         
-        speech = change_speed(speech_original)
+        speech = change_speed(to_format(speech_original, processing_format))
+        del speech_original
 
         # Add delay to speech (5s of silence at the beginning)
-        speech = AudioSegment.silent(duration=5000) + speech
+        speech = AudioSegment.silent(duration=5000, frame_rate=speech.frame_rate) + speech
 
         # Adjust music to match new length
         music_duration = len(speech) + 20000
         music = music[:music_duration]
 
         # Adjust volume
-        speech = speech - 4
-        music = music - 6
+        speech = speech + speech_gain
+        music = music + music_gain
 
         # Fade music
         music = music.fade_in(3000).fade_out(20000)
@@ -128,11 +214,7 @@ def mix_music(meditation, input_format="mp3"):
         combined = music.overlay(speech)
 
         # Return Bytes - always export as MP3 for smaller file size
-        buffer = io.BytesIO()
-        combined.export(buffer, format="mp3")
-        buffer.seek(0)
-
-        return buffer.read()
+        return export_mp3(combined, output_format)
         
     except ImportError as e:
         logger.warning(f"pydub not available: {e}. Using fallback implementation.")
@@ -141,6 +223,115 @@ def mix_music(meditation, input_format="mp3"):
         logger.error(f"Error in pydub audio processing: {e}. Using fallback implementation.")
         return _fallback_mix_music(meditation)
 
+def mix_section(speech=None, position=0, duration=0, music_path=DEFAULT_MUSIC_PATH,
+                processing_format=PROCESSING_FORMAT, fade_in=0, fade_out=0):
+    """
+    One section of a progressive mix: the music bed from position with speech on top.
+
+    Args:
+        speech: Speech chunk (WAV or MP3 bytes), or None for a music-only section
+        position: Offset into the music bed in milliseconds
+        duration: Length of a music-only section in milliseconds
+        music_path: Background music file (the music bed)
+        processing_format: AudioFormat the section is computed in
+        fade_in: Music fade-in in milliseconds
+        fade_out: Music fade-out in milliseconds
+
+    Returns:
+        AudioSegment: The mixed section
+    """
+    from pydub import AudioSegment
+
+    if speech:
+        try:
+            speech_audio = AudioSegment.from_file(io.BytesIO(speech), format="wav")
+        except:
+            speech_audio = AudioSegment.from_file(io.BytesIO(speech), format="mp3")
+        speech_audio = change_speed(to_format(speech_audio, processing_format)) + DEFAULT_SPEECH_GAIN
+        duration = len(speech_audio)
+
+    music = load_music(music_path, processing_format)[position:position + duration]
+    if len(music) < duration:
+        # Music track is shorter than the meditation
+        music += AudioSegment.silent(duration=duration - len(music), frame_rate=music.frame_rate)
+    music = music + DEFAULT_MUSIC_GAIN
+    if fade_in:
+        music = music.fade_in(fade_in)
+    if fade_out:
+        music = music.fade_out(fade_out)
+    return music.overlay(speech_audio) if speech else music
+
+class ProgressiveMix:
+    """
+    Mix speech chunks with background music as they arrive.
+    
+    Produces the same result as mix_music (5s intro with a 3s music fade-in,
+    20s faded music tail) but emits mixed audio chunk by chunk, e.g. to an
+    HLSWriter, instead of only at the end. With a pool (AudioProcessPool)
+    every section is mixed and the final MP3 encoded in the pool; only WAV
+    parsing and concatenation stay in the calling thread.
+    """
+
+    def __init__(self, writer=None, music_path=DEFAULT_MUSIC_PATH,
+                 processing_format=PROCESSING_FORMAT, output_format=OUTPUT_FORMAT, pool=None):
+        self.writer = writer
+        self.music_path = music_path
+        self.processing_format = processing_format
+        self.output_format = output_format
+        self.pool = pool
+        self.position = 0
+        self.parts = []
+
+        # Delay speech by 5s while the music fades in
+        self._emit(self._section(duration=5000, fade_in=3000))
+
+    def _section(self, speech=None, **options):
+        options.update(position=self.position, music_path=self.music_path, processing_format=self.processing_format)
+        if self.pool is None:
+            return mix_section(speech, **options)
+
+        from pydub import AudioSegment
+
+        return AudioSegment.from_wav(io.BytesIO(self.pool.mix_section(speech or b"", **options)))
+
+    def _emit(self, audio):
+        self.parts.append(audio)
+        self.position += len(audio)
+        if self.writer:
+            self.writer.write(audio)
+
+    def add_speech(self, speech_bytes):
+        """
+        Mix the next chunk of synthesized speech (WAV or MP3 bytes).
+        """
+        self._emit(self._section(speech_bytes))
+
+    def add_silence(self, duration):
+        """
+        Music-only gap between speech chunks.
+        """
+        self._emit(self._section(duration=duration))
+
+    def finish(self, export=True):
+        """
+        Add the faded music tail and close the writer.
+        
+        Returns:
+            bytes: The whole mix as MP3, or None if export is False
+        """
+        self._emit(self._section(duration=20000, fade_out=20000))
+        if self.writer:
+            self.writer.close()
+        if not export:
+            return None
+
+        combined = self.parts[0]
+        for part in self.parts[1:]:
+            combined += part
+        if self.pool is None:
+            return export_mp3(combined, self.output_format)
+        return self.pool.export(combined, format="mp3", bitrate=MIX_OUTPUT_BITRATE, parameters=encoder_parameters(self.output_format))
+
 def _fallback_mix_music(meditation):
     """
     Fallback implementation that returns the original meditation audio
@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: tracemalloc slows allocation-heavy code noticeably
+GENERATION_MEMORY_PROFILE = os.getenv("GENERATION_MEMORY_PROFILE", "False").lower() == "true"
+# Allocation sites reported per stage
+MEMORY_TOP_SITES = int(os.getenv("GENERATION_MEMORY_TOP_SITES", 10))
+# Stack frames kept per allocation (1 = the allocating line only)
+MEMORY_TRACE_FRAMES = int(os.getenv("GENERATION_MEMORY_TRACE_FRAMES", 1))
+# Seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL = float(os.getenv("GENERATION_RSS_SAMPLE_INTERVAL", 0.05))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_lock = threading.Lock()
+_active = 0
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes.
+
+    Read from /proc on Linux; elsewhere the peak RSS so far is the best available value.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSSampler:
+    """
+    Track the highest RSS seen while a stage runs, from a background thread.
+
+    Native buffers (ffmpeg pipes, numpy arrays) do not show up in
+    tracemalloc, so RSS is sampled alongside it.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_bytes = current_rss()
+        self.peak_bytes = self.start_bytes
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, current_rss())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss())
+
+
+def _start_tracing():
+    global _active
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        _active += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    global _active
+    with _lock:
+        _active -= 1
+        if not _active:
+            tracemalloc.stop()
+
+
+def _top_sites(before, after, limit):
+    sites = []
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        sites.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_bytes": stat.size_diff,
+            "count": stat.count_diff,
+        })
+    return sites
+
+
+@contextmanager
+def profile_memory(stage, enabled=None):
+    """
+    Measure the memory a pipeline stage allocates, when GENERATION_MEMORY_PROFILE is on.
+
+    Yields a dict that is filled in when the stage ends:
+    peak_traced_bytes (tracemalloc peak above the start), retained_bytes,
+    rss_start_bytes / rss_peak_bytes and top_sites, the allocation sites
+    that grew the most between the start and the end of the stage.
+    tracemalloc is process-wide, so concurrent generations in one worker
+    inflate each other's numbers; profile with low concurrency.
+
+    Args:
+        stage: Stage name for the log line
+        enabled: Override GENERATION_MEMORY_PROFILE
+
+    Yields:
+        dict or None: Memory report, None when profiling is off
+    """
+    if not (GENERATION_MEMORY_PROFILE if enabled is None else enabled):
+        yield None
+        return
+
+    _start_tracing()
+    report = {}
+    try:
+        before = tracemalloc.take_snapshot()
+        start_traced = tracemalloc.get_traced_memory()[0]
+        sampler = RSSSampler().start()
+        try:
+            yield report
+        finally:
+            sampler.stop()
+            current_traced, peak_traced = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            report.update({
+                "peak_traced_bytes": max(0, peak_traced - start_traced),
+                "retained_bytes": current_traced - start_traced,
+                "rss_start_bytes": sampler.start_bytes,
+                "rss_peak_bytes": sampler.peak_bytes,
+                "top_sites": _top_sites(before, after, MEMORY_TOP_SITES),
+            })
+            logger.info(
+                f"Generation stage '{stage}' memory: peak {report['peak_traced_bytes'] / 1048576:.1f} MB traced, "
+                f"RSS {sampler.start_bytes / 1048576:.0f} -> {sampler.peak_bytes / 1048576:.0f} MB peak"
+            )
+    finally:
+        _stop_tracing()
+
+
+def profiled_call(stage, call, *args):
+    """
+    Run call(*args) under profile_memory, e.g. in an audio pool worker.
+
+    Returns:
+        tuple: (result, seconds, memory report or None)
+    """
+    started = time.perf_counter()
+    with profile_memory(stage) as memory:
+        result = call(*args)
+    return result, time.perf_counter() - started, memory
@@ -0,0 +1,119 @@
+import math
+import os
+import re
+import logging
+from .music import OUTPUT_FORMAT, encoder_parameters
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "index.m3u8"
+
+
+def split_script(script: str, max_chars: int = 600):
+    """
+    Split a script into sentence-aligned chunks for incremental synthesis.
+
+    Args:
+        script: Generated meditation script
+        max_chars: Soft limit on characters per chunk
+
+    Returns:
+        list: Chunks of whole sentences
+    """
+    sentences = re.split(r'(?<=[.!?])\s+', script.strip())
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class HLSWriter:
+    """
+    Write audio as fixed-length HLS segments plus an EVENT playlist.
+
+    The playlist is rewritten after every segment so players can start while
+    later segments are still being produced. close() writes the remainder
+    and marks the playlist ended. Segments are AAC in MPEG-TS, encoded in
+    output_format whatever format the mix is computed in; with a pool
+    (AudioProcessPool) the encoding runs there.
+    """
+
+    def __init__(self, directory: str, segment_seconds: int = 6, bitrate: str = "128k", output_format=OUTPUT_FORMAT,
+                 pool=None):
+        self.directory = directory
+        self.segment_ms = segment_seconds * 1000
+        self.bitrate = bitrate
+        self.output_format = output_format
+        self.pool = pool
+        self._pending = None
+        self._segments = []
+        self._ended = False
+        os.makedirs(directory, exist_ok=True)
+        self._write_playlist()
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.directory, PLAYLIST_NAME)
+
+    def write(self, audio):
+        """
+        Append audio (pydub AudioSegment) and flush every complete segment.
+        """
+        self._pending = audio if self._pending is None else self._pending + audio
+        while len(self._pending) >= self.segment_ms:
+            self._flush(self._pending[:self.segment_ms])
+            self._pending = self._pending[self.segment_ms:]
+
+    def close(self):
+        """
+        Flush the remaining audio and mark the playlist ended.
+        """
+        if self._ended:
+            return
+        if self._pending is not None and len(self._pending) > 0:
+            self._flush(self._pending)
+        self._pending = None
+        self._ended = True
+        self._write_playlist()
+
+    def _flush(self, audio):
+        name = f"segment_{len(self._segments):05d}.ts"
+        temp_path = os.path.join(self.directory, f"{name}.part")
+        parameters = encoder_parameters(self.output_format)
+        if self.pool is None:
+            audio.export(temp_path, format="mpegts", codec="aac", bitrate=self.bitrate, parameters=parameters)
+        else:
+            segment = self.pool.export(audio, format="mpegts", codec="aac", bitrate=self.bitrate, parameters=parameters)
+            with open(temp_path, "wb") as f:
+                f.write(segment)
+        os.replace(temp_path, os.path.join(self.directory, name))
+        self._segments.append((name, len(audio) / 1000))
+        self._write_playlist()
+
+    def _write_playlist(self):
+        target_duration = max([duration for _, duration in self._segments] + [self.segment_ms / 1000])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(target_duration)}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for name, duration in self._segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if self._ended:
+            lines.append("#EXT-X-ENDLIST")
+
+        # Replace atomically so players never read a half-written playlist
+        temp_path = f"{self.playlist_path}.part"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.playlist_path)
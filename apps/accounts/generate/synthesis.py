@@ -1,45 +1,104 @@
 import os
+import re
+import time
+import random
+import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from elevenlabs import ElevenLabs, VoiceSettings
+from .tts_cache import segment_cache, segment_key
+from .tracing import tracer
+from .metrics import record_provider
 
-def synthesize_audio(input: str, voice: str = "female"):
+logger = logging.getLogger(__name__)
+
+# Voice IDs mapping
+VOICE_IDS = {
+    "female": "Z3R5wn05IrDiVCyEkUrK",  # Arabella - Female
+    "male": "kPzsL2i3teMYv0FxEYQ6",     # Brittney - Male voice
+}
+
+# Other voices
+# Brittney - "kPzsL2i3teMYv0FxEYQ6"
+# Juniper  - "aMSt68OGf4xUZAnLpTU8"
+# Clara    - "Qggl4b0xRMiqOwhPtVWT"
+# Arabella - "Z3R5wn05IrDiVCyEkUrK"
+# Jessica Anne - "lxYfHSkYm1EzQzGhdbfc"
+# Nicole - "piTKgcLEGmPE4e6mEKli"
+
+VOICE_SETTINGS = {
+    "stability": 1.0,
+    "use_speaker_boost": False,
+    "similarity_boost": 1.0,
+    "style": 0.0,
+    "speed": 0.76,
+}
+
+MODEL_ID = "eleven_multilingual_v2"
+
+# Silence spliced between sentences synthesized separately (stands in for the ' --- ' pause)
+SENTENCE_PAUSE_MS = 1000
+# Parallel ElevenLabs requests for the uncached sentences of one script
+SENTENCE_CONCURRENCY = int(os.getenv("TTS_SENTENCE_CONCURRENCY", 3))
+# Throttled requests (concurrency limit, busy system) are retried with exponential backoff
+TTS_THROTTLE_RETRIES = int(os.getenv("TTS_THROTTLE_RETRIES", 3))
+TTS_THROTTLE_BACKOFF_SECONDS = float(os.getenv("TTS_THROTTLE_BACKOFF_SECONDS", 1.0))
+THROTTLE_STATUSES = {"too_many_concurrent_requests", "system_busy"}
+
+
+def get_voice_id(voice: str):
+    # Get the appropriate voice ID, default to Female if voice not found
+    return VOICE_IDS.get(voice.lower(), VOICE_IDS["female"])
+
+
+def is_throttle(error):
+    """
+    Whether an ElevenLabs error is a momentary throttle rather than exhausted quota or a bad request.
+    """
+    body = getattr(error, "body", None)
+    detail = body.get("detail") if isinstance(body, dict) else None
+    if isinstance(detail, dict) and detail.get("status"):
+        return detail["status"] in THROTTLE_STATUSES
+    return getattr(error, "status_code", None) == 429
+
+
+def _stream(text: str, voice_id: str):
+    with tracer.span("elevenlabs.tts", kind="client", attributes={"tts.characters": len(text), "tts.voice_id": voice_id}) as span:
+        attempt = 0
+        while True:
+            try:
+                meditation = _request_speech(text, voice_id)
+                break
+            except Exception as e:
+                record_provider("elevenlabs", e)
+                if attempt >= TTS_THROTTLE_RETRIES or not is_throttle(e):
+                    raise
+                # Jittered so parallel sentence requests do not retry in lockstep
+                delay = TTS_THROTTLE_BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+                attempt += 1
+                logger.info(f"ElevenLabs throttled the request, retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+        record_provider("elevenlabs")
+        if span:
+            span.set_attribute("tts.attempts", attempt + 1)
+            span.set_attribute("tts.bytes", len(meditation))
+        return meditation
+
+
+def _request_speech(text: str, voice_id: str):
     # Initialize the Eleven Labs client
     load_dotenv()
-    print(os.getenv("ELEVENLABS_API_KEY"))
     client = ElevenLabs(
       api_key = os.getenv("ELEVENLABS_API_KEY"),
     )
-    
-    # Voice IDs mapping
-    voice_ids = {
-        "female": "Z3R5wn05IrDiVCyEkUrK",  # Arabella - Female
-        "male": "kPzsL2i3teMYv0FxEYQ6",     # Brittney - Male voice
-    }
-    
-    # Get the appropriate voice ID, default to Female if voice not found
-    voice_id = voice_ids.get(voice.lower(), voice_ids["female"])
-    
+
     # Create an audio generator
     audio = client.text_to_speech.stream(
-        text = input,
-        
-        # Voice IDs
-        # Brittney - "kPzsL2i3teMYv0FxEYQ6"
-        # Juniper  - "aMSt68OGf4xUZAnLpTU8"
-        # Clara    - "Qggl4b0xRMiqOwhPtVWT"
-        # Arabella - "Z3R5wn05IrDiVCyEkUrK"
-        # Jessica Anne - "lxYfHSkYm1EzQzGhdbfc"
-        # Nicole - "piTKgcLEGmPE4e6mEKli"
-
+        text = text,
         voice_id = voice_id,
-        voice_settings = VoiceSettings(
-            stability=1.0,
-            use_speaker_boost=False,
-            similarity_boost=1.0,
-            style=0.0,
-            speed=0.76,
-        ),
-        model_id = "eleven_multilingual_v2",
+        voice_settings = VoiceSettings(**VOICE_SETTINGS),
+        model_id = MODEL_ID,
     )
 
     # Iterate through the generator returned to collect audio bytes
@@ -48,4 +107,76 @@ def synthesize_audio(input: str, voice: str = "female"):
         if chunk:
             meditation += chunk
 
-    return meditation
\ No newline at end of file
+    return meditation
+
+
+def synthesize_audio(input: str, voice: str = "female"):
+    return _stream(input, get_voice_id(voice))
+
+
+def split_sentences(script: str):
+    return [sentence for sentence in re.split(r'(?<=[.!?])\s+', script.strip()) if sentence]
+
+
+@lru_cache(maxsize=4)
+def _silence(duration_ms: int):
+    """MP3 silence in the ElevenLabs output format (44.1 kHz, 128 kbps), spliced between sentences"""
+    import io
+    from pydub import AudioSegment
+
+    buffer = io.BytesIO()
+    AudioSegment.silent(duration=duration_ms, frame_rate=44100).export(buffer, format="mp3", bitrate="128k")
+    return buffer.getvalue()
+
+
+def synthesize_sentences(script: str, voice: str = "female", cache=segment_cache):
+    """
+    Synthesize a script sentence by sentence, reusing cached sentences.
+
+    Segments are keyed by normalized sentence text, voice id, voice settings
+    and model id. Cached segments are spliced in as they are; only uncached
+    sentences are sent to ElevenLabs (in parallel) and then cached. Sentences
+    are joined with SENTENCE_PAUSE_MS of silence.
+
+    Args:
+        script: Meditation script without pause markers
+        voice: Voice type ("female" or "male")
+        cache: SegmentCache to use
+
+    Returns:
+        bytes: MP3 audio of the whole script
+
+    Raises:
+        ApiError: If ElevenLabs rejects a synthesis request
+    """
+    voice_id = get_voice_id(voice)
+    sentences = split_sentences(script)
+    keys = [segment_key(sentence, voice_id, VOICE_SETTINGS, MODEL_ID) for sentence in sentences]
+
+    segments = {}
+    missing = {}
+    for sentence, key in zip(sentences, keys):
+        if key in segments or key in missing:
+            continue
+        data = cache.get(key)
+        if data is not None:
+            segments[key] = data
+        else:
+            missing[key] = sentence
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, min(SENTENCE_CONCURRENCY, len(missing)))) as pool:
+            synthesize = tracer.wrap(lambda sentence: _stream(sentence, voice_id))
+            results = dict(zip(missing, pool.map(synthesize, missing.values())))
+        for key, data in results.items():
+            cache.put(key, data)
+            segments[key] = data
+
+    saved = sum(len(sentence) for sentence, key in zip(sentences, keys) if key not in missing)
+    logger.info(
+        f"Synthesized {len(missing)} of {len(sentences)} sentences, "
+        f"{saved} characters served from the TTS cache"
+    )
+
+    pause = _silence(SENTENCE_PAUSE_MS)
+    return pause.join(segments[key] for key in keys)
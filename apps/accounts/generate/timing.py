@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .metrics import generation_stage_duration
+from .profiling import profile_memory
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Finished traces kept per process for the queue statistics view
+RECENT_TRACES = 20
+
+
+class StageStats:
+    """
+    Exponentially weighted moving averages of pipeline stage durations.
+
+    Stages are the steps of a generation ("llm", "tts", "mix") plus "external"
+    for a full round trip to the generation API. Averages are per process.
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._averages = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            previous = self._averages.get(stage)
+            if previous is None:
+                self._averages[stage] = seconds
+            else:
+                self._averages[stage] = self.alpha * seconds + (1 - self.alpha) * previous
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def get(self, stage, default=None):
+        with self._lock:
+            return self._averages.get(stage, default)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: {'ewma_seconds': round(average, 3), 'samples': self._counts.get(stage, 0)}
+                for stage, average in self._averages.items()
+            }
+
+
+stage_stats = StageStats()
+
+
+class GenerationTrace:
+    """
+    Stage-by-stage record of one generation.
+
+    Each stage adds its duration and, in memory profiling mode, its memory
+    report. The finished trace is logged as one JSON line and kept in
+    recent_traces.
+    """
+
+    def __init__(self, name, trace_id=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.started = time.time()
+        self.stages = []
+        self.error = None
+
+    def add_stage(self, stage, seconds, memory=None):
+        record = {'stage': stage, 'seconds': round(seconds, 3)}
+        if memory:
+            record['memory'] = memory
+        self.stages.append(record)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'started': self.started,
+            'seconds': round(time.time() - self.started, 3),
+            'stages': self.stages,
+            'error': self.error,
+        }
+
+
+current_trace = ContextVar('generation_trace', default=None)
+recent_traces = deque(maxlen=RECENT_TRACES)
+
+
+@contextmanager
+def generation_trace(name):
+    """
+    Collect the stages of a generation into a GenerationTrace.
+
+    Nested calls join the trace that is already open. With tracing on the
+    generation is also a span, and the trace records its trace id.
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        yield trace
+        return
+
+    with tracer.span(f"generation {name}") as span:
+        trace = GenerationTrace(name, span.context.trace_id if span else None)
+        token = current_trace.set(trace)
+        try:
+            yield trace
+        except Exception as e:
+            trace.error = str(e)
+            raise
+        finally:
+            current_trace.reset(token)
+            recent_traces.append(trace.as_dict())
+            logger.info(f"Generation trace {json.dumps(trace.as_dict(), default=str)}")
+
+
+def record_stage(stage, seconds, memory=None):
+    """
+    Fold a stage duration into its moving average, its histogram and the current trace.
+    """
+    stage_stats.record(stage, seconds)
+    generation_stage_duration.labels(stage).observe(seconds)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds, memory)
+
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Time a pipeline stage and fold successful runs into its moving average.
+
+    Failed runs are not recorded so that fast failures do not make the
+    pipeline look faster than it is. In memory profiling mode the stage's
+    allocations are attached to the current trace.
+    """
+    start = time.perf_counter()
+    with tracer.span(f"stage.{stage}") as span, profile_memory(stage) as memory:
+        yield
+    elapsed = time.perf_counter() - start
+    if span and memory:
+        span.set_attribute("memory.peak_traced_bytes", memory["peak_traced_bytes"])
+        span.set_attribute("memory.rss_peak_bytes", memory["rss_peak_bytes"])
+    record_stage(stage, elapsed, memory)
+    logger.info(f"Generation stage '{stage}' took {elapsed:.2f}s")
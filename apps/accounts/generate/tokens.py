@@ -0,0 +1,68 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def usage_of(message):
+    """
+    Token usage of a chat model response.
+
+    Returns:
+        dict: input_tokens, output_tokens and cached_tokens (0 when the provider does not report them)
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        details = usage.get("input_token_details") or {}
+        return {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": details.get("cache_read", 0) or 0,
+        }
+    # Older integrations only report the raw provider usage
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "input_tokens": token_usage.get("prompt_tokens", 0),
+        "output_tokens": token_usage.get("completion_tokens", 0),
+        "cached_tokens": (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0,
+    }
+
+
+class TokenStats:
+    """
+    LLM token totals per ritual type ("sleep", "spark", "calm", "dream", ...).
+
+    Per process, like StageStats. Used to track input tokens per generation
+    and how much of the static prompt prefix the provider serves from cache.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, label, usage):
+        label = label or "unlabeled"
+        with self._lock:
+            totals = self._totals.setdefault(
+                label, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+            )
+            totals["calls"] += 1
+            for key in ("input_tokens", "output_tokens", "cached_tokens"):
+                totals[key] += usage.get(key, 0)
+        logger.info(
+            f"LLM tokens for '{label}': {usage.get('input_tokens', 0)} in "
+            f"({usage.get('cached_tokens', 0)} cached), {usage.get('output_tokens', 0)} out"
+        )
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                label: dict(
+                    totals,
+                    input_tokens_per_call=round(totals["input_tokens"] / totals["calls"], 1),
+                )
+                for label, totals in self._totals.items()
+            }
+
+
+token_stats = TokenStats()
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "False").lower() == "true"
+# Share of new traces recorded; requests arriving with a traceparent follow the caller's decision
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+# Spans are appended here as JSON lines...
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+# ...and/or posted to an OpenTelemetry collector (OTLP/HTTP JSON, e.g. http://localhost:4318/v1/traces)
+TRACE_EXPORT_OTLP_URL = os.getenv("TRACE_EXPORT_OTLP_URL", "")
+TRACE_EXPORT_BATCH = int(os.getenv("TRACE_EXPORT_BATCH", 64))
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class SpanContext:
+    """
+    W3C trace context: trace id, span id and the sampled flag.
+    """
+
+    def __init__(self, trace_id, span_id, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def parse(cls, header):
+        """
+        Read a traceparent header value.
+
+        Returns:
+            SpanContext or None if the header is missing or malformed
+        """
+        match = _TRACEPARENT.match((header or "").strip().lower())
+        if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+            return None
+        return cls(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+class Span:
+    """
+    A timed operation in a trace.
+    """
+
+    def __init__(self, name, context, parent_id=None, kind="internal", attributes=None, service_name=None):
+        self.name = name
+        self.context = context
+        self.service_name = service_name
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def as_dict(self, service_name):
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": service_name,
+            "start_unix_nano": self.start_ns,
+            "end_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def otlp_payload(spans, service_name):
+    """
+    OTLP/HTTP JSON request body for finished span dicts.
+    """
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "vela.tracing"},
+                "spans": [{
+                    "traceId": span["trace_id"],
+                    "spanId": span["span_id"],
+                    "parentSpanId": span["parent_span_id"] or "",
+                    "name": span["name"],
+                    "kind": _OTLP_KINDS.get(span["kind"], 1),
+                    "startTimeUnixNano": str(span["start_unix_nano"]),
+                    "endTimeUnixNano": str(span["end_unix_nano"]),
+                    "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span["attributes"].items()],
+                    "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+                } for span in spans],
+            }],
+        }],
+    }
+
+
+class SpanExporter:
+    """
+    Write finished spans from a background thread, so requests never wait on export.
+
+    Spans are queued and written in batches to TRACE_EXPORT_FILE (one JSON
+    object per line, safe to append from several processes) and/or posted
+    to TRACE_EXPORT_OTLP_URL. When the queue is full spans are dropped.
+    """
+
+    def __init__(self, path=TRACE_EXPORT_FILE, otlp_url=TRACE_EXPORT_OTLP_URL, batch_size=TRACE_EXPORT_BATCH):
+        self.path = path
+        self.otlp_url = otlp_url
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=batch_size * 32)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, span_dict, service_name):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((span_dict, service_name))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=0.5))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.warning(f"Could not export {len(batch)} spans: {e}")
+
+    def _write(self, batch):
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write("".join(json.dumps(span, default=str) + "\n" for span, _ in batch))
+        if self.otlp_url:
+            by_service = {}
+            for span, service_name in batch:
+                by_service.setdefault(service_name, []).append(span)
+            for service_name, spans in by_service.items():
+                request = urllib.request.Request(
+                    self.otlp_url, data=json.dumps(otlp_payload(spans, service_name)).encode("utf-8"),
+                    headers={"Content-Type": "application/json"}, method="POST"
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Minimal W3C trace-context tracer shared by the Django API and the FastAPI generator.
+
+    Spans nest through a context variable; the traceparent header carries
+    the current span to the next hop, which continues the same trace. Work
+    handed to other threads keeps its parent through wrap(). A span opened
+    inside another span of this process reports that span's service, so
+    shared code traced with the module tracer is attributed to the service
+    whose tracer opened the enclosing span.
+    """
+
+    def __init__(self, service_name, exporter=None, enabled=TRACING_ENABLED, sample_rate=TRACE_SAMPLE_RATE):
+        self.service_name = service_name
+        self.exporter = exporter or SpanExporter()
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+
+    def current_span(self):
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name, parent=None, kind="internal", attributes=None):
+        """
+        Record a span around the block, as a child of parent or of the current span.
+
+        Args:
+            name: Span name (e.g. "stage.tts")
+            parent: SpanContext from an incoming traceparent, for server spans
+            kind: "internal", "server" or "client"
+            attributes: Initial span attributes
+
+        Yields:
+            Span or None when tracing is off or the trace is not sampled
+        """
+        current = _current_span.get()
+        parent_context = parent or (current.context if current else None)
+        if not self.enabled or (parent_context is not None and not parent_context.sampled):
+            yield None
+            return
+        if parent_context is None and random.random() >= self.sample_rate:
+            yield None
+            return
+
+        trace_id = parent_context.trace_id if parent_context else os.urandom(16).hex()
+        span = Span(
+            name, SpanContext(trace_id, os.urandom(8).hex()),
+            parent_id=parent_context.span_id if parent_context else None,
+            kind=kind, attributes=attributes,
+            service_name=current.service_name if current and parent is None else self.service_name
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.exporter.export(span.as_dict(span.service_name), span.service_name)
+
+    def inject(self, headers):
+        """
+        Add the traceparent of the current span to outgoing request headers.
+        """
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.context.traceparent
+        return headers
+
+    def wrap(self, func):
+        """
+        Bind func to the current context, for thread and executor hand-offs.
+
+        Each call runs in its own copy, so the wrapped function can run in
+        several threads at once.
+        """
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+tracer = Tracer(os.getenv("TRACE_SERVICE_NAME", "vela-api"))
@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vela_tts_cache"))
+
+
+def normalize_text(text: str):
+    """
+    Normalize a sentence for cache lookups: collapse whitespace, unify quotes and dashes.
+    Case is kept because it can change the delivery.
+    """
+    text = text.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    text = text.replace("—", "-").replace("–", "-")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def segment_key(text: str, voice_id: str, voice_settings: dict, model_id: str):
+    """
+    Cache key of a synthesized segment.
+
+    Args:
+        text: Sentence text (normalized here)
+        voice_id: ElevenLabs voice id
+        voice_settings: Voice settings used for the request
+        model_id: ElevenLabs model id
+
+    Returns:
+        str: Hex SHA-256 of the normalized text and every synthesis parameter
+    """
+    data = {
+        "text": normalize_text(text),
+        "voice_id": voice_id,
+        "voice_settings": voice_settings,
+        "model_id": model_id,
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SegmentCache:
+    """
+    Two-tier cache of synthesized speech segments.
+
+    An in-process LRU (bounded by bytes) sits in front of a shared disk
+    tier, so recurring intros and closings are synthesized once and then
+    spliced into later meditations. The disk tier is bounded by bytes too;
+    least recently used files are pruned every prune_interval writes.
+    """
+
+    def __init__(self, directory: str = None, memory_bytes: int = 64 * 1024 * 1024,
+                 disk_bytes: int = 1024 * 1024 * 1024, prune_interval: int = 200):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.prune_interval = prune_interval
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def get(self, key: str):
+        """
+        Returns:
+            bytes: Cached segment audio, or None
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Touch so disk pruning keeps recently used segments
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        if not data:
+            return
+        self._remember(key, data)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # The memory tier still works without the disk tier
+            logger.warning(f"Could not write TTS segment {key} to disk cache: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_interval == 0
+        if prune:
+            self.prune()
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def prune(self):
+        """
+        Delete least recently used disk segments until the tier fits disk_bytes.
+
+        Returns:
+            int: Number of deleted segments
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} TTS segments from {self.directory}")
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_segments": len(self._memory),
+                "memory_bytes": self._memory_size,
+            }
+
+
+segment_cache = SegmentCache(
+    memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_MB", 64)) * 1024 * 1024,
+    disk_bytes=int(os.getenv("TTS_CACHE_DISK_MB", 1024)) * 1024 * 1024,
+)
@@ -0,0 +1,60 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = 1000
+
+
+def compute_peaks(path: str, buckets: int = DEFAULT_BUCKETS):
+    """
+    Downsample an audio file to min/max peaks for waveform rendering.
+
+    Channels are mixed down and the samples split into buckets of equal
+    length; each bucket keeps its minimum and maximum, scaled to int8.
+
+    Args:
+        path: Audio file path
+        buckets: Number of (min, max) pairs
+
+    Returns:
+        bytes: 2 * buckets signed bytes, min and max interleaved
+    """
+    import numpy as np
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(path)
+    samples = np.array(audio.get_array_of_samples())
+    if audio.channels > 1:
+        samples = samples.reshape(-1, audio.channels).mean(axis=1)
+    full_scale = float(1 << (8 * audio.sample_width - 1))
+
+    if not len(samples):
+        return bytes(2 * buckets)
+    # Pad with silence so the samples split evenly into buckets
+    per_bucket = -(-len(samples) // buckets)
+    samples = np.pad(samples.astype(np.float32), (0, per_bucket * buckets - len(samples)))
+    frames = samples.reshape(buckets, per_bucket) / full_scale
+
+    peaks = np.empty((buckets, 2), dtype=np.int8)
+    peaks[:, 0] = np.clip(np.round(frames.min(axis=1) * 127), -128, 127)
+    peaks[:, 1] = np.clip(np.round(frames.max(axis=1) * 127), -128, 127)
+    return peaks.tobytes()
+
+
+def peaks_json(peaks: bytes):
+    """
+    Compact JSON document for players: {"buckets": n, "peaks": [min0, max0, min1, max1, ...]}
+    """
+    import numpy as np
+
+    values = np.frombuffer(peaks, dtype=np.int8).tolist()
+    return json.dumps({"buckets": len(values) // 2, "peaks": values}, separators=(",", ":")).encode("utf-8")
+
+
+def _peaks_file(in_path: str, out_path: str, options: dict):
+    """Audio process pool entry point: write the peaks JSON of in_path to out_path"""
+    data = peaks_json(compute_peaks(in_path, options.get("buckets", DEFAULT_BUCKETS)))
+    with open(out_path, "wb") as f:
+        f.write(data)
+    return len(data)
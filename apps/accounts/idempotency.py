@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.accounts.models import IdempotencyKey, MeditationGenerate
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when a coalesced request gives up waiting for the leading request"""
+
+
+def request_fingerprint(endpoint, payload):
+    """
+    Build a stable fingerprint for a request body.
+
+    Args:
+        endpoint: Logical name of the endpoint the payload was sent to.
+        payload: Request data (dict or QueryDict).
+
+    Returns:
+        str: Hex SHA-256 of the endpoint and the canonical JSON payload.
+    """
+    if hasattr(payload, 'dict'):
+        payload = payload.dict()
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{endpoint}:{canonical}".encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls so only one of them does the work.
+
+    Callers in the same process wait on a threading.Event. Callers in other
+    gunicorn workers find the leader's lock in the shared cache and poll for
+    the result, which the leader publishes under a key derived from the call
+    key before it releases the lock. A caller arriving just after the leader
+    finished (within result_ttl) therefore gets that result instead of
+    running the call again.
+    """
+
+    def __init__(self, namespace, wait_timeout=None, result_ttl=60, poll_interval=0.5):
+        self.namespace = namespace
+        self.wait_timeout = wait_timeout or getattr(settings, 'SINGLE_FLIGHT_TIMEOUT', 600)
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() once for all concurrent callers sharing the same key.
+
+        Returns:
+            Whatever fn() returned for the leading caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not is_leader:
+            logger.info(f"Coalescing request {self.namespace}:{key} onto in-flight call")
+            if not call.event.wait(self.wait_timeout):
+                raise SingleFlightTimeout(f"Timed out waiting for in-flight request {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _do_shared(self, key, fn):
+        lock_key = f"singleflight:{self.namespace}:lock:{key}"
+        result_key = f"singleflight:{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            result = cache.get(result_key)
+            if result is not None:
+                logger.info(f"Coalesced request {self.namespace}:{key} onto another worker")
+                return result
+
+            if cache.add(lock_key, token, self.wait_timeout):
+                try:
+                    # The previous leader publishes before releasing, so a result is visible by now
+                    result = cache.get(result_key)
+                    if result is None:
+                        result = fn()
+                        cache.set(result_key, result, self.result_ttl)
+                    return result
+                finally:
+                    # After wait_timeout the lock may have expired and been taken by another worker
+                    if cache.get(lock_key) == token:
+                        cache.delete(lock_key)
+
+            # Another worker owns this key: wait for its result, or take over if it fails
+            if time.monotonic() > deadline:
+                raise SingleFlightTimeout(f"Timed out waiting for in-flight request {key}")
+            time.sleep(self.poll_interval)
+
+
+generation_flight = SingleFlight('generation')
+
+
+class IdempotencyService:
+    """
+    Service for replaying and coalescing meditation generation requests.
+
+    Requests carrying an Idempotency-Key header are stored with their fingerprint
+    and final response so client retries get the original result instead of
+    triggering another LLM + TTS run. Identical concurrent requests from the same
+    user (with or without a key) share one generation through SingleFlight.
+    """
+
+    def __init__(self, flight=None):
+        self.flight = flight or generation_flight
+        self.key_ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+
+    def execute(self, request, endpoint, payload, produce):
+        """
+        Run produce() at most once per idempotency key / identical in-flight request.
+
+        Args:
+            request: The DRF request (used for the user and the Idempotency-Key header).
+            endpoint: Logical endpoint name, part of the fingerprint.
+            payload: Request data used to build the fingerprint.
+            produce: Callable returning a (response_data, status_code) tuple.
+
+        Returns:
+            tuple: (response_data, status_code, replayed)
+        """
+        user = request.user
+        fingerprint = request_fingerprint(endpoint, payload)
+        flight_key = f"{user.pk}:{fingerprint}"
+        key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+
+        if not key:
+            data, status_code = self.flight.do(flight_key, produce)
+            return data, status_code, False
+
+        record = self._get_or_create_record(user, key, endpoint, fingerprint)
+
+        if record.fingerprint != fingerprint or record.endpoint != endpoint:
+            return {
+                "error": "Idempotency-Key has already been used with a different request",
+                "code": "idempotency_key_reused"
+            }, 422, False
+
+        if record.is_completed:
+            logger.info(f"Replaying stored response for idempotency key {key} (user {user.pk})")
+            return record.response, record.status_code, True
+
+        data, status_code = self.flight.do(flight_key, produce)
+
+        # Server errors are not stored so that a retry can attempt generation again
+        if status_code < 500:
+            record.status_code = status_code
+            record.response = data
+            meditation_id = data.get('meditation_id') if isinstance(data, dict) else None
+            if meditation_id:
+                record.meditation = MeditationGenerate.objects.filter(id=meditation_id, user=user).first()
+            record.save(update_fields=['status_code', 'response', 'meditation', 'updated_at'])
+
+        return data, status_code, False
+
+    def _get_or_create_record(self, user, key, endpoint, fingerprint):
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=user,
+            key=key,
+            defaults={'endpoint': endpoint, 'fingerprint': fingerprint}
+        )
+        if not created and record.created_at < timezone.now() - timezone.timedelta(seconds=self.key_ttl):
+            # Expired keys can be reused for a new request
+            record.delete()
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, endpoint=endpoint, fingerprint=fingerprint
+            )
+        return record
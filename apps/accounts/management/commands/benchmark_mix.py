@@ -0,0 +1,84 @@
+import os
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.generate.music import (
+    mix_music, load_music, AudioFormat, NATIVE_FORMAT, PROCESSING_FORMAT, OUTPUT_FORMAT, DEFAULT_MUSIC_PATH
+)
+from apps.accounts.generate.mp3_scan import scan_mp3
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Command(BaseCommand):
+    help = 'A/B benchmark of mix_music: audio as decoded vs the internal processing format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--speech',
+            default=os.path.join(os.path.dirname(__file__), '..', '..', 'muzic', 'sleep_manifestation.mp3'),
+            help='Speech audio file to mix (MP3 or WAV)',
+        )
+        parser.add_argument('--music', default=DEFAULT_MUSIC_PATH, help='Music bed file')
+        parser.add_argument('--runs', type=int, default=3, help='Mixes per variant')
+        parser.add_argument(
+            '--warm-music',
+            action='store_true',
+            help='Keep the decoded music bed cached between runs, as the audio pool workers do',
+        )
+
+    def handle(self, *args, **options):
+        # mix_music falls back to the unmixed speech without a bed, which would time nothing
+        if not os.path.exists(options['music']):
+            raise CommandError(f"Music bed {options['music']} not found; pass --music")
+        with open(options['speech'], 'rb') as f:
+            speech = f.read()
+
+        variants = [
+            ('as decoded', NATIVE_FORMAT, NATIVE_FORMAT),
+            ('internal, output as configured', PROCESSING_FORMAT, OUTPUT_FORMAT),
+            ('internal, output as internal', PROCESSING_FORMAT, AudioFormat(PROCESSING_FORMAT.sample_rate, PROCESSING_FORMAT.channels, 0)),
+        ]
+        self.stdout.write(
+            f"Speech {options['speech']} ({len(speech)} bytes), {options['runs']} runs per variant, "
+            f"internal format {PROCESSING_FORMAT}, output format {OUTPUT_FORMAT}\n"
+        )
+        self.stdout.write(f"{'variant':<32} {'wall s':>8} {'cpu s':>8} {'ffmpeg s':>9} {'peak MB':>8} {'size KB':>9} {'kbps':>5} {'rate':>6} {'ch':>3}")
+
+        baseline = None
+        for label, processing_format, output_format in variants:
+            wall = cpu = ffmpeg = peak = 0.0
+            mixed = b''
+            for _ in range(options['runs']):
+                if not options['warm_music']:
+                    load_music.cache_clear()
+                tracemalloc.start()
+                started, cpu_started, ffmpeg_started = time.perf_counter(), time.process_time(), _children_cpu()
+                mixed = mix_music(
+                    speech, music_path=options['music'],
+                    processing_format=processing_format, output_format=output_format
+                )
+                wall += time.perf_counter() - started
+                cpu += time.process_time() - cpu_started
+                ffmpeg += _children_cpu() - ffmpeg_started
+                peak = max(peak, tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+                tracemalloc.stop()
+
+            runs = options['runs']
+            info = scan_mp3(mixed)
+            self.stdout.write(
+                f"{label:<32} {wall / runs:>8.2f} {cpu / runs:>8.2f} {ffmpeg / runs:>9.2f} {peak:>8.1f} "
+                f"{len(mixed) / 1024:>9.1f} {info.bitrate_kbps:>5} {info.sample_rate:>6} {info.channels:>3}"
+            )
+            if baseline is None:
+                baseline = (wall, peak, len(mixed))
+            else:
+                self.stdout.write(
+                    f"{'':<32} wall x{wall / baseline[0]:.2f}, peak memory x{peak / baseline[1]:.2f}, "
+                    f"size x{len(mixed) / baseline[2]:.2f} vs as decoded"
+                )
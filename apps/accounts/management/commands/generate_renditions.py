@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from apps.accounts.models import MeditationGenerate, MeditationLibrary
+from apps.accounts.renditions import encode_renditions
+from apps.accounts.waveforms import compute_waveform, waveform_exists
+
+
+class Command(BaseCommand):
+    help = 'Encode missing Opus/AAC renditions and waveform peaks for existing meditation and library files'
+
+    def handle(self, *args, **options):
+        created_count = 0
+        failed_count = 0
+        querysets = [
+            MeditationGenerate.objects.filter(is_deleted=False).exclude(file=''),
+            MeditationLibrary.objects.filter(is_deleted=False).exclude(file=''),
+        ]
+        for queryset in querysets:
+            for obj in queryset.exclude(file__isnull=True).iterator():
+                try:
+                    created = encode_renditions(obj.file)
+                    if not waveform_exists(obj.file):
+                        waveform = compute_waveform(obj.file)
+                        if waveform:
+                            created.append(waveform)
+                except Exception as e:
+                    failed_count += 1
+                    self.stdout.write(self.style.ERROR(f"❌ {obj.file.name}: {str(e)}"))
+                    continue
+                for name in created:
+                    self.stdout.write(self.style.SUCCESS(f"✅ {name}"))
+                created_count += len(created)
+
+        self.stdout.write(f"\nDone! {created_count} renditions and waveforms created, {failed_count} files failed.")
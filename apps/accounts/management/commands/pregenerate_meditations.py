@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.accounts.generate.checkpoints import prune_checkpoints
+from apps.accounts.pregeneration import PreGenerationService
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate likely next-day meditations for active users (run off-peak, e.g. nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Users with a login in the last N days are active (default: PREGENERATION_ACTIVE_DAYS)',
+        )
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            help='Number of ritual settings to pre-generate per user (default: PREGENERATION_RITUALS_PER_USER)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Generation worker processes (default: PREGENERATION_WORKERS)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many meditations would be generated',
+        )
+
+    def handle(self, *args, **options):
+        service = PreGenerationService(
+            active_days=options.get('days'),
+            rituals_per_user=options.get('per_user'),
+        )
+
+        self.stdout.write("Pre-generating meditations for active users...")
+        summary = service.run(workers=options.get('workers'), dry_run=options.get('dry_run'))
+
+        if options.get('dry_run'):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Dry run: {summary.get('pending', 0)} meditation(s) to generate, "
+                    f"{summary['skipped']} unchanged profile(s) skipped."
+                )
+            )
+            return
+
+        pruned = prune_checkpoints(
+            settings.GENERATION_CHECKPOINT_DIR, getattr(settings, 'GENERATION_CHECKPOINT_TTL', 60 * 60 * 24)
+        )
+        self.stdout.write(f"Pruned stale generation checkpoints: {pruned}")
+        self.stdout.write(f"Expired unclaimed meditations: {summary['expired']}")
+        self.stdout.write(f"Skipped unchanged profiles: {summary['skipped']}")
+        if summary['failed']:
+            self.stdout.write(self.style.ERROR(f"❌ Failed: {summary['failed']}"))
+        self.stdout.write(self.style.SUCCESS(f"✅ Generated: {summary['generated']}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from apps.accounts.audio_metadata import AUDIO_METADATA_FIELDS, update_audio_metadata
+from apps.accounts.models import MeditationGenerate, MeditationLibrary
+
+
+class Command(BaseCommand):
+    help = 'Fill duration, bitrate, frame count and size of existing meditation and library files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rescan files that already have metadata',
+        )
+
+    def handle(self, *args, **options):
+        scanned_count = 0
+        unreadable_count = 0
+        querysets = [
+            MeditationGenerate.objects.filter(is_deleted=False).exclude(file=''),
+            MeditationLibrary.objects.filter(is_deleted=False).exclude(file=''),
+        ]
+        for queryset in querysets:
+            if not options['force']:
+                queryset = queryset.filter(duration_seconds__isnull=True)
+            for obj in queryset.exclude(file__isnull=True).iterator():
+                if not update_audio_metadata(obj, force=True):
+                    continue
+                # update() so updated_at, and with it the media version, stays the same
+                type(obj).objects.filter(pk=obj.pk).update(
+                    **{field: getattr(obj, field) for field in AUDIO_METADATA_FIELDS}
+                )
+                if obj.duration_seconds is None:
+                    unreadable_count += 1
+                    self.stdout.write(self.style.ERROR(f"❌ {obj.file.name}: not a readable MP3"))
+                else:
+                    scanned_count += 1
+
+        self.stdout.write(f"\nDone! {scanned_count} files scanned, {unreadable_count} unreadable.")
@@ -0,0 +1,73 @@
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from apps.accounts.backpressure import generation_estimator
+from apps.accounts.fallback import fallback_catalog
+from apps.accounts.models import CustomUserDetail, MeditationGenerate
+from apps.accounts.pregeneration import generation_checkpoint
+from apps.accounts.preview import start_full_generation
+from apps.accounts.serializers import CombinedProfileSerializer
+
+
+class Command(BaseCommand):
+    help = 'Replace fallback meditations, and previews or streams left unfinished, with full personalized renders while generation has capacity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Maximum number of meditations to upgrade in this run',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the meditations that would be upgraded',
+        )
+
+    def handle(self, *args, **options):
+        # A preview or stream is stale when its background generation died with the worker
+        stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'GENERATION_STALE_PREVIEW_AFTER', 3600))
+        meditations = MeditationGenerate.objects.active().filter(
+            Q(is_fallback=True) | Q(is_preview=True, updated_at__lt=stale_before)
+        ).select_related('user', 'details', 'ritual_type').order_by('created_at')[:options['limit']]
+
+        serializer = CombinedProfileSerializer()
+        upgraded_count = 0
+        for meditation in meditations:
+            reason = meditation.fallback_reason if meditation.is_fallback else 'unfinished'
+            if options['dry_run']:
+                self.stdout.write(f"Would upgrade meditation {meditation.id} ({reason})")
+                continue
+            # Upgrades yield to live requests
+            estimate = generation_estimator.estimate(meditation.user)
+            if fallback_catalog.quota_exhausted() or estimate['estimated_completion_seconds'] > generation_estimator.max_wait:
+                self.stdout.write(self.style.WARNING("Generation is overloaded or out of quota, stopping"))
+                break
+
+            user_detail = CustomUserDetail.objects.filter(user=meditation.user).first()
+            plan_type, ritual = meditation.ritual_type, meditation.details
+            checkpoint = generation_checkpoint(meditation.user, plan_type, ritual, user_detail)
+            start_full_generation(
+                meditation.id, meditation.user,
+                lambda: serializer.generate_meditation(plan_type, ritual, user_detail, checkpoint=checkpoint),
+                checkpoint=checkpoint,
+                count_against_limit=False
+            ).join()
+
+            if not MeditationGenerate.objects.filter(pk=meditation.pk, is_fallback=False, is_preview=False).exists():
+                self.stdout.write(self.style.ERROR(f"❌ Meditation {meditation.id} is still a {reason} meditation"))
+                continue
+            if meditation.hls_playlist:
+                # The unfinished stream is replaced by the full file
+                MeditationGenerate.objects.filter(pk=meditation.pk).update(hls_playlist='')
+                shutil.rmtree(os.path.join(settings.MEDIA_ROOT, os.path.dirname(meditation.hls_playlist)), ignore_errors=True)
+            upgraded_count += 1
+            self.stdout.write(self.style.SUCCESS(f"✅ Upgraded meditation {meditation.id}"))
+
+        self.stdout.write(f"\nDone! {upgraded_count} meditations upgraded.")
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class MeditationGenerateQuerySet(models.QuerySet):
+    def visible(self):
+        """
+        Meditations shown to their user. Pre-generated rows stay hidden until a live request claims them.
+        """
+        return self.filter(is_pregenerated=False)
+
+    def active(self):
+        """
+        Visible meditations that are not in the archive.
+        """
+        return self.visible().filter(is_deleted=False)
@@ -0,0 +1,295 @@
+import mimetypes
+import os
+import re
+import time
+import logging
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from apps.accounts.generate.streaming import PLAYLIST_NAME
+from apps.accounts.models import MeditationGenerate, MeditationLibrary
+from apps.accounts.renditions import negotiate_variant, rendition_name
+
+logger = logging.getLogger(__name__)
+
+# Media under these prefixes belongs to a single user
+PROTECTED_MEDIA_PREFIXES = ('meditations/',)
+
+MEDIA_TOKEN_SALT = 'accounts.media'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_protected(path):
+    return path.startswith(PROTECTED_MEDIA_PREFIXES)
+
+
+def _token_max_age():
+    return getattr(settings, 'MEDIA_URL_TOKEN_MAX_AGE', 60 * 60 * 24 * 7)
+
+
+def sign_media_scope(scope, user_id, now=None):
+    """
+    Sign access to a media file, or to every file under a directory scope ending in '/'.
+
+    The expiry is rounded up to the end of the next MEDIA_URL_TOKEN_MAX_AGE
+    window rather than counted from now, so the token (and the URL around
+    it) stays the same for a whole window and client/CDN caches keep
+    hitting. Tokens are valid for one to two windows.
+    """
+    max_age = _token_max_age()
+    now = time.time() if now is None else now
+    expires = (int(now) // max_age + 2) * max_age
+    return signing.Signer(salt=MEDIA_TOKEN_SALT).sign_object([user_id, scope, expires], compress=True)
+
+
+def media_version(obj):
+    """
+    Content version of a model's media files: "<pk>.<updated_at>".
+
+    Files are written once and replaced under new names, so a new version
+    means a new URL and old URLs can be cached forever. The pk lets
+    media_version_for_path find the owner by primary key.
+    """
+    updated_at = getattr(obj, 'updated_at', None)
+    if not updated_at:
+        return None
+    return f"{obj.pk}.{int(updated_at.timestamp() * 1000000):x}"
+
+
+def _with_version(url, version):
+    return f"{url}?v={version}" if version else url
+
+
+def protected_media_url(path, user, request=None, scope=None, version=None):
+    """
+    Build a signed media URL for a protected file.
+
+    The token is a path component (/media/s/<token>/<path>) so relative
+    URLs inside HLS playlists keep it.
+
+    Args:
+        path: Media-relative file path (FieldFile.name).
+        user: The user the URL is issued to.
+        request: Optional request for an absolute URL.
+        scope: Directory (ending in '/') the token should cover instead of just path.
+        version: Content version (see media_version); versioned URLs are served as immutable.
+
+    Returns:
+        str: The media URL.
+    """
+    token = sign_media_scope(scope or path, user.pk)
+    url = _with_version(f"{settings.MEDIA_URL}s/{token}/{path}", version)
+    return request.build_absolute_uri(url) if request else url
+
+
+def versioned_media_url(field_file, version, request=None):
+    """
+    Build a versioned URL for a public media file (e.g. MeditationLibrary).
+
+    Returns:
+        str: The media URL, or None if the field has no file.
+    """
+    if not field_file:
+        return None
+    url = _with_version(field_file.url, version)
+    return request.build_absolute_uri(url) if request else url
+
+
+def token_allows(token, path):
+    try:
+        user_id, scope, expires = signing.Signer(salt=MEDIA_TOKEN_SALT).unsign_object(token)
+    except (signing.BadSignature, ValueError):
+        # ValueError: signed with our key but not a [user, scope, expires] object
+        return False
+    if expires < time.time():
+        return False
+    return path == scope or (scope.endswith('/') and path.startswith(scope))
+
+
+def media_version_for_path(path, requested):
+    """
+    Current content version (see media_version) of the record a versioned media request names.
+
+    The owner's pk comes from the requested version, so this is a primary
+    key lookup; the record must still own the path. Records sharing a file
+    (fallback meditations) each get their own version.
+
+    Args:
+        path: Media-relative file path.
+        requested: The request's ?v= value.
+
+    Returns:
+        str: The version, or None if the named record does not own the path.
+    """
+    pk = requested.split('.', 1)[0]
+    if not pk.isdigit():
+        return None
+    if is_protected(path):
+        owners = MeditationGenerate.objects.filter(pk=pk, file=path)
+    else:
+        owners = MeditationLibrary.objects.filter(Q(file=path) | Q(image=path), pk=pk)
+    owner = owners.only('pk', 'updated_at').first()
+    return media_version(owner) if owner else None
+
+
+def user_can_access(user, path):
+    """
+    Check that the user owns the meditation a protected media path belongs to.
+    """
+    if not user or not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    if path.startswith('meditations/hls/'):
+        directory = path.rsplit('/', 1)[0]
+        return MeditationGenerate.objects.visible().filter(user=user, hls_playlist=f"{directory}/{PLAYLIST_NAME}").exists()
+    return MeditationGenerate.objects.visible().filter(user=user, file=path).exists()
+
+
+class RangeFile:
+    """
+    File view limited to `length` bytes from the current position.
+
+    Exposes fileno() so WSGI servers can still use os.sendfile (gunicorn
+    sends Content-Length bytes from the descriptor's current offset), while
+    plain iteration never reads past the range.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def cache_control(path, versioned, protected):
+    """
+    Cache-Control for a media response.
+
+    Versioned URLs never change content and are cached for a year. HLS
+    playlists grow while a meditation generates and must be revalidated.
+    """
+    if path.endswith('.m3u8') or not versioned:
+        return 'no-cache'
+    # Signed meditation URLs are per user, keep them out of shared caches
+    scope = 'private' if protected else 'public'
+    return f"{scope}, max-age=31536000, immutable"
+
+
+def _add_validators(response, etag, last_modified, cache_header, vary_accept=False):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_header
+    if vary_accept:
+        patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def send_media(request, path, protected=False, version=None):
+    """
+    Send a media file, offloading the transfer to the front proxy when configured.
+
+    The response is cacheable as immutable only when the request's ?v=
+    equals version, the file's current content version; a stale or made-up
+    v gets no-cache like an unversioned URL.
+
+    MP3 requests are answered with an Opus/AAC rendition when one is
+    negotiated (?format= or Accept) and already encoded. Every response
+    carries a strong ETag (mtime and size), Last-Modified and
+    Cache-Control; conditional requests get 304. With
+    MEDIA_ACCEL_REDIRECT_PREFIX set, nginx serves the file through an internal
+    location (X-Accel-Redirect). With MEDIA_X_SENDFILE, Apache/lighttpd serve
+    it (X-Sendfile). Otherwise the file is streamed by a FileResponse with
+    single byte-range support.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found")
+
+    # Serve a smaller Opus/AAC rendition when the client asks for one and it is ready
+    vary_accept = False
+    if path.lower().endswith('.mp3'):
+        variant, vary_accept = negotiate_variant(request)
+        if variant:
+            rendition = rendition_name(path, variant)
+            rendition_path = safe_join(settings.MEDIA_ROOT, rendition)
+            if os.path.isfile(rendition_path):
+                path, full_path = rendition, rendition_path
+
+    stat = os.stat(full_path)
+    size = stat.st_size
+    etag = quote_etag(f"{stat.st_mtime_ns:x}-{size:x}")
+    last_modified = int(stat.st_mtime)
+    cache_header = cache_control(path, bool(version) and request.GET.get('v') == version, protected)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _add_validators(not_modified, etag, last_modified, cache_header, vary_accept)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if accel_prefix:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{path}"
+        return _add_validators(response, etag, last_modified, cache_header, vary_accept)
+    if getattr(settings, 'MEDIA_X_SENDFILE', False):
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return _add_validators(response, etag, last_modified, cache_header, vary_accept)
+
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # The client's partial copy is stale, send the whole file
+        match = None
+    if not match or not any(match.groups()):
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return _add_validators(response, etag, last_modified, cache_header, vary_accept)
+
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    length = end - start + 1
+    file = open(full_path, 'rb')
+    file.seek(start)
+    response = FileResponse(RangeFile(file, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Accept-Ranges'] = 'bytes'
+    return _add_validators(response, etag, last_modified, cache_header, vary_accept)
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_auto_20250808_1903'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='Idempotency Key')),
+                ('endpoint', models.CharField(max_length=100, verbose_name='Endpoint')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Request Fingerprint')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Status Code')),
+                ('response', models.JSONField(blank=True, null=True, verbose_name='Response')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('meditation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='idempotency_keys', to='accounts.meditationgenerate', verbose_name='Meditation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key',
+                'verbose_name_plural': 'Idempotency Keys',
+                'unique_together': {('user', 'key')},
+            },
+        ),
+    ]
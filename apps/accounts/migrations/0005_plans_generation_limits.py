@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plans',
+            name='generations_per_hour',
+            field=models.PositiveIntegerField(default=10, help_text='Per-user meditation generations per hour. 0 means unlimited.', verbose_name='Generations Per Hour'),
+        ),
+        migrations.AddField(
+            model_name='plans',
+            name='generation_burst',
+            field=models.PositiveIntegerField(default=3, help_text='Generations a user can start back to back before the hourly rate applies.', verbose_name='Generation Burst'),
+        ),
+        migrations.AddField(
+            model_name='plans',
+            name='max_concurrent_generations',
+            field=models.PositiveIntegerField(default=1, help_text='Generations a user can run at the same time. 0 means unlimited.', verbose_name='Max Concurrent Generations'),
+        ),
+        migrations.AddField(
+            model_name='plans',
+            name='plan_generations_per_hour',
+            field=models.PositiveIntegerField(blank=True, help_text='Hourly generation budget shared by all users on this plan. Empty means unlimited.', null=True, verbose_name='Plan-wide Generations Per Hour'),
+        ),
+    ]
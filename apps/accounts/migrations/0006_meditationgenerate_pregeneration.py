@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_plans_generation_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='is_pregenerated',
+            field=models.BooleanField(default=False, help_text='Generated off-peak and not yet delivered to the user.', verbose_name='Is Pre-generated'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='profile_fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='Profile Fingerprint'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='pregenerated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Pre-generated At'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_meditationgenerate_pregeneration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='is_preview',
+            field=models.BooleanField(default=False, help_text='The file is a short preview; the full meditation is still generating.', verbose_name='Is Preview'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_meditationgenerate_is_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='hls_playlist',
+            field=models.CharField(blank=True, default='', help_text='Media-relative path of the segmented stream playlist.', max_length=255, verbose_name='HLS Playlist'),
+        ),
+    ]
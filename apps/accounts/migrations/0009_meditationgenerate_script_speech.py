@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_meditationgenerate_hls_playlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='script',
+            field=models.TextField(blank=True, null=True, verbose_name='Script'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='speech_file',
+            field=models.FileField(blank=True, help_text='Synthesized speech before mixing, reused for re-mixes.', null=True, upload_to='meditations/speech/', verbose_name='Speech File'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='music_bed',
+            field=models.CharField(default='default', max_length=50, verbose_name='Music Bed'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='music_gain',
+            field=models.FloatField(default=-6, verbose_name='Music Gain (dB)'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='speech_gain',
+            field=models.FloatField(default=-4, verbose_name='Speech Gain (dB)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_meditationgenerate_script_speech'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuserdetail',
+            name='profile_digest',
+            field=models.JSONField(blank=True, help_text='Condensed goals, dream life and happiness used in generation prompts.', null=True, verbose_name='Profile Digest'),
+        ),
+        migrations.AddField(
+            model_name='customuserdetail',
+            name='profile_digest_hash',
+            field=models.CharField(blank=True, help_text='Hash of the fields the digest was built from; a mismatch means it is stale.', max_length=64, null=True, verbose_name='Profile Digest Hash'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_customuserdetail_profile_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='Duration (s)'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='bitrate_kbps',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Bitrate (kbps)'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='frame_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='MP3 Frames'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='File Size (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='meditationlibrary',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True, verbose_name='Duration (s)'),
+        ),
+        migrations.AddField(
+            model_name='meditationlibrary',
+            name='bitrate_kbps',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Bitrate (kbps)'),
+        ),
+        migrations.AddField(
+            model_name='meditationlibrary',
+            name='frame_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='MP3 Frames'),
+        ),
+        migrations.AddField(
+            model_name='meditationlibrary',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='File Size (bytes)'),
+        ),
+    ]
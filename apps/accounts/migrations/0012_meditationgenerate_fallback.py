@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='is_fallback',
+            field=models.BooleanField(db_index=True, default=False, help_text='The file is a shared generic meditation; upgrade_fallback_meditations replaces it with a personalized one.', verbose_name='Is Fallback'),
+        ),
+        migrations.AddField(
+            model_name='meditationgenerate',
+            name='fallback_reason',
+            field=models.CharField(blank=True, choices=[('overload', 'Overload'), ('quota', 'Provider Quota'), ('error', 'Generation Error')], default='', max_length=20, verbose_name='Fallback Reason'),
+        ),
+    ]
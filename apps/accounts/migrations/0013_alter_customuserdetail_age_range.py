@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_meditationgenerate_fallback'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuserdetail',
+            name='age_range',
+            field=models.CharField(blank=True, choices=[('18-24', '18-24'), ('25-34', '25-34'), ('35-44', '35-44'), ('45-54', '45-54'), ('55-64', '55-64'), ('65+', '65+')], max_length=20, null=True, verbose_name='Age Range'),
+        ),
+    ]
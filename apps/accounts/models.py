@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, Group
 from django.db import models
 from django.utils import timezone
 from apps.accounts.managers.custom_user import CustomUserManager
+from apps.accounts.managers.meditation import MeditationGenerateQuerySet
 from django.utils.translation import gettext_lazy as _
 
 
@@ -65,6 +66,22 @@ class CustomUserDetail(models.Model):
     age_range = models.CharField(max_length=20, choices=AgeRangeChoices.choices, verbose_name=_("Age Range"), null=True, blank=True)
     gender = models.CharField(max_length=10, choices=GenderChoices.choices, verbose_name=_("Gender"), null=True, blank=True)
     happiness = models.TextField(verbose_name=_("What Makes You Happy?"), null=True, blank=True)
+    occupation = models.CharField(max_length=100, verbose_name=_("Occupation"), null=True, blank=True)
+    interests = models.TextField(verbose_name=_("Interests and Hobbies"), null=True, blank=True)
+    meditation_experience = models.CharField(max_length=50, verbose_name=_("Meditation Experience"), null=True, blank=True)
+    stress_level = models.CharField(max_length=20, verbose_name=_("Current Stress Level"), null=True, blank=True)
+    sleep_quality = models.CharField(max_length=20, verbose_name=_("Sleep Quality"), null=True, blank=True)
+    preferred_meditation_time = models.CharField(max_length=20, verbose_name=_("Preferred Meditation Time"), null=True, blank=True)
+    profile_digest = models.JSONField(
+        verbose_name=_("Profile Digest"), null=True, blank=True,
+        help_text=_("Condensed goals, dream life and happiness used in generation prompts.")
+    )
+    profile_digest_hash = models.CharField(
+        max_length=64, verbose_name=_("Profile Digest Hash"), null=True, blank=True,
+        help_text=_("Hash of the fields the digest was built from; a mismatch means it is stale.")
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
     class Meta:
         verbose_name = _("User Detail")
@@ -205,15 +222,36 @@ class RitualType(models.Model):
         return self.name
 
 class MeditationGenerate(models.Model):
+    class FallbackReason(models.TextChoices):
+        OVERLOAD = 'overload', _('Overload')
+        QUOTA = 'quota', _('Provider Quota')
+        ERROR = 'error', _('Generation Error')
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='meditations', verbose_name=_("User"))
     details = models.ForeignKey(Rituals, on_delete=models.CASCADE, related_name='custom_ritual', verbose_name=_("Customize Ritual"))
     ritual_type = models.ForeignKey(RitualType, on_delete=models.CASCADE, related_name='custom_ritual_type', verbose_name=_("Ritual Type"))
     file = models.FileField(upload_to='meditations/', blank=True, null=True, verbose_name=_("File"))
+    duration_seconds = models.FloatField(null=True, blank=True, verbose_name=_("Duration (s)"))
+    bitrate_kbps = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Bitrate (kbps)"))
+    frame_count = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("MP3 Frames"))
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, verbose_name=_("File Size (bytes)"))
     is_deleted = models.BooleanField(default=False, verbose_name=_("Is Deleted"))
+    script = models.TextField(null=True, blank=True, verbose_name=_("Script"))
+    speech_file = models.FileField(upload_to='meditations/speech/', blank=True, null=True, verbose_name=_("Speech File"), help_text=_("Synthesized speech before mixing, reused for re-mixes."))
+    music_bed = models.CharField(max_length=50, default='default', verbose_name=_("Music Bed"))
+    music_gain = models.FloatField(default=-6, verbose_name=_("Music Gain (dB)"))
+    speech_gain = models.FloatField(default=-4, verbose_name=_("Speech Gain (dB)"))
+    hls_playlist = models.CharField(max_length=255, blank=True, default='', verbose_name=_("HLS Playlist"), help_text=_("Media-relative path of the segmented stream playlist."))
+    is_preview = models.BooleanField(default=False, verbose_name=_("Is Preview"), help_text=_("The file is a short preview; the full meditation is still generating."))
+    is_pregenerated = models.BooleanField(default=False, verbose_name=_("Is Pre-generated"), help_text=_("Generated off-peak and not yet delivered to the user."))
+    profile_fingerprint = models.CharField(max_length=64, blank=True, default='', db_index=True, verbose_name=_("Profile Fingerprint"))
+    pregenerated_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Pre-generated At"))
+    is_fallback = models.BooleanField(default=False, db_index=True, verbose_name=_("Is Fallback"), help_text=_("The file is a shared generic meditation; upgrade_fallback_meditations replaces it with a personalized one."))
+    fallback_reason = models.CharField(max_length=20, choices=FallbackReason.choices, blank=True, default='', verbose_name=_("Fallback Reason"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
 
-    objects = models.Manager()
+    objects = MeditationGenerateQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Meditation")
@@ -243,6 +281,10 @@ class MeditationLibrary(models.Model):
     description = models.TextField(verbose_name=_("Description"), null=True, blank=True)
     image = models.ImageField(upload_to='meditation_library/', blank=True, null=True, verbose_name=_("Image"))
     file = models.FileField(upload_to='meditation_library/', blank=True, null=True, verbose_name=_("File"))
+    duration_seconds = models.FloatField(null=True, blank=True, verbose_name=_("Duration (s)"))
+    bitrate_kbps = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Bitrate (kbps)"))
+    frame_count = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("MP3 Frames"))
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, verbose_name=_("File Size (bytes)"))
     is_deleted = models.BooleanField(default=False, verbose_name=_("Is Deleted"))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
@@ -288,6 +330,14 @@ class Plans(models.Model):
     is_annual = models.BooleanField(default=False, verbose_name=_("Annual Plan"), null=True, blank=True)
     is_free_trial = models.BooleanField(default=False, verbose_name=_("Free Trial"), null=True, blank=True)
     discount = models.FloatField(default=0.00, verbose_name=_("Discount"), null=True, blank=True)
+    generations_per_hour = models.PositiveIntegerField(default=10, verbose_name=_("Generations Per Hour"),
+                                                       help_text=_("Per-user meditation generations per hour. 0 means unlimited."))
+    generation_burst = models.PositiveIntegerField(default=3, verbose_name=_("Generation Burst"),
+                                                   help_text=_("Generations a user can start back to back before the hourly rate applies."))
+    max_concurrent_generations = models.PositiveIntegerField(default=1, verbose_name=_("Max Concurrent Generations"),
+                                                             help_text=_("Generations a user can run at the same time. 0 means unlimited."))
+    plan_generations_per_hour = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Plan-wide Generations Per Hour"),
+                                                            help_text=_("Hourly generation budget shared by all users on this plan. Empty means unlimited."))
 
     class Meta:
         verbose_name = _("Plan")
@@ -457,4 +507,30 @@ class UserDeviceToken(models.Model):
                 self.platform = 'Android'
             elif self.device_type == 'web':
                 self.platform = 'Web'
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a generation request sent with an Idempotency-Key header"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name=_("User"))
+    key = models.CharField(max_length=255, verbose_name=_("Idempotency Key"))
+    endpoint = models.CharField(max_length=100, verbose_name=_("Endpoint"))
+    fingerprint = models.CharField(max_length=64, verbose_name=_("Request Fingerprint"))
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name=_("Status Code"))
+    response = models.JSONField(null=True, blank=True, verbose_name=_("Response"))
+    meditation = models.ForeignKey(MeditationGenerate, on_delete=models.SET_NULL, null=True, blank=True, related_name='idempotency_keys', verbose_name=_("Meditation"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Updated At"))
+
+    objects = models.Manager()
+
+    class Meta:
+        verbose_name = _("Idempotency Key")
+        verbose_name_plural = _("Idempotency Keys")
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
+
+    @property
+    def is_completed(self):
+        return self.status_code is not None
@@ -3,6 +3,7 @@ import json
 from django.conf import settings
 from django.utils import timezone
 from .models import PushNotification, UserDeviceToken
+from .generate.metrics import push_notifications
 
 # Firebase Admin SDK uchun
 try:
@@ -96,6 +97,7 @@ class PushNotificationService:
                     # Test token va format token larni tekshirish
                     if token.startswith('test_fcm_token_') or token.startswith('fMEP0vJqR0:APA91bH'):
                         print(f"⏭️ Skipping test/format token: {token[:20]}...")
+                        push_notifications.labels('firebase_admin', 'skipped').inc()
                         continue
                     
                     # Create message for each token
@@ -115,9 +117,11 @@ class PushNotificationService:
                     # Send message
                     response = messaging.send(message_obj)
                     successful_sends += 1
+                    push_notifications.labels('firebase_admin', 'sent').inc()
                     print(f"✅ Successfully sent to token: {token[:20]}...")
                     
                 except Exception as e:
+                    push_notifications.labels('firebase_admin', 'failed').inc()
                     print(f"❌ Failed to send to token {token[:20]}...: {e}")
             
             print(f"Firebase Admin SDK: {successful_sends}/{len(device_tokens)} messages sent successfully")
@@ -161,10 +165,11 @@ class PushNotificationService:
                 
                 response = requests.post(self.fcm_url, headers=headers, json=payload)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get('success') == 1:
-                        successful_sends += 1
+                if response.status_code == 200 and response.json().get('success') == 1:
+                    successful_sends += 1
+                    push_notifications.labels('legacy_fcm', 'sent').inc()
+                else:
+                    push_notifications.labels('legacy_fcm', 'failed').inc()
                 
             return successful_sends
             
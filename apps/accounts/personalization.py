@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+
+from apps.accounts.generate.generation import summarize_profile, summarize_profiles
+from apps.accounts.models import CustomUserDetail
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SOURCE_FIELDS = ('goals', 'dream', 'happiness')
+
+
+def raw_profile_fields(user_detail):
+    """
+    Profile text as generation prompts take it (goals, dreamlife, dream_activities).
+    """
+    return {
+        'goals': user_detail.goals if user_detail and user_detail.goals else "",
+        'dreamlife': user_detail.dream if user_detail and user_detail.dream else "",
+        'dream_activities': user_detail.happiness if user_detail and user_detail.happiness else "",
+    }
+
+
+def profile_digest_hash(user_detail):
+    data = {field: getattr(user_detail, field, None) or "" for field in DIGEST_SOURCE_FIELDS}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _digest_wanted(user_detail, raw):
+    """
+    Whether a profile is long enough to be condensed by a digest.
+    """
+    if not user_detail or not getattr(settings, 'PROFILE_DIGEST_ENABLED', True):
+        return False
+    return sum(len(value) for value in raw.values()) >= getattr(settings, 'PROFILE_DIGEST_MIN_CHARS', 600)
+
+
+def _store_digest(user_detail, raw, source_hash, digest):
+    # update() only writes the digest columns, so a concurrent profile edit is not overwritten
+    CustomUserDetail.objects.filter(pk=user_detail.pk).update(
+        profile_digest=digest, profile_digest_hash=source_hash
+    )
+    user_detail.profile_digest = digest
+    user_detail.profile_digest_hash = source_hash
+    logger.info(
+        f"Built profile digest for user detail {user_detail.pk}: "
+        f"{sum(len(value) for value in raw.values())} -> {sum(len(value) for value in digest.values())} characters"
+    )
+
+
+def get_profile_fields(user_detail, build_digest=True):
+    """
+    Profile fields for a generation prompt, condensed by the cached digest when worthwhile.
+
+    Short profiles are used as they are. Longer ones are summarized once by
+    the LLM and the digest is stored on the CustomUserDetail together with
+    a hash of the source fields; an edit to goals, dream or happiness
+    changes the hash, so the next generation rebuilds it. If the digest
+    cannot be built the raw fields are used.
+
+    Args:
+        user_detail: CustomUserDetail or None
+        build_digest: Summarize a profile without a current digest; when False
+            its raw fields are used (see build_profile_digests)
+
+    Returns:
+        dict: goals, dreamlife and dream_activities
+    """
+    raw = raw_profile_fields(user_detail)
+    if not _digest_wanted(user_detail, raw):
+        return raw
+
+    source_hash = profile_digest_hash(user_detail)
+    if user_detail.profile_digest and user_detail.profile_digest_hash == source_hash:
+        return user_detail.profile_digest
+    if not build_digest:
+        return raw
+
+    try:
+        digest = summarize_profile(**raw)
+    except Exception as e:
+        logger.error(f"Profile digest failed for user detail {user_detail.pk}: {str(e)}")
+        return raw
+    _store_digest(user_detail, raw, source_hash, digest)
+    return digest
+
+
+def build_profile_digests(user_details, max_concurrency=None):
+    """
+    Build the missing or stale digests of many profiles in one batched LLM call.
+
+    Used ahead of bulk generation (pre-generation) so get_profile_fields()
+    finds every digest cached instead of calling the LLM once per profile.
+    Failed digests are logged and left out; those profiles use their raw fields.
+
+    Args:
+        user_details: CustomUserDetail instances, updated in place
+        max_concurrency: Concurrent LLM requests (default LLM_BATCH_CONCURRENCY)
+
+    Returns:
+        int: Number of digests built
+    """
+    pending = []
+    for user_detail in user_details:
+        raw = raw_profile_fields(user_detail)
+        if not _digest_wanted(user_detail, raw):
+            continue
+        source_hash = profile_digest_hash(user_detail)
+        if user_detail.profile_digest and user_detail.profile_digest_hash == source_hash:
+            continue
+        pending.append((user_detail, raw, source_hash))
+    if not pending:
+        return 0
+
+    built = 0
+    digests = summarize_profiles([raw for _, raw, _ in pending], max_concurrency=max_concurrency)
+    for (user_detail, raw, source_hash), digest in zip(pending, digests):
+        if isinstance(digest, Exception):
+            logger.error(f"Profile digest failed for user detail {user_detail.pk}: {str(digest)}")
+            continue
+        _store_digest(user_detail, raw, source_hash, digest)
+        built += 1
+    return built
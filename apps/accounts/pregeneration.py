@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.generate.checkpoints import GenerationCheckpoint
+from apps.accounts.generate.functions import generate_meditation_audio, get_word_count, PLAN_TYPE_LABELS
+from apps.accounts.generate.generation import generate_scripts
+from apps.accounts.models import (
+    CustomUser, CustomUserDetail, MeditationGenerate, Rituals, UserLoginTracker
+)
+from apps.accounts.personalization import build_profile_digests, get_profile_fields
+from apps.accounts.utils import get_active_user_plan
+
+logger = logging.getLogger(__name__)
+
+RITUAL_SETTING_FIELDS = ('name', 'description', 'ritual_type', 'tone', 'voice', 'duration')
+
+
+def profile_fingerprint(plan_type, ritual, user_detail):
+    """
+    Fingerprint everything that goes into a generated meditation.
+
+    Args:
+        plan_type: RitualType of the meditation.
+        ritual: Rituals settings (name, tone, voice, duration...).
+        user_detail: CustomUserDetail with the profile used in the prompt.
+
+    Returns:
+        str: Hex SHA-256 of the plan type, ritual settings and profile.
+    """
+    data = {
+        'plan_type': plan_type.id,
+        'ritual': {field: getattr(ritual, field, None) for field in ('name', 'ritual_type', 'tone', 'voice', 'duration')},
+        'profile': {
+            field: getattr(user_detail, field, None) if user_detail else None
+            for field in ('dream', 'goals', 'happiness')
+        },
+    }
+    canonical = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def generation_params(ritual, user_detail, build_digest=True):
+    """
+    Build generate_meditation_audio() arguments with the same defaults as CombinedProfileSerializer.
+
+    Profile fields come from the cached personalization digest (see get_profile_fields).
+    """
+    voice = ritual.voice if ritual and ritual.voice else "female"
+    length = int(ritual.duration) if ritual and ritual.duration else 2
+    return {
+        'name': ritual.name if ritual and ritual.name else "Meditation",
+        **get_profile_fields(user_detail, build_digest=build_digest),
+        'voice': voice if voice in ["female", "male"] else "female",
+        'length': length if length in [2, 5, 10] else 2,
+    }
+
+
+def generation_checkpoint(user, plan_type, ritual, user_detail):
+    """
+    Checkpoint for a user's generation job, keyed by user and profile fingerprint.
+
+    Identical requests share the job, so a retry after a failure resumes
+    from the last completed stage. Callers clear it once the meditation is saved.
+    """
+    job_id = f"{user.pk}-{profile_fingerprint(plan_type, ritual, user_detail)[:32]}"
+    return GenerationCheckpoint(job_id, getattr(settings, 'GENERATION_CHECKPOINT_DIR', None))
+
+
+def _render(params, checkpoint=None):
+    """Process pool entry point: run the generation pipeline for one job"""
+    return generate_meditation_audio(**params, checkpoint=checkpoint)
+
+
+class PreGenerationService:
+    """
+    Off-peak pre-generation of the meditations active users are likely to request.
+
+    Active users are those with a UserLoginTracker record in the last
+    active_days days and a valid plan. Their most frequent recent ritual
+    settings are rendered and stored as MeditationGenerate rows with
+    is_pregenerated=True. Scripts for all jobs come from one batched LLM call;
+    speech and mix then run in a process pool, resuming from each job's
+    checkpointed script. A later request with the same profile
+    fingerprint claims the ready row instead of running the pipeline.
+    """
+
+    def __init__(self, active_days=None, rituals_per_user=None, ttl_hours=None):
+        self.active_days = active_days or getattr(settings, 'PREGENERATION_ACTIVE_DAYS', 7)
+        self.rituals_per_user = rituals_per_user or getattr(settings, 'PREGENERATION_RITUALS_PER_USER', 1)
+        self.ttl_hours = ttl_hours or getattr(settings, 'PREGENERATION_TTL_HOURS', 36)
+
+    def active_users(self):
+        since = timezone.now().date() - timezone.timedelta(days=self.active_days)
+        user_ids = UserLoginTracker.objects.filter(login_date__gte=since).values_list('user_id', flat=True).distinct()
+        for user in CustomUser.objects.filter(id__in=user_ids, is_active=True):
+            if get_active_user_plan(user):
+                yield user
+
+    def likely_rituals(self, user):
+        """
+        Most frequent (ritual type, ritual settings) pairs from the user's recent meditations.
+
+        Returns:
+            list: (RitualType, Rituals) tuples, most frequent first.
+        """
+        since = timezone.now() - timezone.timedelta(days=self.active_days)
+        recent = MeditationGenerate.objects.visible().filter(
+            user=user, created_at__gte=since
+        ).select_related('details', 'ritual_type').order_by('-created_at')
+
+        counts = Counter()
+        latest = {}
+        for meditation in recent:
+            ritual = meditation.details
+            key = (meditation.ritual_type_id,) + tuple(getattr(ritual, field) for field in RITUAL_SETTING_FIELDS)
+            counts[key] += 1
+            latest.setdefault(key, (meditation.ritual_type, ritual))
+        return [latest[key] for key, _ in counts.most_common(self.rituals_per_user)]
+
+    def build_jobs(self, build_digests=True):
+        """
+        Collect pre-generation jobs, skipping ones whose profile has not changed.
+
+        Args:
+            build_digests: Build stale profile digests first (off for dry runs)
+
+        Returns:
+            tuple: (jobs list, number of skipped jobs)
+        """
+        jobs = []
+        skipped = 0
+        user_details = {}
+        for user in self.active_users():
+            user_detail = CustomUserDetail.objects.filter(user=user).first()
+            for plan_type, ritual in self.likely_rituals(user):
+                fingerprint = profile_fingerprint(plan_type, ritual, user_detail)
+                if MeditationGenerate.objects.filter(
+                    user=user, is_pregenerated=True, profile_fingerprint=fingerprint
+                ).exists():
+                    skipped += 1
+                    continue
+                if user_detail:
+                    user_details[user_detail.pk] = user_detail
+                jobs.append({
+                    'user': user,
+                    'plan_type': plan_type,
+                    'ritual': ritual,
+                    'fingerprint': fingerprint,
+                    'user_detail': user_detail,
+                })
+
+        # Stale profile digests are built in one batched LLM call rather than one call per job;
+        # a profile whose digest failed is rendered from its raw fields
+        if build_digests:
+            build_profile_digests(
+                user_details.values(), max_concurrency=getattr(settings, 'PREGENERATION_LLM_CONCURRENCY', None)
+            )
+        for job in jobs:
+            job['params'] = generation_params(job['ritual'], job.pop('user_detail'), build_digest=False)
+        return jobs, skipped
+
+    def expire(self):
+        """
+        Delete pre-generated meditations nobody claimed within ttl_hours.
+
+        Returns:
+            int: Number of deleted meditations.
+        """
+        cutoff = timezone.now() - timezone.timedelta(hours=self.ttl_hours)
+        expired = MeditationGenerate.objects.filter(is_pregenerated=True, pregenerated_at__lt=cutoff)
+        count = 0
+        for meditation in expired.select_related('details'):
+            if meditation.file:
+                meditation.file.delete(save=False)
+            meditation.details.delete()  # Cascades to the meditation
+            count += 1
+        return count
+
+    def run(self, workers=None, dry_run=False, stdout=None):
+        """
+        Expire stale rows and render new jobs in a process pool.
+
+        Returns:
+            dict: Counts of expired, skipped, generated and failed jobs.
+        """
+        workers = workers or getattr(settings, 'PREGENERATION_WORKERS', 2)
+        summary = {'expired': 0, 'skipped': 0, 'generated': 0, 'failed': 0}
+        if not dry_run:
+            summary['expired'] = self.expire()
+
+        jobs, summary['skipped'] = self.build_jobs(build_digests=not dry_run)
+        if dry_run or not jobs:
+            summary['pending'] = len(jobs)
+            return summary
+
+        jobs, summary['failed'] = self.prepare_scripts(jobs)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_render, job['params'], job['checkpoint']): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    self._store(job, future.result())
+                    job['checkpoint'].clear()
+                    summary['generated'] += 1
+                except Exception as e:
+                    summary['failed'] += 1
+                    logger.error(f"Pre-generation failed for user {job['user'].pk}: {str(e)}")
+        return summary
+
+    def prepare_scripts(self, jobs):
+        """
+        Generate the scripts of all jobs in one batched LLM call.
+
+        Each script is stored as the "script" stage of the job's checkpoint,
+        so the render skips the LLM. Jobs whose checkpoint already has a
+        script (an earlier failed run) are not sent again.
+
+        Returns:
+            tuple: (jobs with a script, number of jobs whose script failed)
+        """
+        checkpoint_dir = getattr(settings, 'GENERATION_CHECKPOINT_DIR', None)
+        pending = []
+        for job in jobs:
+            job['checkpoint'] = GenerationCheckpoint(f"pregen-{job['user'].pk}-{job['fingerprint'][:32]}", checkpoint_dir)
+            if not job['checkpoint'].has('script'):
+                pending.append(job)
+
+        profiles = [
+            {
+                'name': job['params']['name'],
+                'goals': job['params']['goals'],
+                'dreamlife': job['params']['dreamlife'],
+                'dream_activities': job['params']['dream_activities'],
+                'word_count': get_word_count(job['params']['length']),
+                'label': PLAN_TYPE_LABELS.get(job['plan_type'].name),
+            }
+            for job in pending
+        ]
+        failed = set()
+        for job, script in zip(pending, generate_scripts(
+            profiles, max_concurrency=getattr(settings, 'PREGENERATION_LLM_CONCURRENCY', None)
+        )):
+            if isinstance(script, Exception):
+                failed.add(id(job))
+                logger.error(f"Pre-generation script failed for user {job['user'].pk}: {str(script)}")
+            else:
+                job['checkpoint'].save('script', script.encode('utf-8'))
+        return [job for job in jobs if id(job) not in failed], len(failed)
+
+    def _store(self, job, audio_data):
+        ritual = job['ritual']
+        plan_type = job['plan_type']
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"meditation_{plan_type.name.lower().replace(' ', '_')}_{timestamp}.mp3"
+
+        with transaction.atomic():
+            # Own copy of the settings so the source ritual can change or be deleted
+            ritual_copy = Rituals.objects.create(**{field: getattr(ritual, field) for field in RITUAL_SETTING_FIELDS})
+            MeditationGenerate.objects.create(
+                user=job['user'],
+                details=ritual_copy,
+                ritual_type=plan_type,
+                file=ContentFile(audio_data, name=filename),
+                is_pregenerated=True,
+                profile_fingerprint=job['fingerprint'],
+                pregenerated_at=timezone.now(),
+            )
+
+    def claim(self, user, plan_type, ritual, user_detail):
+        """
+        Hand a ready pre-generated meditation to a live request if the profile matches.
+
+        The meditation takes over the request's ritual and becomes a regular,
+        visible meditation of the user.
+
+        Returns:
+            MeditationGenerate or None
+        """
+        if ritual is None:
+            return None
+        fingerprint = profile_fingerprint(plan_type, ritual, user_detail)
+        with transaction.atomic():
+            meditation = MeditationGenerate.objects.select_for_update(skip_locked=True).filter(
+                user=user, ritual_type=plan_type, is_pregenerated=True, profile_fingerprint=fingerprint
+            ).select_related('details').first()
+            if not meditation:
+                return None
+            ritual_copy = meditation.details
+            MeditationGenerate.objects.filter(pk=meditation.pk).update(
+                details=ritual, is_pregenerated=False, created_at=timezone.now(), updated_at=timezone.now()
+            )
+            ritual_copy.delete()
+        meditation.refresh_from_db()
+        logger.info(f"Served pre-generated meditation {meditation.pk} to user {user.pk}")
+        return meditation
+
+
+pregeneration_service = PreGenerationService()
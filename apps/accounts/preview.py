@@ -0,0 +1,103 @@
+import logging
+import mimetypes
+import threading
+import uuid
+
+from django.db import close_old_connections
+
+from apps.accounts.audio_metadata import AUDIO_METADATA_FIELDS, update_audio_metadata
+from apps.accounts.fallback import fallback_catalog
+from apps.accounts.generate.tracing import tracer
+from apps.accounts.models import MeditationGenerate
+from apps.accounts.rate_limit import generation_limiter
+from apps.accounts.scheduling import generation_scheduler
+from apps.accounts.variations import store_generation_artifacts
+
+logger = logging.getLogger(__name__)
+
+# Serve HLS playlists and segments with the types players expect
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+
+def hls_directory():
+    """
+    New media-relative directory for a segmented meditation stream.
+    """
+    return f"meditations/hls/{uuid.uuid4().hex}"
+
+
+def start_full_generation(meditation_id, user, generate_file, checkpoint=None, count_against_limit=True):
+    """
+    Generate the full-length meditation in a background thread.
+
+    When it is ready the file replaces the preview or fallback file (if any)
+    on the same MeditationGenerate record and is_preview / is_fallback are
+    cleared. If generation fails the previous file stays in place and
+    is_preview stays set, so upgrade_fallback_meditations picks the record
+    up once it is stale. The thread waits for a scheduler slot like any
+    other generation.
+
+    Args:
+        meditation_id: ID of the MeditationGenerate holding the preview.
+        user: Owner of the meditation (used for scheduling priority).
+        generate_file: Callable returning the full meditation as a ContentFile,
+            or None when there is no file to store (segmented stream only).
+        checkpoint: GenerationCheckpoint used by generate_file; its script and
+            speech are stored on the meditation and it is cleared afterwards.
+        count_against_limit: Keep the user's concurrency slot until the thread
+            finishes. Must be called inside generation_limiter.acquire().
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    release = generation_limiter.hold(user) if count_against_limit else None
+    thread = threading.Thread(
+        # Spans of the background generation stay in the request's trace
+        target=tracer.wrap(_complete_full_generation),
+        args=(meditation_id, user, generate_file, checkpoint, release),
+        name=f"meditation-full-{meditation_id}",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _complete_full_generation(meditation_id, user, generate_file, checkpoint=None, release=None):
+    try:
+        with generation_scheduler.slot(user):
+            content_file = generate_file()
+
+        meditation = MeditationGenerate.objects.get(id=meditation_id)
+        if content_file is None:
+            # Streamed without a merged download file
+            meditation.is_preview = False
+            meditation.save(update_fields=['is_preview', 'updated_at'])
+            logger.info(f"Full meditation {meditation_id} finished streaming")
+            return
+
+        preview_name = meditation.file.name if meditation.file else None
+        with tracer.span("storage.save"):
+            meditation.file.save(content_file.name, content_file, save=False)
+        meditation.is_preview = False
+        meditation.is_fallback = False
+        meditation.fallback_reason = ''
+        # The stored metadata describes the preview clip
+        update_audio_metadata(meditation, force=True)
+        meditation.save(update_fields=['file', 'is_preview', 'is_fallback', 'fallback_reason', 'updated_at', *AUDIO_METADATA_FIELDS])
+
+        # Fallback catalog files are shared by many records
+        if preview_name and not fallback_catalog.is_shared(preview_name):
+            meditation.file.storage.delete(preview_name)
+        if checkpoint and checkpoint.has('mix'):
+            store_generation_artifacts(meditation, checkpoint)
+            checkpoint.clear()
+        logger.info(f"Full meditation {meditation_id} is ready")
+    except MeditationGenerate.DoesNotExist:
+        logger.warning(f"Meditation {meditation_id} was removed before full generation finished")
+    except Exception as e:
+        logger.error(f"Full generation for meditation {meditation_id} failed, keeping previous file: {str(e)}")
+    finally:
+        if release:
+            release()
+        close_old_connections()
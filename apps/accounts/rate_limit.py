@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.accounts.utils import get_active_user_plan
+from config.exceptions import GenerationCapacityError, GenerationRateLimitError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GENERATION_LIMITS = {
+    'generations_per_hour': 3,
+    'generation_burst': 1,
+    'max_concurrent_generations': 1,
+}
+
+
+class GenerationRateLimiter:
+    """
+    Per-user and per-plan limits for meditation generation.
+
+    Each user has a token bucket (generation_burst tokens, refilled at
+    generations_per_hour) and a cap on concurrently running generations; each
+    plan can additionally have an hourly budget shared by all its users. Limits
+    come from the user's active Plans row. State lives in the shared cache so
+    every gunicorn worker enforces the same limits, and a worker remembers
+    buckets it has seen empty so repeated requests are rejected locally without
+    a cache round-trip.
+    """
+
+    def __init__(self):
+        self.defaults = getattr(settings, 'GENERATION_RATE_LIMIT_DEFAULTS', DEFAULT_GENERATION_LIMITS)
+        self.concurrency_retry_after = getattr(settings, 'GENERATION_CONCURRENCY_RETRY_AFTER', 30)
+        self.active_ttl = getattr(settings, 'GENERATION_QUEUE_TIMEOUT', 600) + getattr(settings, 'SINGLE_FLIGHT_TIMEOUT', 600)
+        self._blocked_until = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            'allowed': 0,
+            'rejected_user_rate': 0,
+            'rejected_plan_rate': 0,
+            'rejected_concurrency': 0,
+            'local_fast_path_rejections': 0,
+        }
+
+    def _inc(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+    def limits_for(self, user):
+        """
+        Get the generation limits for a user from their active plan.
+
+        Returns:
+            tuple: (limits dict, Plans object or None)
+        """
+        user_plan = get_active_user_plan(user)
+        if not user_plan:
+            return dict(self.defaults), None
+        plan = user_plan.plan
+        return {
+            'generations_per_hour': plan.generations_per_hour,
+            'generation_burst': plan.generation_burst,
+            'max_concurrent_generations': plan.max_concurrent_generations,
+            'plan_generations_per_hour': plan.plan_generations_per_hour,
+        }, plan
+
+    def _acquire_cache_lock(self, lock_key, attempts=50):
+        for _ in range(attempts):
+            if cache.add(lock_key, 1, timeout=5):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def _take_token(self, key, capacity, per_hour):
+        """
+        Take one token from a shared token bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is available.
+        """
+        now = time.time()
+
+        # Local fast path: this worker already saw the bucket empty
+        with self._lock:
+            blocked_until = self._blocked_until.get(key)
+            if blocked_until and blocked_until > now:
+                self._metrics['local_fast_path_rejections'] += 1
+                return blocked_until - now
+            self._blocked_until.pop(key, None)
+
+        capacity = max(1, capacity)
+        refill_per_second = per_hour / 3600.0
+        lock_key = f"{key}:lock"
+        locked = self._acquire_cache_lock(lock_key)
+        if not locked:
+            logger.warning(f"Could not lock rate limit bucket {key}, checking without lock")
+        try:
+            state = cache.get(key) or {'tokens': float(capacity), 'ts': now}
+            tokens = min(float(capacity), state['tokens'] + (now - state['ts']) * refill_per_second)
+            ttl = int(capacity / refill_per_second) + 60
+            if tokens >= 1:
+                cache.set(key, {'tokens': tokens - 1, 'ts': now}, timeout=ttl)
+                return 0
+            cache.set(key, {'tokens': tokens, 'ts': now}, timeout=ttl)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+        retry_after = (1 - tokens) / refill_per_second
+        with self._lock:
+            # Expired entries are dropped as they are written, so the map only
+            # holds buckets that are empty right now
+            self._blocked_until = {k: until for k, until in self._blocked_until.items() if until > now}
+            self._blocked_until[key] = now + retry_after
+        return retry_after
+
+    def _refund_token(self, key, capacity, per_hour):
+        """
+        Give back a token taken by _take_token for a request that was not served.
+        """
+        lock_key = f"{key}:lock"
+        locked = self._acquire_cache_lock(lock_key)
+        try:
+            state = cache.get(key)
+            if state:
+                ttl = int(max(1, capacity) / (per_hour / 3600.0)) + 60
+                cache.set(key, {'tokens': min(float(max(1, capacity)), state['tokens'] + 1), 'ts': state['ts']}, timeout=ttl)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        with self._lock:
+            self._blocked_until.pop(key, None)
+
+    def reset(self):
+        """
+        Forget the buckets this worker has seen empty (the shared cache state is untouched).
+        """
+        with self._lock:
+            self._blocked_until.clear()
+
+    def _incr_concurrency(self, user_id):
+        key = f"ratelimit:generation:active:{user_id}"
+        cache.add(key, 0, timeout=self.active_ttl)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Key expired between add and incr
+            cache.set(key, 1, timeout=self.active_ttl)
+            return 1
+
+    def _enter_concurrency(self, user_id, max_concurrent):
+        count = self._incr_concurrency(user_id)
+        if count > max_concurrent:
+            self._leave_concurrency(user_id)
+            return False
+        return True
+
+    def _leave_concurrency(self, user_id):
+        try:
+            cache.decr(f"ratelimit:generation:active:{user_id}")
+        except ValueError:
+            pass
+
+    @contextmanager
+    def acquire(self, user):
+        """
+        Admit a generation for the user or raise GenerationRateLimitError.
+
+        Raises:
+            GenerationRateLimitError: With the number of seconds to wait in `wait`.
+        """
+        limits, plan = self.limits_for(user)
+        max_concurrent = limits.get('max_concurrent_generations') or 0
+
+        if max_concurrent and not self._enter_concurrency(user.pk, max_concurrent):
+            self._inc('rejected_concurrency')
+            raise GenerationRateLimitError(
+                f"You already have {max_concurrent} meditation(s) generating. Please wait for them to finish.",
+                wait=self.concurrency_retry_after
+            )
+
+        # Buckets a token was taken from, refunded if the request is not served
+        taken = []
+        try:
+            per_hour = limits.get('generations_per_hour') or 0
+            if per_hour:
+                bucket = (f"ratelimit:generation:user:{user.pk}", limits.get('generation_burst') or 1, per_hour)
+                retry_after = self._take_token(*bucket)
+                if retry_after:
+                    self._inc('rejected_user_rate')
+                    raise GenerationRateLimitError(wait=retry_after)
+                taken.append(bucket)
+
+            plan_per_hour = limits.get('plan_generations_per_hour')
+            if plan and plan_per_hour:
+                bucket = (f"ratelimit:generation:plan:{plan.pk}", plan_per_hour, plan_per_hour)
+                retry_after = self._take_token(*bucket)
+                if retry_after:
+                    self._inc('rejected_plan_rate')
+                    raise GenerationRateLimitError(wait=retry_after)
+                taken.append(bucket)
+        except GenerationRateLimitError:
+            for bucket in taken:
+                self._refund_token(*bucket)
+            if max_concurrent:
+                self._leave_concurrency(user.pk)
+            raise
+
+        self._inc('allowed')
+        try:
+            yield limits
+        except GenerationCapacityError:
+            # Shed by the scheduler (queue full or timed out) before any work was done
+            for bucket in taken:
+                self._refund_token(*bucket)
+            raise
+        finally:
+            if max_concurrent:
+                self._leave_concurrency(user.pk)
+
+
+    def hold(self, user):
+        """
+        Keep counting a generation that continues in the background after its request.
+
+        Call while the request is admitted by acquire(). The slot counts against
+        max_concurrent_generations until the returned callable is called; if the
+        worker dies first, the counter expires with the other active counts.
+
+        Returns:
+            callable: Releases the slot.
+        """
+        limits, _ = self.limits_for(user)
+        if not limits.get('max_concurrent_generations'):
+            return lambda: None
+        self._incr_concurrency(user.pk)
+        return lambda: self._leave_concurrency(user.pk)
+
+
+generation_limiter = GenerationRateLimiter()
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from apps.accounts.generate.dsp_pool import audio_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AUDIO_RENDITIONS = {
+    'opus': {'format': 'ogg', 'codec': 'libopus', 'bitrate': '32k', 'extension': 'ogg', 'content_types': ['audio/ogg', 'audio/opus']},
+    'aac': {'format': 'mp4', 'codec': 'aac', 'bitrate': '48k', 'extension': 'm4a', 'content_types': ['audio/mp4', 'audio/aac', 'audio/x-m4a']},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_renditions():
+    return getattr(settings, 'AUDIO_RENDITIONS', DEFAULT_AUDIO_RENDITIONS)
+
+
+def rendition_name(name, variant):
+    """
+    Storage name of a rendition: <dir>/renditions/<stem>.<variant>.<extension>
+    """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    extension = get_renditions()[variant]['extension']
+    return os.path.join(directory, 'renditions', f"{stem}.{variant}.{extension}")
+
+
+def negotiate_variant(request):
+    """
+    Pick a rendition from the ?format= query parameter or the Accept header.
+
+    Returns:
+        tuple: (variant name or None, whether the Accept header was used)
+    """
+    renditions = get_renditions()
+    requested = request.GET.get('format')
+    if requested:
+        return (requested if requested in renditions else None), False
+
+    accept = request.META.get('HTTP_ACCEPT', '')
+    if not accept:
+        return None, False
+    accepted = [part.split(';')[0].strip().lower() for part in accept.split(',')]
+    for variant, options in renditions.items():
+        if any(content_type in accepted for content_type in options['content_types']):
+            return variant, True
+    return None, True
+
+
+def encode_renditions(field_file):
+    """
+    Encode every missing rendition of an MP3 FileField.
+
+    Returns:
+        list: Names of the renditions that were created.
+    """
+    if not field_file or not field_file.name.lower().endswith('.mp3'):
+        return []
+    storage = field_file.storage
+    source_path = storage.path(field_file.name)
+    if not os.path.isfile(source_path):
+        return []
+
+    created = []
+    for variant, options in get_renditions().items():
+        name = rendition_name(field_file.name, variant)
+        target_path = storage.path(name)
+        if os.path.exists(target_path):
+            continue
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Another worker may be encoding the same source, e.g. the shared fallback file
+        temp_path = f"{target_path}.{uuid.uuid4().hex}.part"
+        try:
+            # Transcoding runs in the audio process pool, away from the request threads
+            audio_pool.encode(source_path, temp_path, format=options['format'], codec=options['codec'], bitrate=options['bitrate'])
+            os.replace(temp_path, target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        created.append(name)
+        logger.info(
+            f"Created {variant} rendition {name} "
+            f"({os.path.getsize(target_path)} bytes from {os.path.getsize(source_path)})"
+        )
+    return created
+
+
+def _run_safely(job, field_file):
+    try:
+        job(field_file)
+    except Exception as e:
+        logger.error(f"{job.__name__} failed for {field_file.name}: {str(e)}")
+
+
+def schedule_background(job, field_file):
+    """
+    Run job(field_file) on the shared background pool for derived audio files.
+
+    A small pool bounds how many transcodes and analyses wait on the
+    audio process pool at once.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AUDIO_RENDITION_WORKERS', 1),
+                thread_name_prefix='audio-rendition'
+            )
+    _executor.submit(_run_safely, job, field_file)
+
+
+def schedule_renditions(field_file):
+    """
+    Encode renditions of a saved file in the background.
+    """
+    if not getattr(settings, 'AUDIO_RENDITIONS_ENABLED', True) or not field_file:
+        return
+    schedule_background(encode_renditions, field_file)
@@ -3,6 +3,7 @@ from django.contrib.auth.models import Group
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
@@ -21,8 +22,19 @@ from apps.accounts.models import (
 # Import local meditation generation functions
 from apps.accounts.generate.functions import (
     sleep_function, spark_function, calm_function, 
-    dream_function, check_in_function
+    dream_function, check_in_function, generate_preview_audio,
+    generate_segmented_audio, PLAN_TYPE_LABELS
 )
+from apps.accounts.generate.streaming import PLAYLIST_NAME
+
+from apps.accounts.pregeneration import pregeneration_service, generation_params, generation_checkpoint
+from apps.accounts.preview import start_full_generation, hls_directory
+from apps.accounts.media import protected_media_url, versioned_media_url, media_version
+from apps.accounts.variations import store_generation_artifacts, get_music_beds
+from apps.accounts.personalization import get_profile_fields
+from apps.accounts.waveforms import waveform_exists
+from apps.accounts.fallback import fallback_catalog, fallback_reason
+from apps.accounts.generate.tracing import tracer
 
 # Import custom exceptions
 from config.exceptions import (
@@ -259,6 +271,11 @@ class CombinedProfileSerializer(serializers.Serializer):
     tone = serializers.ChoiceField(choices=Rituals.ToneChoices.choices, required=False)
     voice = serializers.ChoiceField(choices=Rituals.VoiceChoices.choices, required=False)
     duration = serializers.ChoiceField(choices=Rituals.DurationChoices.choices, required=False)
+    
+    # Return a ~30 second preview at once and finish the full meditation in the background
+    preview = serializers.BooleanField(required=False, default=False)
+    # Return an HLS playlist at once that fills up with segments as the meditation generates
+    stream = serializers.BooleanField(required=False, default=False)
 
     def validate(self, data):
         """
@@ -353,16 +370,100 @@ class CombinedProfileSerializer(serializers.Serializer):
             # Get plan type
             plan_type = RitualType.objects.get(id=validated_data['plan_type'])
             
+            # Serve a meditation pre-generated overnight for the same profile if one is ready
+            meditation = pregeneration_service.claim(user, plan_type, ritual, user_detail)
+            if meditation:
+                return {
+                    'success': True,
+                    'message': 'Meditation generated successfully',
+                    'meditation_id': meditation.id,
+                    'user_detail': user_detail,
+                    'ritual': ritual
+                }
+            
+            # Shed to the pre-rendered tier when overloaded (set by the view) or out of provider quota
+            shed_reason = validated_data.get('fallback_reason')
+            if not shed_reason and fallback_catalog.quota_exhausted():
+                shed_reason = MeditationGenerate.FallbackReason.QUOTA
+            if shed_reason:
+                meditation = fallback_catalog.create_meditation(user, plan_type, ritual, shed_reason)
+                if meditation:
+                    return self._fallback_result(meditation, user_detail, ritual)
+            
+            if validated_data.get('stream') and ritual:
+                playlist_dir = hls_directory()
+                with transaction.atomic():
+                    meditation = MeditationGenerate.objects.create(
+                        user=user,
+                        details=ritual,
+                        ritual_type=plan_type,
+                        hls_playlist=f"{playlist_dir}/{PLAYLIST_NAME}",
+                        # Until the playlist is complete
+                        is_preview=True
+                    )
+                start_full_generation(
+                    meditation.id, user,
+                    lambda: self.generate_stream(plan_type, ritual, user_detail, playlist_dir)
+                )
+                return {
+                    'success': True,
+                    'message': 'Meditation streaming started',
+                    'meditation_id': meditation.id,
+                    'stream_path': meditation.hls_playlist,
+                    'user_detail': user_detail,
+                    'ritual': ritual
+                }
+            
+            if validated_data.get('preview') and ritual:
+                preview_file = self.generate_preview(plan_type, ritual, user_detail)
+                if preview_file:
+                    with transaction.atomic():
+                        meditation = MeditationGenerate.objects.create(
+                            user=user,
+                            details=ritual,
+                            ritual_type=plan_type,
+                            file=preview_file,
+                            is_preview=True
+                        )
+                    checkpoint = generation_checkpoint(user, plan_type, ritual, user_detail)
+                    start_full_generation(
+                        meditation.id, user,
+                        lambda: self.generate_meditation(plan_type, ritual, user_detail, checkpoint=checkpoint),
+                        checkpoint=checkpoint
+                    )
+                    return {
+                        'success': True,
+                        'message': 'Meditation preview generated, full meditation is on its way',
+                        'meditation_id': meditation.id,
+                        'is_preview': True,
+                        'user_detail': user_detail,
+                        'ritual': ritual
+                    }
+            
+            # Retries of the same request resume from the last completed pipeline stage
+            checkpoint = generation_checkpoint(user, plan_type, ritual, user_detail)
+            
             # Generate meditation file
-            meditation_file = self.generate_meditation(plan_type, ritual, user_detail)
+            try:
+                meditation_file = self.generate_meditation(plan_type, ritual, user_detail, checkpoint=checkpoint)
+            except Exception as e:
+                meditation = fallback_catalog.create_meditation(user, plan_type, ritual, fallback_reason(e))
+                if not meditation:
+                    raise
+                # The checkpoint is kept so the upgrade to a personalized render resumes from it
+                return self._fallback_result(meditation, user_detail, ritual)
             
-            with transaction.atomic():
+            with tracer.span("storage.save"), transaction.atomic():
                 meditation = MeditationGenerate.objects.create(
                     user=user,
                     details=ritual,
                     ritual_type=plan_type,
                     file=meditation_file
                 )
+            if checkpoint.has('mix'):
+                # Script and speech are reused by re-voice / re-mix
+                store_generation_artifacts(meditation, checkpoint)
+                checkpoint.clear()
             
             return {
                 'success': True,
@@ -379,9 +480,58 @@ class CombinedProfileSerializer(serializers.Serializer):
             logger.error(f"Error creating meditation: {str(e)}")
             raise MeditationGenerationError('An unexpected error occurred while creating the meditation. Please try again.')
 
-    def generate_meditation(self, plan_type, ritual, user_detail):
+    def _fallback_result(self, meditation, user_detail, ritual):
+        return {
+            'success': True,
+            'message': 'A ready-made meditation was served, your personalized one will replace it later',
+            'meditation_id': meditation.id,
+            'is_fallback': True,
+            'fallback_reason': meditation.fallback_reason,
+            'user_detail': user_detail,
+            'ritual': ritual
+        }
+
+    def generate_preview(self, plan_type, ritual, user_detail):
+        """
+        Generate a short preview clip, or None if it fails (the caller then generates the full meditation)
+        """
+        try:
+            params = generation_params(ritual, user_detail)
+            params.pop('length')
+            audio_data = generate_preview_audio(**params)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"meditation_{plan_type.name.lower().replace(' ', '_')}_{timestamp}_preview.mp3"
+            return ContentFile(audio_data, name=filename)
+        except Exception as e:
+            logger.error(f"Preview generation failed: {str(e)}")
+            return None
+    
+    def generate_stream(self, plan_type, ritual, user_detail, playlist_dir):
+        """
+        Generate the meditation as HLS segments under MEDIA_ROOT/playlist_dir
+        
+        Returns:
+            ContentFile: The merged MP3, or None if GENERATION_HLS_MERGE_MP3 is off
+        """
+        audio_data = generate_segmented_audio(
+            **generation_params(ritual, user_detail),
+            segment_dir=os.path.join(settings.MEDIA_ROOT, playlist_dir),
+            segment_seconds=getattr(settings, 'GENERATION_HLS_SEGMENT_SECONDS', 6),
+            merge=getattr(settings, 'GENERATION_HLS_MERGE_MP3', True),
+            label=PLAN_TYPE_LABELS.get(plan_type.name)
+        )
+        if audio_data is None:
+            return None
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"meditation_{plan_type.name.lower().replace(' ', '_')}_{timestamp}.mp3"
+        return ContentFile(audio_data, name=filename)
+    
+    def generate_meditation(self, plan_type, ritual, user_detail, checkpoint=None):
         """
         Generate meditation file using local functions based on plan type
+        
+        Errors are raised; callers decide whether to serve the fallback tier.
+        Completed stages are stored in checkpoint (GenerationCheckpoint) if given.
         """
         try:
             # Map plan types to their corresponding functions
@@ -399,9 +549,11 @@ class CombinedProfileSerializer(serializers.Serializer):
             
             # Prepare parameters for the function
             name = ritual.name if ritual and ritual.name else "Meditation"
-            goals = user_detail.goals if user_detail and user_detail.goals else ""
-            dreamlife = user_detail.dream if user_detail and user_detail.dream else ""
-            dream_activities = user_detail.happiness if user_detail and user_detail.happiness else ""
+            # Condensed by the cached profile digest for long profiles
+            profile_fields = get_profile_fields(user_detail)
+            goals = profile_fields['goals']
+            dreamlife = profile_fields['dreamlife']
+            dream_activities = profile_fields['dream_activities']
             ritual_type = ritual.ritual_type if ritual and ritual.ritual_type else "Story"
             tone = ritual.tone if ritual and ritual.tone else "Dreamy"
             voice = ritual.voice if ritual and ritual.voice else "female"
@@ -436,7 +588,8 @@ class CombinedProfileSerializer(serializers.Serializer):
                     tone=tone,
                     voice=voice,
                     length=length,
-                    check_in=check_in
+                    check_in=check_in,
+                    checkpoint=checkpoint
                 )
                 
                 # Create a filename for the meditation
@@ -450,37 +603,34 @@ class CombinedProfileSerializer(serializers.Serializer):
                 
             except Exception as e:
                 logger.error(f"Meditation generation failed: {str(e)}")
-                return self._create_placeholder_file(plan_type, ritual)
+                raise
                 
         except serializers.ValidationError:
             # Re-raise validation errors
             raise
         except Exception as e:
             logger.error(f"Error in generate_meditation: {str(e)}")
-            return self._create_placeholder_file(plan_type, ritual)
-    
-    def _create_placeholder_file(self, plan_type, ritual):
-        """
-        Use a default MP3 file from muzic as the placeholder when external API is unavailable
-        """
-        try:
-            # Path to the default MP3 file
-            default_mp3_path = os.path.join(os.path.dirname(__file__), 'muzic', 'sleep_manifestation.mp3')
-            
-            # Generate a unique filename for the placeholder
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"meditation_{plan_type.name.lower().replace(' ', '_')}_{timestamp}.mp3"
+            raise
 
-            with open(default_mp3_path, 'rb') as f:
-                audio_data = f.read()
-            content_file = ContentFile(audio_data, name=filename)
-            return content_file
-            
-        except Exception as e:
-            logger.error(f"Failed to load default placeholder MP3: {str(e)}")
-            # Fallback: return a minimal ContentFile with error message
-            content = f"Placeholder audio unavailable. Error: {str(e)}"
-            return ContentFile(content.encode('utf-8'), name=filename)
+
+class RevoiceMeditationSerializer(serializers.Serializer):
+    voice = serializers.ChoiceField(choices=Rituals.VoiceChoices.choices)
+
+
+class RemixMeditationSerializer(serializers.Serializer):
+    music_bed = serializers.CharField(max_length=50, required=False)
+    music_gain = serializers.FloatField(min_value=-30, max_value=6, required=False)
+    speech_gain = serializers.FloatField(min_value=-30, max_value=6, required=False)
+
+    def validate_music_bed(self, value):
+        if value not in get_music_beds():
+            raise serializers.ValidationError(f"Unknown music bed. Available: {', '.join(get_music_beds())}")
+        return value
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Provide music_bed, music_gain or speech_gain.")
+        return data
 
 
 class RitualsSerializer(serializers.ModelSerializer):
@@ -495,13 +645,40 @@ class RitualTypeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description']
     
 
+def waveform_url(view_name, obj, request=None):
+    """
+    Versioned URL of the waveform endpoint, or None until the peaks are computed.
+    """
+    if not waveform_exists(obj.file):
+        return None
+    url = f"{reverse(view_name, args=[obj.pk])}?v={media_version(obj)}"
+    return request.build_absolute_uri(url) if request else url
+
+
 class MeditationGenerateListSerializer(serializers.ModelSerializer):
     details = serializers.SerializerMethodField()
     ritual_type = serializers.SerializerMethodField()
+    file = serializers.SerializerMethodField()
+    stream_url = serializers.SerializerMethodField()
+    waveform_url = serializers.SerializerMethodField()
 
     class Meta:
         model = MeditationGenerate
-        fields = ['id', 'details', 'ritual_type', 'file', 'created_at']
+        fields = ['id', 'details', 'ritual_type', 'file', 'stream_url', 'waveform_url', 'is_preview', 'is_fallback', 'duration_seconds', 'bitrate_kbps', 'file_size', 'created_at']
+
+    def get_file(self, obj):
+        if not obj.file:
+            return None
+        return protected_media_url(obj.file.name, obj.user, self.context.get('request'), version=media_version(obj))
+
+    def get_stream_url(self, obj):
+        if not obj.hls_playlist:
+            return None
+        directory = obj.hls_playlist.rsplit('/', 1)[0] + '/'
+        return protected_media_url(obj.hls_playlist, obj.user, self.context.get('request'), scope=directory)
+
+    def get_waveform_url(self, obj):
+        return waveform_url('meditation-waveform', obj, self.context.get('request'))
 
     def get_is_deleted_false(self, obj):
         return obj.is_deleted == False
@@ -517,9 +694,22 @@ class MeditationGenerateListSerializer(serializers.ModelSerializer):
 
 
 class MeditationLibraryListSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+    file = serializers.SerializerMethodField()
+    waveform_url = serializers.SerializerMethodField()
+
     class Meta:
         model = MeditationLibrary
-        fields = ['id', 'name', 'image', 'description', 'file', 'created_at']
+        fields = ['id', 'name', 'image', 'description', 'file', 'waveform_url', 'duration_seconds', 'bitrate_kbps', 'file_size', 'created_at']
+
+    def get_image(self, obj):
+        return versioned_media_url(obj.image, media_version(obj), self.context.get('request'))
+
+    def get_file(self, obj):
+        return versioned_media_url(obj.file, media_version(obj), self.context.get('request'))
+
+    def get_waveform_url(self, obj):
+        return waveform_url('meditation-library-waveform', obj, self.context.get('request'))
     
 
 class RitualTypeListSerializer(serializers.ModelSerializer):
@@ -858,6 +1048,14 @@ class ExternalMeditationWithUserCheckSerializer(serializers.Serializer):
                 }
             )
         else:
+            # Without a stored profile the personal fields cannot be filled in below
+            required_fields = ['gender', 'dream', 'goals', 'age_range', 'happiness']
+            missing = [field for field in required_fields if not data.get(field)]
+            if missing and not CustomUserDetail.objects.filter(user=request.user).exists():
+                raise serializers.ValidationError(
+                    f"No profile found for this user. Provide: {', '.join(missing)}"
+                )
+            
             # If user exists in MeditationGenerate, get or create CustomUserDetail
             user_detail, created = CustomUserDetail.objects.get_or_create(
                 user=request.user,
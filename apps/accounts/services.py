@@ -16,7 +16,13 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 from apps.accounts.models import RitualType, Rituals, MeditationGenerate
+from apps.accounts.audio_metadata import AUDIO_METADATA_FIELDS
 from apps.accounts.serializers import ExternalMeditationSerializer
+from apps.accounts.generate.timing import record_stage
+from apps.accounts.generate.tracing import tracer
+from apps.accounts.generate.mp3_scan import validate_mp3, InvalidAudioError
+from apps.accounts.media import protected_media_url, media_version
+from apps.accounts.idempotency import request_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -236,7 +242,7 @@ class ExternalMeditationService:
                     from django.conf import settings
                     # Get the base URL from settings or construct it
                     base_url = getattr(settings, 'BASE_URL', 'http://31.97.98.47:9000')
-                    file_url = f"{base_url}{meditation_record.file.url}"
+                    file_url = f"{base_url}{protected_media_url(meditation_record.file.name, user, version=media_version(meditation_record))}"
                 
                 return {
                     "success": True,
@@ -252,10 +258,16 @@ class ExternalMeditationService:
             
             # Transform data for external API
             external_api_data = self._transform_data_for_external_api(validated_data)
+            # Stable per request so retries resume from the generator's last completed stage
+            external_api_data['job_id'] = f"{user.pk}-{request_fingerprint(api_endpoint, external_api_data)[:32]}"
             
             # Make request to external API with retries
             try:
+                request_started = time.perf_counter()
                 api_response = self._make_external_api_request(api_endpoint, external_api_data, ritual_type_name)
+                if api_response and api_response.get('success'):
+                    # Feed the round trip into the generation time estimate
+                    record_stage('external', time.perf_counter() - request_started)
             except UnicodeDecodeError as e:
                 return {
                     "success": False,
@@ -314,12 +326,13 @@ class ExternalMeditationService:
                 safe_ritual_name = ritual_type_name.replace(' ', '_').lower()
                 default_filename = f"{safe_ritual_name}_{int(timezone.now().timestamp())}.mp3"
                 
-                meditation_record = self._save_meditation_file(
-                    user=user,
-                    ritual_type_name=ritual_type_name,
-                    file_data=api_response.get('file_data') if api_response else None,
-                    file_name=api_response.get('file_name', default_filename) if api_response else default_filename
-                )
+                with tracer.span("storage.save"):
+                    meditation_record = self._save_meditation_file(
+                        user=user,
+                        ritual_type_name=ritual_type_name,
+                        file_data=api_response.get('file_data') if api_response else None,
+                        file_name=api_response.get('file_name', default_filename) if api_response else default_filename
+                    )
                 
                 # Build the full URL for the file
                 file_url = None
@@ -328,7 +341,7 @@ class ExternalMeditationService:
                         from django.conf import settings
                         # Get the base URL from settings or construct it
                         base_url = getattr(settings, 'BASE_URL', 'http://31.97.98.47:9000')
-                        file_url = f"{base_url}{meditation_record.file.url}"
+                        file_url = f"{base_url}{protected_media_url(meditation_record.file.name, user, version=media_version(meditation_record))}"
                 except Exception as url_error:
                     file_url = None
                 
@@ -539,12 +552,17 @@ class ExternalMeditationService:
                     'User-Agent': 'Vela-Meditation-App/1.0'
                 }
                 
-                response = requests.post(
-                    api_endpoint,
-                    json=data,
-                    headers=headers,
-                    timeout=300  # Increased from 30 to 60 seconds
-                )
+                # The generator continues this trace from the traceparent header
+                with tracer.span(f"POST {api_endpoint}", kind="client", attributes={"http.attempt": attempt + 1}) as span:
+                    response = requests.post(
+                        api_endpoint,
+                        json=data,
+                        headers=tracer.inject(headers),
+                        timeout=300  # Increased from 30 to 60 seconds
+                    )
+                    if span:
+                        span.set_attribute("http.status_code", response.status_code)
+                        span.set_attribute("http.response_bytes", len(response.content))
                 
                 # Early detection of binary data - if we see binary markers, treat as binary immediately
                 if response.content:
@@ -840,8 +858,13 @@ class ExternalMeditationService:
                     # Check if file_data is binary data (from external API)
                     if isinstance(file_data, bytes):
                         try:
+                            # Cheap frame-header check so corrupt output never reaches the user
+                            validate_mp3(file_data)
                             content = ContentFile(file_data, name=file_name)
-                            meditation.file.save(file_name, content, save=True)
+                            meditation.file.save(file_name, content, save=False)
+                            meditation.save(update_fields=['file', 'updated_at', *AUDIO_METADATA_FIELDS])
+                        except InvalidAudioError as e:
+                            logger.error(f"External API returned invalid audio for user {user.pk}: {str(e)}")
                         except Exception as save_error:
                             # Continue without the file
                             pass
@@ -855,7 +878,8 @@ class ExternalMeditationService:
                                 if 'audio' in content_type or 'mpeg' in content_type or file_response.content.startswith(b'ID3'):
                                     try:
                                         content = ContentFile(file_response.content, name=file_name)
-                                        meditation.file.save(file_name, content, save=True)
+                                        meditation.file.save(file_name, content, save=False)
+                                        meditation.save(update_fields=['file', 'updated_at', *AUDIO_METADATA_FIELDS])
                                     except Exception as save_error:
                                         # Continue without the file
                                         pass
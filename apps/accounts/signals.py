@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import MeditationLibrary, PushNotification
+from .models import MeditationGenerate, MeditationLibrary, PushNotification
+from .renditions import schedule_renditions
+from .waveforms import schedule_waveform
+from .audio_metadata import update_audio_metadata
 
 
 @receiver(post_save, sender=MeditationLibrary)
@@ -22,4 +26,28 @@ def send_meditation_library_notification(sender, instance, created, **kwargs):
         # For now, we'll just mark it as sent
         notification.is_sent = True
         notification.sent_at = timezone.now()
-        notification.save() 
\ No newline at end of file
+        notification.save() 
+
+
+@receiver(pre_save, sender=MeditationGenerate)
+@receiver(pre_save, sender=MeditationLibrary)
+def store_audio_metadata(sender, instance, update_fields=None, **kwargs):
+    """
+    Read duration, bitrate and frame count from the MP3 frame headers of a new file
+    """
+    if update_fields is not None and 'file' not in update_fields:
+        return
+    update_audio_metadata(instance)
+
+
+@receiver(post_save, sender=MeditationGenerate)
+@receiver(post_save, sender=MeditationLibrary)
+def encode_audio_renditions(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Encode low-bitrate renditions and waveform peaks of a new audio file once the save is committed
+    """
+    if not created and (update_fields is None or 'file' not in update_fields):
+        return
+    if instance.file:
+        transaction.on_commit(lambda: schedule_renditions(instance.file))
+        transaction.on_commit(lambda: schedule_waveform(instance.file))
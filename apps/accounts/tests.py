@@ -1,10 +1,52 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import importlib.util
+import tempfile
+import threading
+import time
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from apps.accounts.models import CustomUserDetail, MeditationGenerate, RitualType, Rituals
+from apps.accounts.models import CustomUserDetail, MeditationGenerate, Plans, RitualType, Rituals, UserLoginTracker, UserPlan
 from apps.accounts.serializers import ExternalMeditationWithUserCheckSerializer
 from apps.accounts.views import ExternalMeditationAPIView
+from apps.accounts.idempotency import SingleFlight
+from apps.accounts.rate_limit import GenerationRateLimiter, generation_limiter
+from apps.accounts.scheduling import GenerationScheduler
+from apps.accounts.backpressure import GenerationLoadEstimator
+from apps.accounts.media import protected_media_url, media_version, MEDIA_TOKEN_SALT
+from apps.accounts.personalization import build_profile_digests, get_profile_fields, raw_profile_fields
+from apps.accounts.pregeneration import PreGenerationService, profile_fingerprint
+from apps.accounts.fallback import FallbackCatalog, fallback_reason
+from apps.accounts.renditions import encode_renditions, rendition_name
+from apps.accounts.waveforms import compute_waveform, schedule_waveform, waveform_name
+from apps.accounts.generate.checkpoints import GenerationCheckpoint, prune_checkpoints
+from apps.accounts.generate.dsp_pool import AudioProcessPool, DSPQueueFullError
+from apps.accounts.generate.functions import generate_meditation_audio, get_word_count, PREVIEW_WORD_COUNT
+from apps.accounts.generate.generation import generate_script, generate_scripts, length_inputs, summarize_profiles, PROMPT, STATIC_PREFIX
+from apps.accounts.generate.llm_router import HedgedLLMRouter, LLMBackend
+from apps.accounts.generate.music import ProgressiveMix, AudioFormat, NATIVE_FORMAT, encoder_parameters, to_format
+from apps.accounts.generate.timing import generation_trace, timed_stage
+from apps.accounts.generate import profiling
+from apps.accounts.generate.tracing import Tracer, SpanContext
+from apps.accounts.generate.metrics import METRICS_ENABLED, provider_outcome
+from apps.accounts.generate.mp3_scan import scan_mp3, validate_mp3, InvalidAudioError
+from apps.accounts.generate.streaming import HLSWriter, split_script
+from apps.accounts.generate.synthesis import synthesize_audio, synthesize_sentences
+from apps.accounts.generate.tts_cache import SegmentCache
+from config.exceptions import GenerationCapacityError, GenerationRateLimitError
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock, PropertyMock
 
 User = get_user_model()
@@ -195,6 +237,9 @@ class ExternalMeditationWithUserCheckSerializerTest(TestCase):
 
 class ExternalMeditationAPIViewTest(APITestCase):
     def setUp(self):
+        # Rate limit buckets and idempotency records outlive a test in LocMem
+        cache.clear()
+        generation_limiter.reset()
         self.client = APIClient()
         self.user = User.objects.create_user(
             email='test@example.com',
@@ -338,3 +383,1400 @@ class ExternalMeditationAPIViewTest(APITestCase):
         self.assertIn('age_range', response.data['details'])
         self.assertIn('happiness', response.data['details'])
         self.assertFalse(response.data['user_exists_in_meditation'])
+
+
+class IdempotentMeditationRequestTest(APITestCase):
+    def setUp(self):
+        # Rate limit buckets and idempotency records outlive a test in LocMem
+        cache.clear()
+        generation_limiter.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            username='testuser',
+            password='testpass123'
+        )
+        self.ritual_type = RitualType.objects.create(
+            name='Test Ritual Type',
+            description='Test Description'
+        )
+        self.data = {
+            'plan_type': self.ritual_type.id,
+            'gender': 'male',
+            'dream': 'Test dream',
+            'goals': 'Test goals',
+            'age_range': '25-35',
+            'happiness': 'Very happy',
+            'ritual_type': 'guided',
+            'tone': 'dreamy',
+            'voice': 'male',
+            'duration': '5'
+        }
+
+    @patch('apps.accounts.views.ExternalMeditationService')
+    def test_retry_with_same_key_replays_stored_response(self, mock_service):
+        """Test a retried request with the same Idempotency-Key does not generate again"""
+        mock_service_instance = MagicMock()
+        mock_service_instance.process_meditation_request.return_value = {
+            'success': True,
+            'meditation_id': 1,
+            'file_url': 'http://example.com/file.mp3'
+        }
+        mock_service.return_value = mock_service_instance
+        self.client.force_authenticate(user=self.user)
+
+        first = self.client.post('/api/auth/meditation/external/', self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc-123')
+        second = self.client.post('/api/auth/meditation/external/', self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc-123')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['file_url'], 'http://example.com/file.mp3')
+        self.assertEqual(mock_service_instance.process_meditation_request.call_count, 1)
+
+    @patch('apps.accounts.views.ExternalMeditationService')
+    def test_same_key_with_different_payload_is_rejected(self, mock_service):
+        """Test an Idempotency-Key cannot be reused for a different request"""
+        mock_service_instance = MagicMock()
+        mock_service_instance.process_meditation_request.return_value = {
+            'success': True,
+            'meditation_id': 1
+        }
+        mock_service.return_value = mock_service_instance
+        self.client.force_authenticate(user=self.user)
+
+        self.client.post('/api/auth/meditation/external/', self.data, format='json', HTTP_IDEMPOTENCY_KEY='abc-123')
+        response = self.client.post(
+            '/api/auth/meditation/external/', {**self.data, 'duration': '10'}, format='json', HTTP_IDEMPOTENCY_KEY='abc-123'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(mock_service_instance.process_meditation_request.call_count, 1)
+
+    @patch('apps.accounts.views.ExternalMeditationService')
+    def test_generation_rate_limit_returns_retry_after(self, mock_service):
+        """Test users without a plan are limited to the default generation burst"""
+        mock_service_instance = MagicMock()
+        mock_service_instance.process_meditation_request.return_value = {
+            'success': True,
+            'meditation_id': 1
+        }
+        mock_service.return_value = mock_service_instance
+        self.client.force_authenticate(user=self.user)
+
+        first = self.client.post('/api/auth/meditation/external/', self.data, format='json')
+        second = self.client.post('/api/auth/meditation/external/', {**self.data, 'duration': '10'}, format='json')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', second)
+        self.assertEqual(mock_service_instance.process_meditation_request.call_count, 1)
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def generate(self):
+        self.calls += 1
+        self.entered.set()
+        self.assertTrue(self.release.wait(5))
+        return {'meditation_id': self.calls}
+
+    def run_concurrently(self, flights):
+        with ThreadPoolExecutor(max_workers=len(flights)) as executor:
+            leader = executor.submit(flights[0].do, 'user:fingerprint', self.generate)
+            self.assertTrue(self.entered.wait(5))
+            followers = [executor.submit(flight.do, 'user:fingerprint', self.generate) for flight in flights[1:]]
+            time.sleep(0.05)
+            self.release.set()
+            results = [future.result(5) for future in [leader, *followers]]
+        return results
+
+    def test_callers_in_one_worker_share_the_call(self):
+        flight = SingleFlight('test', poll_interval=0.01)
+        results = self.run_concurrently([flight, flight, flight])
+        self.assertEqual(results, [{'meditation_id': 1}] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_callers_in_other_workers_share_the_call(self):
+        # Separate instances only share the cache, like gunicorn workers
+        flights = [SingleFlight('test', poll_interval=0.01) for _ in range(3)]
+        results = self.run_concurrently(flights)
+        self.assertEqual(results, [{'meditation_id': 1}] * 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_caller_arriving_after_the_leader_gets_its_result(self):
+        self.release.set()
+        first = SingleFlight('test', poll_interval=0.01).do('user:fingerprint', self.generate)
+        second = SingleFlight('test', poll_interval=0.01).do('user:fingerprint', self.generate)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+
+    def test_lock_taken_over_after_expiry_is_kept(self):
+        flight = SingleFlight('test')
+        lock_key = 'singleflight:test:lock:user:fingerprint'
+
+        def generate():
+            # The leader outlived wait_timeout and another worker took the lock
+            cache.set(lock_key, 'other-worker')
+            return {'meditation_id': 1}
+        flight.do('user:fingerprint', generate)
+        self.assertEqual(cache.get(lock_key), 'other-worker')
+
+    def test_failed_leader_is_taken_over(self):
+        flight = SingleFlight('test', poll_interval=0.01)
+        with self.assertRaises(RuntimeError):
+            flight.do('user:fingerprint', MagicMock(side_effect=RuntimeError('TTS failed')))
+        self.release.set()
+        self.assertEqual(flight.do('user:fingerprint', self.generate), {'meditation_id': 1})
+
+
+class GenerationRateLimiterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.limiter = GenerationRateLimiter()
+
+    def test_expired_local_blocks_are_evicted(self):
+        self.limiter._blocked_until['ratelimit:generation:user:gone'] = 1.0
+        self.assertEqual(self.limiter._take_token('ratelimit:generation:user:1', 1, 3600), 0)
+        self.assertGreater(self.limiter._take_token('ratelimit:generation:user:1', 1, 3600), 0)
+
+        self.assertEqual(list(self.limiter._blocked_until), ['ratelimit:generation:user:1'])
+
+    def test_plan_rejection_refunds_the_user_token(self):
+        plan = Plans.objects.create(name='Team', is_free_trial=True, generation_burst=2, plan_generations_per_hour=1)
+        first, second = [
+            User.objects.create_user(email=f'{name}@example.com', username=name, password='testpass123')
+            for name in ('first', 'second')
+        ]
+        for user in (first, second):
+            UserPlan.objects.create(user=user, plan=plan)
+
+        with self.limiter.acquire(first):
+            pass
+        with self.assertRaises(GenerationRateLimitError):
+            with self.limiter.acquire(second):
+                pass
+        self.assertEqual(self.limiter.metrics()['rejected_plan_rate'], 1)
+        self.assertAlmostEqual(cache.get(f'ratelimit:generation:user:{second.pk}')['tokens'], 2, places=2)
+
+    def test_scheduler_shedding_refunds_the_token(self):
+        user = User.objects.create_user(email='shed@example.com', username='shed', password='testpass123')
+        # Users without a plan get a burst of one generation
+        with self.assertRaises(GenerationCapacityError):
+            with self.limiter.acquire(user):
+                raise GenerationCapacityError(wait=30)
+        with self.limiter.acquire(user):
+            pass
+        with self.assertRaises(GenerationRateLimitError):
+            with self.limiter.acquire(user):
+                pass
+
+
+@patch('apps.accounts.scheduling.get_priority_class', side_effect=lambda user: user)
+class GenerationSchedulerTest(TestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_higher_plan_class_is_admitted_first(self, mock_priority):
+        scheduler = GenerationScheduler(max_concurrency=1, aging_rate=0)
+        admitted = []
+
+        def generate(priority_class):
+            with scheduler.slot(priority_class):
+                admitted.append(priority_class)
+
+        with scheduler.slot('monthly'):
+            waiters = []
+            for index, priority_class in enumerate(['free_trial', 'annual']):
+                waiters.append(threading.Thread(target=generate, args=(priority_class,)))
+                waiters[-1].start()
+                self.wait_for(lambda: scheduler.queue_depth() == index + 1)
+            # A new trial request waits behind both queued jobs, an annual one only behind the annual job
+            self.assertEqual(scheduler.jobs_ahead('free_trial'), 3)
+            self.assertEqual(scheduler.jobs_ahead('annual'), 2)
+        for waiter in waiters:
+            waiter.join(5)
+
+        self.assertEqual(admitted, ['annual', 'free_trial'])
+        self.assertEqual(scheduler.stats()['classes']['free_trial']['admitted'], 1)
+
+    def test_full_queue_times_out(self, mock_priority):
+        scheduler = GenerationScheduler(max_concurrency=1, queue_timeout=0.05)
+        with scheduler.slot('annual'):
+            with self.assertRaises(GenerationCapacityError):
+                with scheduler.slot('free_trial'):
+                    pass
+            self.assertEqual(scheduler.queue_depth(), 0)
+        self.assertEqual(scheduler.active_count(), 0)
+
+
+@patch('apps.accounts.backpressure.stage_stats')
+class GenerationLoadEstimatorTest(TestCase):
+    def make_estimator(self, jobs_ahead):
+        scheduler = MagicMock(max_concurrency=2)
+        scheduler.jobs_ahead.return_value = jobs_ahead
+        scheduler.queue_depth.return_value = 3
+        return GenerationLoadEstimator(scheduler=scheduler)
+
+    def test_jobs_ahead_drain_through_slots(self, mock_stats):
+        mock_stats.get.side_effect = lambda stage, default=None: default
+        estimate = self.make_estimator(jobs_ahead=5).estimate(MagicMock())
+
+        # 20 + 60 + 10 default stage seconds; 5 jobs ahead on 2 slots leave 2 waves before ours
+        self.assertEqual(estimate['expected_job_seconds'], 90)
+        self.assertEqual(estimate['estimated_queue_seconds'], 180)
+        self.assertEqual(estimate['estimated_completion_seconds'], 270)
+        self.assertEqual(estimate['queue_depth'], 3)
+
+    def test_free_slot_means_no_queue_wait(self, mock_stats):
+        mock_stats.get.side_effect = lambda stage, default=None: default
+        estimate = self.make_estimator(jobs_ahead=1).estimate(MagicMock())
+        self.assertEqual(estimate['estimated_queue_seconds'], 0)
+        self.assertEqual(estimate['estimated_completion_seconds'], 90)
+
+    def test_external_pipeline_uses_round_trip_average(self, mock_stats):
+        mock_stats.get.side_effect = lambda stage, default=None: 40 if stage == 'external' else default
+        estimate = self.make_estimator(jobs_ahead=0).estimate(MagicMock(), 'external')
+        self.assertEqual(estimate['expected_job_seconds'], 40)
+
+    def test_admit_sheds_over_max_wait(self, mock_stats):
+        mock_stats.get.side_effect = lambda stage, default=None: default
+        estimator = self.make_estimator(jobs_ahead=5)
+        estimator.max_wait = 200
+
+        with self.assertRaises(GenerationCapacityError) as raised:
+            estimator.admit(MagicMock())
+        # Retry after the larger of one job and the excess over the threshold
+        self.assertEqual(raised.exception.wait, 90)
+
+        estimator.max_wait = 300
+        self.assertEqual(estimator.admit(MagicMock())['estimated_completion_seconds'], 270)
+
+
+class ProtectedMediaTest(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        ritual_type = RitualType.objects.create(name='Sleep Manifestation', description='Test')
+        ritual = Rituals.objects.create(name='Test Ritual', voice='female', duration='2')
+        self.meditation = MeditationGenerate.objects.create(
+            user=self.owner, details=ritual, ritual_type=ritual_type,
+            file=ContentFile(b'0123456789', name='test.mp3')
+        )
+        self.url = f"/media/{self.meditation.file.name}"
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_owner_gets_byte_range(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+    def test_other_user_is_denied(self):
+        self.client.force_login(self.other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_signed_url_grants_access(self):
+        url = protected_media_url(self.meditation.file.name, self.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_versioned_url_is_immutable_and_revalidates(self):
+        url = protected_media_url(self.meditation.file.name, self.owner, version=media_version(self.meditation))
+        response = self.client.get(url)
+        self.assertIn('immutable', response['Cache-Control'])
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_stale_version_is_not_immutable(self):
+        url = protected_media_url(self.meditation.file.name, self.owner, version='1')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_shared_file_version_is_looked_up_by_owner(self):
+        # Fallback meditations share one file; each row's own version must match
+        shared = MeditationGenerate.objects.create(
+            user=self.owner, details=self.meditation.details, ritual_type=self.meditation.ritual_type
+        )
+        MeditationGenerate.objects.filter(pk=shared.pk).update(file=self.meditation.file.name)
+        shared.refresh_from_db()
+        url = protected_media_url(shared.file.name, self.owner, version=media_version(shared))
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_unsigned_legacy_token_is_rejected(self):
+        token = signing.dumps([self.owner.pk, self.meditation.file.name], salt=MEDIA_TOKEN_SALT)
+        response = self.client.get(f"{settings.MEDIA_URL}s/{token}/{self.meditation.file.name}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_signed_url_is_stable_within_token_window(self):
+        version = media_version(self.meditation)
+        max_age = settings.MEDIA_URL_TOKEN_MAX_AGE
+        window_start = time.time() // max_age * max_age
+        with patch('apps.accounts.media.time.time', return_value=window_start + 10):
+            first = protected_media_url(self.meditation.file.name, self.owner, version=version)
+        with patch('apps.accounts.media.time.time', return_value=window_start + 11):
+            second = protected_media_url(self.meditation.file.name, self.owner, version=version)
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.get(first).status_code, 200)
+
+    def test_negotiates_ready_rendition(self):
+        rendition = os.path.join(self.media_root, rendition_name(self.meditation.file.name, 'opus'))
+        os.makedirs(os.path.dirname(rendition), exist_ok=True)
+        with open(rendition, 'wb') as f:
+            f.write(b'opus')
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_ACCEPT='audio/ogg')
+        self.assertEqual(b''.join(response.streaming_content), b'opus')
+        self.assertIn('Accept', response['Vary'])
+
+    @patch('apps.accounts.views.schedule_waveform')
+    def test_waveform_is_computed_then_served(self, mock_schedule):
+        url = f"/api/auth/meditation/{self.meditation.id}/waveform/"
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        mock_schedule.assert_called_once()
+
+        peaks = os.path.join(self.media_root, waveform_name(self.meditation.file.name))
+        os.makedirs(os.path.dirname(peaks), exist_ok=True)
+        with open(peaks, 'wb') as f:
+            f.write(b'{"buckets":1,"peaks":[-3,4]}')
+        response = self.client.get(f"{url}?v={media_version(self.meditation)}")
+        self.assertEqual(b''.join(response.streaming_content), b'{"buckets":1,"peaks":[-3,4]}')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    @patch('apps.accounts.waveforms.schedule_background')
+    def test_pending_waveform_is_scheduled_once(self, mock_schedule):
+        cache.clear()
+        schedule_waveform(self.meditation.file)
+        schedule_waveform(self.meditation.file)
+        self.assertEqual(mock_schedule.call_count, 1)
+
+        job, field_file = mock_schedule.call_args.args
+        with patch('apps.accounts.waveforms.compute_waveform'):
+            job(field_file)
+        schedule_waveform(self.meditation.file)
+        self.assertEqual(mock_schedule.call_count, 2)
+
+    @patch('apps.accounts.waveforms.audio_pool')
+    def test_waveform_jobs_write_separate_temp_files(self, mock_pool):
+        def peaks(source_path, temp_path, buckets):
+            with open(temp_path, 'w') as f:
+                f.write('{}')
+        mock_pool.peaks.side_effect = peaks
+        compute_waveform(self.meditation.file)
+        os.remove(os.path.join(self.media_root, waveform_name(self.meditation.file.name)))
+        compute_waveform(self.meditation.file)
+
+        first, second = (call.args[1] for call in mock_pool.peaks.call_args_list)
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.endswith('.part'))
+        self.assertFalse(os.path.exists(second))
+
+    @patch('apps.accounts.renditions.audio_pool')
+    def test_failed_rendition_encode_leaves_no_temp_file(self, mock_pool):
+        def encode(source_path, temp_path, **kwargs):
+            with open(temp_path, 'wb') as f:
+                f.write(b'half')
+            raise RuntimeError('ffmpeg failed')
+        mock_pool.encode.side_effect = encode
+        with self.assertRaises(RuntimeError):
+            encode_renditions(self.meditation.file)
+
+        target_path = os.path.join(self.media_root, rendition_name(self.meditation.file.name, 'opus'))
+        self.assertEqual(os.listdir(os.path.dirname(target_path)), [])
+        self.assertNotEqual(mock_pool.encode.call_args.args[1], f"{target_path}.part")
+
+    @patch('apps.accounts.signals.schedule_waveform')
+    @patch('apps.accounts.signals.schedule_renditions')
+    def test_derived_audio_is_scheduled_only_for_new_files(self, mock_renditions, mock_waveform):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meditation.script = 'Hello'
+            self.meditation.save(update_fields=['script'])
+            self.meditation.save()
+        mock_renditions.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meditation.file.save('new.mp3', ContentFile(b'new'), save=False)
+            self.meditation.save(update_fields=['file'])
+        mock_renditions.assert_called_once()
+        mock_waveform.assert_called_once()
+
+
+@override_settings(AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False)
+class MeditationVariationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        generation_limiter.reset()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='testpass123')
+        ritual_type = RitualType.objects.create(name='Sleep Manifestation', description='Test')
+        ritual = Rituals.objects.create(name='Test Ritual', voice='female', duration='2')
+        self.meditation = MeditationGenerate.objects.create(
+            user=self.owner, details=ritual, ritual_type=ritual_type, script='Hello, I am Veela.',
+            file=ContentFile(b'mixed', name='test.mp3'), speech_file=ContentFile(b'speech', name='speech.mp3')
+        )
+        self.client.force_authenticate(self.owner)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def url(self, action):
+        return f"/api/auth/meditation/{self.meditation.id}/{action}/"
+
+    @patch('apps.accounts.variations.audio_pool')
+    def test_remix_reuses_the_stored_speech(self, mock_pool):
+        mock_pool.mix.return_value = b'remixed'
+        with patch('apps.accounts.variations.synthesize_script') as mock_synthesize:
+            response = self.client.post(self.url('remix'), {'music_gain': -12}, format='json')
+        self.assertEqual(response.status_code, 201)
+        mock_synthesize.assert_not_called()
+        self.assertEqual(mock_pool.mix.call_args.args[0], b'speech')
+        self.assertEqual(mock_pool.mix.call_args.kwargs['music_gain'], -12)
+
+        variation = MeditationGenerate.objects.get(id=response.data['id'])
+        self.assertEqual(variation.speech_file.name, self.meditation.speech_file.name)
+        self.assertEqual(variation.script, self.meditation.script)
+        self.assertEqual(variation.file.read(), b'remixed')
+
+    @patch('apps.accounts.variations.audio_pool')
+    @patch('apps.accounts.variations.synthesize_script', return_value=b'male speech')
+    def test_revoice_synthesizes_the_stored_script(self, mock_synthesize, mock_pool):
+        mock_pool.mix.return_value = b'revoiced'
+        response = self.client.post(self.url('revoice'), {'voice': 'male'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        mock_synthesize.assert_called_once_with('Hello, I am Veela.', 'male')
+
+        variation = MeditationGenerate.objects.get(id=response.data['id'])
+        self.assertEqual(variation.details.voice, 'male')
+        self.assertEqual(variation.speech_file.read(), b'male speech')
+        self.assertEqual(self.meditation.details.voice, 'female')
+
+    @patch('apps.accounts.variations.audio_pool')
+    def test_other_users_meditation_is_not_found(self, mock_pool):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.post(self.url('remix'), {'music_gain': -12}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(self.url('revoice'), {'voice': 'male'}, format='json').status_code, 404)
+        mock_pool.mix.assert_not_called()
+
+    def test_unknown_music_bed_is_rejected(self):
+        response = self.client.post(self.url('remix'), {'music_bed': 'thunder'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('music_bed', response.data)
+
+    def test_missing_artifacts_conflict(self):
+        MeditationGenerate.objects.filter(id=self.meditation.id).update(script=None, speech_file=None)
+        self.assertEqual(self.client.post(self.url('remix'), {'music_gain': -12}, format='json').status_code, 409)
+        # Users without a plan get a single generation per burst
+        cache.clear()
+        self.assertEqual(self.client.post(self.url('revoice'), {'voice': 'male'}, format='json').status_code, 409)
+
+    @patch('apps.accounts.variations.audio_pool')
+    def test_remix_goes_through_admission_control(self, mock_pool):
+        with patch('apps.accounts.views.generation_limiter.acquire', side_effect=GenerationRateLimitError(wait=12)):
+            response = self.client.post(self.url('remix'), {'music_gain': -12}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '12')
+
+        with patch('apps.accounts.views.generation_scheduler.slot', side_effect=GenerationCapacityError(wait=40)):
+            response = self.client.post(self.url('remix'), {'music_gain': -12}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '40')
+        mock_pool.mix.assert_not_called()
+
+
+class DeferredThread:
+    """
+    Stands in for the background generation thread: start() records it, run() or join() executes it here.
+    """
+    started = []
+
+    def __init__(self, target, args=(), **kwargs):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        DeferredThread.started.append(self)
+
+    def run(self):
+        self.target(*self.args)
+
+    def join(self, timeout=None):
+        self.run()
+
+
+@override_settings(AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False)
+@patch('apps.accounts.preview.threading.Thread', DeferredThread)
+class PreviewGenerationTest(APITestCase):
+    url = '/api/auth/meditation/combined/'
+
+    def setUp(self):
+        cache.clear()
+        generation_limiter.reset()
+        DeferredThread.started = []
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(email='preview@example.com', username='preview', password='testpass123')
+        UserPlan.objects.create(user=self.user, plan=Plans.objects.create(name='Trial', is_free_trial=True))
+        CustomUserDetail.objects.create(user=self.user, goals='Run', dream='Lake house', happiness='Reading')
+        self.plan_type = RitualType.objects.create(name='Sleep Manifestation', description='Test')
+        self.request_data = {
+            'plan_type': self.plan_type.id, 'name': 'Evening', 'ritual_type': 'story',
+            'tone': 'dreamy', 'voice': 'female', 'duration': '2', 'preview': True,
+        }
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def post_preview(self, name='Evening'):
+        with patch('apps.accounts.serializers.CombinedProfileSerializer.generate_preview',
+                   side_effect=lambda *args: ContentFile(b'preview', name='preview.mp3')):
+            return self.client.post(self.url, {**self.request_data, 'name': name}, format='json')
+
+    def run_full_generation(self, result):
+        with patch('apps.accounts.serializers.CombinedProfileSerializer.generate_meditation', **result):
+            DeferredThread.started.pop(0).run()
+
+    def test_full_meditation_replaces_preview(self):
+        response = self.post_preview()
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['is_preview'])
+        meditation = MeditationGenerate.objects.get(id=response.data['meditation_id'])
+        self.assertTrue(meditation.is_preview)
+        preview_path = meditation.file.path
+
+        self.run_full_generation({'return_value': ContentFile(b'full', name='full.mp3')})
+        meditation.refresh_from_db()
+        self.assertFalse(meditation.is_preview)
+        with meditation.file.open('rb') as f:
+            self.assertEqual(f.read(), b'full')
+        self.assertFalse(os.path.exists(preview_path))
+
+    def test_background_generation_holds_the_concurrency_slot(self):
+        self.assertEqual(self.post_preview().status_code, 201)
+        # The trial plan allows one generation at a time and the first one is still rendering
+        response = self.post_preview(name='Morning')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(generation_limiter.metrics()['rejected_concurrency'], 1)
+
+        self.run_full_generation({'side_effect': RuntimeError('TTS failed')})
+        self.assertEqual(self.post_preview(name='Morning').status_code, 201)
+
+    def test_finished_stream_is_no_longer_a_preview(self):
+        response = self.client.post(self.url, {**self.request_data, 'preview': False, 'stream': True}, format='json')
+        self.assertEqual(response.status_code, 201)
+        meditation = MeditationGenerate.objects.get(id=response.data['meditation_id'])
+        self.assertTrue(meditation.is_preview)
+
+        with patch('apps.accounts.serializers.CombinedProfileSerializer.generate_stream', return_value=None):
+            DeferredThread.started.pop(0).run()
+        meditation.refresh_from_db()
+        self.assertFalse(meditation.is_preview)
+        self.assertTrue(meditation.hls_playlist)
+
+    def test_stale_preview_and_stream_are_recovered(self):
+        response = self.post_preview()
+        self.run_full_generation({'side_effect': RuntimeError('worker restarted')})
+        preview = MeditationGenerate.objects.get(id=response.data['meditation_id'])
+        self.assertTrue(preview.is_preview)
+        stream = MeditationGenerate.objects.create(
+            user=self.user, details=preview.details, ritual_type=self.plan_type,
+            hls_playlist='meditations/hls/stale/index.m3u8', is_preview=True
+        )
+        os.makedirs(os.path.join(self.media_root, 'meditations/hls/stale'))
+        fresh = MeditationGenerate.objects.create(
+            user=self.user, details=preview.details, ritual_type=self.plan_type, is_preview=True
+        )
+        stale = timezone.now() - timezone.timedelta(seconds=settings.GENERATION_STALE_PREVIEW_AFTER + 60)
+        MeditationGenerate.objects.filter(id__in=[preview.id, stream.id]).update(updated_at=stale)
+
+        with patch('apps.accounts.serializers.CombinedProfileSerializer.generate_meditation',
+                   side_effect=lambda *args, **kwargs: ContentFile(b'full', name='full.mp3')):
+            call_command('upgrade_fallback_meditations', stdout=StringIO())
+
+        preview.refresh_from_db()
+        stream.refresh_from_db()
+        self.assertFalse(preview.is_preview)
+        self.assertFalse(stream.is_preview)
+        self.assertEqual(stream.hls_playlist, '')
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'meditations/hls/stale')))
+        self.assertTrue(MeditationGenerate.objects.get(id=fresh.id).is_preview)
+
+
+@override_settings(AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False)
+class PreGeneratedMeditationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        generation_limiter.reset()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(email='pregen@example.com', username='pregen', password='testpass123')
+        UserPlan.objects.create(user=self.user, plan=Plans.objects.create(name='Trial', is_free_trial=True))
+        self.detail = CustomUserDetail.objects.create(user=self.user, goals='Run', dream='Lake house', happiness='Reading')
+        self.plan_type = RitualType.objects.create(name='Sleep Manifestation', description='Test')
+        self.request_data = {
+            'plan_type': self.plan_type.id, 'name': 'Evening', 'ritual_type': 'story',
+            'tone': 'dreamy', 'voice': 'female', 'duration': '2',
+        }
+        settings_fields = {key: value for key, value in self.request_data.items() if key != 'plan_type'}
+        self.pregenerated = MeditationGenerate.objects.create(
+            user=self.user, details=Rituals.objects.create(**settings_fields), ritual_type=self.plan_type,
+            file=ContentFile(b'pregenerated', name='pregen.mp3'), is_pregenerated=True,
+            profile_fingerprint=profile_fingerprint(self.plan_type, Rituals(**settings_fields), self.detail),
+            pregenerated_at=timezone.now()
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_unclaimed_meditation_is_hidden(self):
+        self.assertEqual(self.client.get('/api/auth/my-meditations/').data, [])
+        self.assertEqual(self.client.get('/api/auth/count-meditations/').data, {'count': 0, 'archive_count': 0})
+        meditation_id = self.pregenerated.id
+        self.assertEqual(self.client.get(f'/api/auth/meditation/{meditation_id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/auth/meditation/{meditation_id}/waveform/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/auth/like-meditation/{meditation_id}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/auth/delete-meditation/{meditation_id}/').status_code, 404)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(f'/media/{self.pregenerated.file.name}').status_code, 404)
+
+    @patch('apps.accounts.serializers.CombinedProfileSerializer.generate_meditation')
+    def test_profile_completion_claims_the_meditation(self, mock_generate):
+        response = self.client.post('/api/auth/meditation/combined/', self.request_data, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['meditation_id'], self.pregenerated.id)
+        mock_generate.assert_not_called()
+        claimed = MeditationGenerate.objects.get(id=self.pregenerated.id)
+        self.assertFalse(claimed.is_pregenerated)
+        self.assertEqual(list(MeditationGenerate.objects.active().filter(user=self.user)), [claimed])
+        self.assertEqual(self.client.get('/api/auth/count-meditations/').data['count'], 1)
+        self.assertEqual(self.client.get(f'/api/auth/meditation/{claimed.id}/').status_code, 200)
+
+    @patch('apps.accounts.serializers.CombinedProfileSerializer.generate_meditation')
+    def test_changed_profile_does_not_claim(self, mock_generate):
+        mock_generate.return_value = ContentFile(b'fresh', name='fresh.mp3')
+        response = self.client.post(
+            '/api/auth/meditation/combined/', {**self.request_data, 'goals': 'Learn piano'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.data['meditation_id'], self.pregenerated.id)
+        mock_generate.assert_called_once()
+        self.assertTrue(MeditationGenerate.objects.get(id=self.pregenerated.id).is_pregenerated)
+
+
+class FakeAudio:
+    """
+    Millisecond-length stand-in for a pydub AudioSegment; export writes a placeholder file.
+    """
+
+    def __init__(self, milliseconds):
+        self.milliseconds = milliseconds
+
+    def __len__(self):
+        return self.milliseconds
+
+    def __add__(self, other):
+        return FakeAudio(self.milliseconds + len(other))
+
+    def __getitem__(self, key):
+        return FakeAudio(len(range(self.milliseconds)[key]))
+
+    def export(self, path, **kwargs):
+        with open(path, 'wb') as f:
+            f.write(b'ts')
+
+
+class HLSStreamingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def read_playlist(self, writer):
+        with open(writer.playlist_path) as f:
+            return f.read()
+
+    def test_split_script_keeps_whole_sentences(self):
+        chunks = split_script("One two. Three four! Five six? Seven.", max_chars=20)
+        self.assertEqual(chunks, ["One two. Three four!", "Five six? Seven."])
+
+    def test_segments_are_listed_as_they_are_written(self):
+        writer = HLSWriter(self.directory, segment_seconds=6)
+        self.assertNotIn("#EXTINF", self.read_playlist(writer))
+
+        writer.write(FakeAudio(5000))
+        writer.write(FakeAudio(8000))
+        playlist = self.read_playlist(writer)
+        self.assertEqual(playlist.count("#EXTINF:6.000,"), 2)
+        self.assertNotIn("#EXT-X-ENDLIST", playlist)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "segment_00001.ts")))
+
+        writer.close()
+        playlist = self.read_playlist(writer)
+        self.assertIn("#EXTINF:1.000,\nsegment_00002.ts", playlist)
+        self.assertTrue(playlist.endswith("#EXT-X-ENDLIST\n"))
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(".part")])
+
+    def test_progressive_mix_runs_in_the_audio_pool(self):
+        from pydub import AudioSegment
+
+        bed = os.path.join(self.directory, 'bed.wav')
+        AudioSegment.silent(duration=40000, frame_rate=22050).export(bed, format='wav')
+        speech = io.BytesIO()
+        AudioSegment.silent(duration=2000, frame_rate=22050).export(speech, format='wav')
+
+        def _encode_file(in_path, out_path, options):
+            with open(out_path, 'wb') as f:
+                f.write(options['format'].encode())
+        pool = AudioProcessPool(enabled=False, temp_dir=self.directory)
+        pool.run_file_job = MagicMock(wraps=pool.run_file_job)
+        segment_dir = os.path.join(self.directory, 'hls')
+        with patch('apps.accounts.generate.dsp_pool._encode_file', _encode_file):
+            mix = ProgressiveMix(HLSWriter(segment_dir, segment_seconds=6, pool=pool), music_path=bed, pool=pool)
+            mix.add_speech(speech.getvalue())
+            mix.add_silence(700)
+            mixed = mix.finish()
+
+        self.assertEqual(mixed, b'mp3')
+        jobs = [call.args[0].__name__ for call in pool.run_file_job.call_args_list]
+        # Intro, speech, gap and tail are mixed in the pool, as are the five segments and the MP3
+        self.assertEqual(jobs.count('_mix_section_file'), 4)
+        self.assertEqual(jobs.count('_encode_file'), 6)
+        with open(os.path.join(segment_dir, 'segment_00004.ts'), 'rb') as f:
+            self.assertEqual(f.read(), b'mpegts')
+
+
+class SentenceCacheTest(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.cache = SegmentCache(directory=self.cache_dir)
+
+    @patch('apps.accounts.generate.synthesis._silence', return_value=b'|')
+    @patch('apps.accounts.generate.synthesis._stream', side_effect=lambda text, voice_id: text.encode('utf-8'))
+    def test_only_uncached_sentences_are_synthesized(self, mock_stream, mock_silence):
+        first = synthesize_sentences("Hello, I'm Veela. Welcome, Anna.", cache=self.cache)
+        self.assertEqual(first, b"Hello, I'm Veela.|Welcome, Anna.")
+        self.assertEqual(mock_stream.call_count, 2)
+
+        mock_stream.reset_mock()
+        second = synthesize_sentences("Hello,  I’m Veela. Welcome, Ben.", cache=self.cache)
+        self.assertEqual(second, b"Hello, I'm Veela.|Welcome, Ben.")
+        self.assertEqual(mock_stream.call_count, 1)
+        self.assertEqual(mock_stream.call_args[0][0], "Welcome, Ben.")
+
+    def test_disk_tier_survives_memory_eviction(self):
+        cache = SegmentCache(directory=self.cache_dir, memory_bytes=4)
+        cache.put('a' * 64, b'abcd')
+        cache.put('b' * 64, b'efgh')
+        self.assertEqual(cache.stats()['memory_segments'], 1)
+        self.assertEqual(cache.get('a' * 64), b'abcd')
+
+
+class BatchedScriptGenerationTest(TestCase):
+    @patch('apps.accounts.generate.generation.build_chain')
+    def test_partial_failure_keeps_input_order(self, mock_build_chain):
+        error = RuntimeError("rate limited")
+        mock_build_chain.return_value.batch.return_value = [MagicMock(content="first"), error, MagicMock(content="third")]
+        profiles = [
+            {'name': name, 'goals': '', 'dreamlife': '', 'dream_activities': '', 'word_count': '250'}
+            for name in ('Anna', 'Ben', 'Cara')
+        ]
+
+        scripts = generate_scripts(profiles, max_concurrency=2)
+
+        self.assertEqual(scripts, ["first", error, "third"])
+        inputs = mock_build_chain.return_value.batch.call_args[0][0]
+        self.assertEqual([item['name'] for item in inputs], ['Anna', 'Ben', 'Cara'])
+        self.assertEqual(mock_build_chain.return_value.batch.call_args[1]['config'], {'max_concurrency': 2})
+
+    @patch('apps.accounts.generate.generation.build_digest_chain')
+    def test_profile_digests_are_batched(self, mock_build_chain):
+        error = RuntimeError("rate limited")
+        mock_build_chain.return_value.batch.return_value = [
+            MagicMock(content='```json\n{"goals": "run", "dreamlife": "lake"}\n```'), error, MagicMock(content='not json')
+        ]
+        profiles = [{'goals': name, 'dreamlife': '', 'dream_activities': ''} for name in ('Anna', 'Ben', 'Cara')]
+
+        digests = summarize_profiles(profiles, max_concurrency=2)
+
+        self.assertEqual(digests[0], {'goals': 'run', 'dreamlife': 'lake', 'dream_activities': ''})
+        self.assertIs(digests[1], error)
+        self.assertIsInstance(digests[2], ValueError)
+        self.assertEqual(mock_build_chain.return_value.batch.call_args[0][0], profiles)
+
+
+class HedgedLLMRouterTest(TestCase):
+    def setUp(self):
+        self.primary = LLMBackend('primary-model', 'KEY')
+        self.secondary = LLMBackend('secondary-model', 'KEY')
+        self.router = HedgedLLMRouter([self.primary, self.secondary], hedge_delay=0.05)
+
+    def test_fails_over_on_error(self):
+        def call(backend, inputs):
+            if backend is self.primary:
+                raise RuntimeError("503")
+            return "script"
+
+        self.assertEqual(self.router.invoke(call, {}), ("script", self.secondary.name))
+        self.assertEqual(self.router.stats()['backends'][self.primary.name]['failures'], 1)
+
+    def test_hedges_slow_request(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def call(backend, inputs):
+            if backend is self.primary:
+                release.wait(5)
+                return "late"
+            return "hedged"
+
+        self.assertEqual(self.router.invoke(call, {}), ("hedged", self.secondary.name))
+        self.assertEqual(self.router.stats()['hedges'], 1)
+
+
+class PromptLayoutTest(TestCase):
+    def test_static_prefix_is_identical_across_users(self):
+        profiles = [
+            {'name': 'Anna', 'goals': 'Run a marathon', 'dreamlife': 'Cabin by a lake', 'dream_activities': 'Reading', 'word_count': '250'},
+            {'name': 'Ben', 'goals': 'Learn piano', 'dreamlife': 'City loft', 'dream_activities': 'Cooking', 'word_count': '1,700'},
+        ]
+        prompts = [PROMPT.format_messages(**{**profile, **length_inputs(profile['word_count'])}) for profile in profiles]
+
+        self.assertEqual(prompts[0][0].content, STATIC_PREFIX)
+        self.assertEqual(prompts[0][0].content, prompts[1][0].content)
+        self.assertIn('Anna', prompts[0][1].content)
+        self.assertIn('1,700', prompts[1][1].content)
+
+    def test_length_target_follows_the_requested_length(self):
+        self.assertEqual(
+            length_inputs(get_word_count(10)),
+            {'word_count': '1,200', 'max_word_count': '1,380', 'duration': 'about 10 minutes'}
+        )
+        self.assertEqual(length_inputs(get_word_count(2))['duration'], 'about 2 minutes')
+        self.assertEqual(length_inputs(PREVIEW_WORD_COUNT)['duration'], 'about 30 seconds')
+
+    @patch('apps.accounts.generate.generation.llm_router')
+    def test_script_prompt_states_the_length_target(self, mock_router):
+        mock_router.invoke.return_value = (MagicMock(content='script'), 'primary')
+        generate_script('Anna', 'Run', 'Lake', 'Reading', get_word_count(5))
+
+        inputs = mock_router.invoke.call_args[0][1]
+        human = PROMPT.format_messages(**inputs)[1].content
+        self.assertIn('about 5 minutes read aloud, 600 to 690 words', human)
+
+@patch('apps.accounts.generate.functions.validated', side_effect=lambda audio: audio)
+@patch('apps.accounts.generate.functions.audio_pool')
+@patch('apps.accounts.generate.functions.synthesize_script', return_value=b'speech')
+@patch('apps.accounts.generate.functions.generate_script', return_value='script')
+class GenerationCheckpointTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.checkpoint = GenerationCheckpoint('job/1', self.directory)
+
+    def generate(self):
+        return generate_meditation_audio('Anna', 'Run', 'Lake', 'Reading', 'female', 2, self.checkpoint)
+
+    def test_completed_stages_are_saved(self, mock_script, mock_synthesize, mock_pool, mock_validated):
+        mock_pool.mix.return_value = b'mix'
+        self.assertEqual(self.generate(), b'mix')
+        self.assertEqual(self.checkpoint.job_id, 'job_1')
+        self.assertEqual(self.checkpoint.load('script'), b'script')
+        self.assertEqual(self.checkpoint.load('speech'), b'speech')
+        self.assertEqual(self.checkpoint.load('mix'), b'mix')
+
+    def test_retry_resumes_after_the_last_completed_stage(self, mock_script, mock_synthesize, mock_pool, mock_validated):
+        mock_pool.mix.return_value = b'mix'
+        self.checkpoint.save('script', b'stored script')
+        self.assertEqual(self.generate(), b'mix')
+        mock_script.assert_not_called()
+        mock_synthesize.assert_called_once_with('stored script', 'female')
+
+        mock_synthesize.reset_mock()
+        self.assertEqual(self.generate(), b'mix')
+        mock_synthesize.assert_not_called()
+        self.assertEqual(mock_pool.mix.call_count, 1)
+
+    def test_failed_stage_keeps_earlier_stages(self, mock_script, mock_synthesize, mock_pool, mock_validated):
+        mock_pool.mix.side_effect = RuntimeError('ffmpeg failed')
+        with self.assertRaises(RuntimeError):
+            self.generate()
+        self.assertTrue(self.checkpoint.has('speech'))
+        self.assertFalse(self.checkpoint.has('mix'))
+
+    def test_stale_jobs_are_pruned(self, mock_script, mock_synthesize, mock_pool, mock_validated):
+        self.checkpoint.save('script', b'script')
+        fresh = GenerationCheckpoint('job-2', self.directory)
+        fresh.save('script', b'script')
+        old = time.time() - 7200
+        os.utime(self.checkpoint.path, (old, old))
+
+        self.assertEqual(prune_checkpoints(self.directory, max_age=3600), 1)
+        self.assertFalse(os.path.exists(self.checkpoint.path))
+        self.assertTrue(fresh.has('script'))
+
+    @skipUnless(importlib.util.find_spec('fastapi'), 'fastapi is not installed')
+    def test_generator_clears_the_checkpoint_after_success(self, mock_script, mock_synthesize, mock_pool, mock_validated):
+        from apps.accounts.generate import main
+
+        mock_pool.mix.return_value = b'mix'
+        request = main.Request(
+            name='Anna', goals='Run', dreamlife='Lake', dream_activities='Reading',
+            ritual_type='Story', tone='Dreamy', voice='female', length=2, job_id='job-3'
+        )
+        with patch('apps.accounts.generate.checkpoints.DEFAULT_CHECKPOINT_DIR', self.directory):
+            self.assertEqual(main.run_generation(request, 'sleep'), b'mix')
+            self.assertFalse(os.path.exists(GenerationCheckpoint('job-3', self.directory).path))
+
+            main.run_generation(request, 'sleep')
+        self.assertEqual(mock_script.call_count, 2)
+
+
+@override_settings(PROFILE_DIGEST_MIN_CHARS=10)
+class ProfileDigestTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='digest@example.com', username='digest', password='testpass123')
+        self.detail = CustomUserDetail.objects.create(
+            user=self.user, goals='A long description of goals', dream='A house by the sea', happiness='Walking the dog'
+        )
+        self.digest = {'goals': 'goals', 'dreamlife': 'sea house', 'dream_activities': 'dog walks'}
+
+    @patch('apps.accounts.personalization.summarize_profile')
+    def test_digest_is_cached_until_profile_changes(self, mock_summarize):
+        mock_summarize.return_value = self.digest
+
+        self.assertEqual(get_profile_fields(self.detail), self.digest)
+        self.assertEqual(get_profile_fields(CustomUserDetail.objects.get(pk=self.detail.pk)), self.digest)
+        self.assertEqual(mock_summarize.call_count, 1)
+
+        detail = CustomUserDetail.objects.get(pk=self.detail.pk)
+        detail.goals = 'New goals'
+        detail.save()
+        get_profile_fields(detail)
+        self.assertEqual(mock_summarize.call_count, 2)
+
+    @patch('apps.accounts.personalization.summarize_profile', side_effect=ValueError('not JSON'))
+    def test_falls_back_to_raw_fields(self, mock_summarize):
+        fields = get_profile_fields(self.detail)
+        self.assertEqual(fields['dreamlife'], 'A house by the sea')
+
+    @patch('apps.accounts.personalization.summarize_profile')
+    @patch('apps.accounts.personalization.summarize_profiles')
+    def test_stale_digests_are_built_in_one_batch(self, mock_batch, mock_summarize):
+        other = User.objects.create_user(email='digest2@example.com', username='digest2', password='testpass123')
+        other_detail = CustomUserDetail.objects.create(
+            user=other, goals='Another long set of goals', dream='A flat in the city', happiness='Cooking'
+        )
+        mock_batch.return_value = [self.digest, ValueError('not JSON')]
+
+        self.assertEqual(build_profile_digests([self.detail, other_detail]), 1)
+        self.assertEqual(len(mock_batch.call_args[0][0]), 2)
+        self.assertEqual(get_profile_fields(CustomUserDetail.objects.get(pk=self.detail.pk), build_digest=False), self.digest)
+        self.assertEqual(get_profile_fields(other_detail, build_digest=False)['dreamlife'], 'A flat in the city')
+        mock_summarize.assert_not_called()
+
+        mock_batch.return_value = [self.digest]
+        build_profile_digests([self.detail, other_detail])
+        self.assertEqual(mock_batch.call_args[0][0], [raw_profile_fields(other_detail)])
+
+    @patch('apps.accounts.personalization.summarize_profile')
+    @patch('apps.accounts.personalization.summarize_profiles')
+    def test_pregeneration_jobs_do_not_summarize_one_by_one(self, mock_batch, mock_summarize):
+        mock_batch.return_value = [self.digest]
+        UserLoginTracker.objects.create(user=self.user)
+        UserPlan.objects.create(user=self.user, plan=Plans.objects.create(name='Trial', is_free_trial=True))
+        plan_type = RitualType.objects.create(name='Sleep Manifestation', description='Test')
+        ritual = Rituals.objects.create(name='Evening', tone='dreamy', voice='female', duration='2')
+        MeditationGenerate.objects.create(user=self.user, details=ritual, ritual_type=plan_type)
+
+        jobs, skipped = PreGenerationService().build_jobs()
+
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0]['params']['dreamlife'], 'sea house')
+        mock_batch.assert_called_once()
+        mock_summarize.assert_not_called()
+
+        mock_batch.reset_mock()
+        PreGenerationService().build_jobs(build_digests=False)
+        mock_batch.assert_not_called()
+
+
+class MP3ScanTest(TestCase):
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 417 byte frames of 1152 samples
+    FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+    def test_scan_skips_tags_and_counts_frames(self):
+        id3 = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10
+        info = scan_mp3(id3 + self.FRAME * 100 + b'TAG' + b'\x00' * 125)
+
+        self.assertEqual(info.frame_count, 100)
+        self.assertAlmostEqual(info.duration_seconds, 100 * 1152 / 44100)
+        self.assertEqual(info.bitrate_kbps, 128)
+
+    def test_validate_rejects_non_audio(self):
+        with self.assertRaises(InvalidAudioError):
+            validate_mp3(b'{"error": "upstream failed"}' * 50)
+        with self.assertRaises(InvalidAudioError):
+            validate_mp3(self.FRAME * 5)
+
+    def test_metadata_stored_on_save(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, AUDIO_RENDITIONS_ENABLED=False):
+            user = User.objects.create_user(email='scan@example.com', username='scan', password='testpass123')
+            ritual_type = RitualType.objects.create(name='Sleep Manifestation', description='')
+            ritual = Rituals.objects.create(name='Night', ritual_type='Story', tone='Dreamy', voice='female', duration='2')
+            meditation = MeditationGenerate.objects.create(
+                user=user, details=ritual, ritual_type=ritual_type,
+                file=ContentFile(self.FRAME * 100, name='scan.mp3')
+            )
+
+        meditation.refresh_from_db()
+        self.assertEqual(meditation.frame_count, 100)
+        self.assertEqual(meditation.bitrate_kbps, 128)
+        self.assertEqual(meditation.file_size, 41700)
+
+
+class FallbackCatalogTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.source = os.path.join(self.media_root, 'calm.mp3')
+        with open(self.source, 'wb') as f:
+            f.write(MP3ScanTest.FRAME * 100)
+
+    def test_fallback_reason_follows_wrapped_errors(self):
+        quota = Exception('quota')
+        quota.body = {'detail': {'status': 'quota_exceeded', 'message': 'Out of credits'}}
+        try:
+            try:
+                raise quota
+            except Exception as e:
+                raise Exception(f"ElevenLabs API Error: {e.body['detail']['message']}")
+        except Exception as wrapped:
+            self.assertEqual(fallback_reason(wrapped), MeditationGenerate.FallbackReason.QUOTA)
+        self.assertEqual(fallback_reason(ValueError('bad script')), MeditationGenerate.FallbackReason.ERROR)
+
+    def provider_error(self, status_code, detail_status):
+        error = Exception(detail_status)
+        error.status_code = status_code
+        error.body = {'detail': {'status': detail_status, 'message': detail_status}}
+        return error
+
+    def test_concurrency_throttle_does_not_trip_quota_cooldown(self):
+        cache.clear()
+        catalog = FallbackCatalog([
+            {'plan_type': 'Calming Reset', 'voice': 'male', 'duration': 5, 'source': self.source},
+        ])
+        throttle = self.provider_error(429, 'too_many_concurrent_requests')
+        with override_settings(MEDIA_ROOT=self.media_root, AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False):
+            user = User.objects.create_user(email='throttle@example.com', username='throttle', password='testpass123')
+            ritual_type = RitualType.objects.create(name='Calming Reset', description='')
+            ritual = Rituals.objects.create(name='Reset', ritual_type='Guided', tone='Dreamy', voice='male', duration='5')
+            meditation = catalog.create_meditation(user, ritual_type, ritual, fallback_reason(throttle))
+
+            self.assertEqual(meditation.fallback_reason, MeditationGenerate.FallbackReason.OVERLOAD)
+            self.assertFalse(catalog.quota_exhausted())
+
+            catalog.create_meditation(user, ritual_type, ritual, fallback_reason(self.provider_error(401, 'quota_exceeded')))
+            self.assertTrue(catalog.quota_exhausted())
+        cache.clear()
+
+    @patch('apps.accounts.generate.synthesis.time.sleep')
+    @patch('apps.accounts.generate.synthesis._request_speech')
+    def test_tts_throttle_is_retried(self, mock_request, mock_sleep):
+        mock_request.side_effect = [self.provider_error(429, 'system_busy'), b'speech']
+        self.assertEqual(synthesize_audio('Breathe in.'), b'speech')
+        self.assertEqual(mock_request.call_count, 2)
+        mock_sleep.assert_called_once()
+
+        mock_request.side_effect = [self.provider_error(401, 'quota_exceeded')]
+        with self.assertRaises(Exception):
+            synthesize_audio('Breathe out.')
+
+    def test_records_share_the_stored_file(self):
+        catalog = FallbackCatalog([
+            {'plan_type': 'Calming Reset', 'voice': 'male', 'duration': 5, 'source': self.source},
+        ])
+        with override_settings(MEDIA_ROOT=self.media_root, AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False):
+            user = User.objects.create_user(email='fallback@example.com', username='fallback', password='testpass123')
+            ritual_type = RitualType.objects.create(name='Calming Reset', description='')
+            first, second = [
+                catalog.create_meditation(
+                    user, ritual_type,
+                    Rituals.objects.create(name='Reset', ritual_type='Guided', tone='Dreamy', voice='female', duration='2'),
+                    MeditationGenerate.FallbackReason.OVERLOAD
+                )
+                for _ in range(2)
+            ]
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(catalog.is_shared(first.file.name))
+        self.assertTrue(first.is_fallback)
+        self.assertEqual(first.frame_count, 100)
+
+    def test_select_serves_only_the_requested_plan_type(self):
+        catalog = FallbackCatalog([
+            {'plan_type': 'Morning Spark', 'voice': 'male', 'duration': 10, 'source': self.source},
+            {'plan_type': 'Morning Spark', 'voice': 'female', 'duration': 5, 'source': self.source},
+        ])
+        with override_settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(catalog.select('Morning Spark', 'male', 5).voice, 'male')
+            self.assertIsNone(catalog.select('Sleep Manifestation', 'male', 10))
+            self.assertTrue(catalog.available('Morning Spark'))
+            self.assertFalse(catalog.available('Sleep Manifestation'))
+
+
+@override_settings(AUDIO_RENDITIONS_ENABLED=False, WAVEFORMS_ENABLED=False)
+class OverloadFallbackTest(APITestCase):
+    url = '/api/auth/meditation/combined/'
+
+    def setUp(self):
+        cache.clear()
+        generation_limiter.reset()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        source = os.path.join(self.media_root, 'sleep.mp3')
+        with open(source, 'wb') as f:
+            f.write(MP3ScanTest.FRAME * 100)
+        catalog = FallbackCatalog([{'plan_type': 'Sleep Manifestation', 'voice': 'female', 'duration': 2, 'source': source}])
+        for module in ('views', 'serializers'):
+            catalog_patch = patch(f'apps.accounts.{module}.fallback_catalog', catalog)
+            catalog_patch.start()
+            self.addCleanup(catalog_patch.stop)
+        shed_patch = patch(
+            'apps.accounts.views.generation_estimator.admit', side_effect=GenerationCapacityError(wait=45)
+        )
+        shed_patch.start()
+        self.addCleanup(shed_patch.stop)
+
+        self.user = User.objects.create_user(email='shed@example.com', username='shed', password='testpass123')
+        UserPlan.objects.create(user=self.user, plan=Plans.objects.create(name='Trial', is_free_trial=True))
+        CustomUserDetail.objects.create(user=self.user, goals='Run', dream='Lake house', happiness='Reading')
+        self.client.force_authenticate(self.user)
+
+    def post(self, plan_type_name, name='Evening'):
+        plan_type, _ = RitualType.objects.get_or_create(name=plan_type_name, defaults={'description': 'Test'})
+        return self.client.post(self.url, {
+            'plan_type': plan_type.id, 'name': name, 'ritual_type': 'story',
+            'tone': 'dreamy', 'voice': 'male', 'duration': '10',
+        }, format='json')
+
+    def test_shed_requests_spend_rate_limit_tokens(self):
+        # The trial plan has a burst of three generations
+        for name in ('One', 'Two', 'Three'):
+            response = self.post('Sleep Manifestation', name)
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(response.data['is_fallback'])
+        self.assertEqual(self.post('Sleep Manifestation', 'Four').status_code, 429)
+        self.assertEqual(MeditationGenerate.objects.filter(user=self.user, is_fallback=True).count(), 3)
+
+    def test_plan_type_without_fallback_is_shed(self):
+        response = self.post('Morning Spark')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '45')
+        self.assertFalse(MeditationGenerate.objects.filter(user=self.user).exists())
+
+
+class AudioProcessPoolTest(TestCase):
+    def test_runs_inline_when_offloading_is_off(self):
+        pool = AudioProcessPool(enabled=False)
+
+        def upper(in_path, out_path, options):
+            with open(in_path, 'rb') as src, open(out_path, 'wb') as dst:
+                dst.write(src.read().upper())
+
+        self.assertEqual(pool.run_bytes_job(upper, b'speech', {}), b'SPEECH')
+        self.assertIsNone(pool._executor)
+
+    def test_full_queue_times_out(self):
+        pool = AudioProcessPool(workers=1, queue_size=0, queue_timeout=0.01, enabled=True)
+        pool._executor = MagicMock()
+        self.assertTrue(pool._slots.acquire(timeout=0))
+
+        with self.assertRaises(DSPQueueFullError):
+            pool.run_file_job(len, 'in', 'out', {})
+        pool._executor.submit.assert_not_called()
+
+    def test_broken_pool_is_replaced(self):
+        pool = AudioProcessPool(workers=1, queue_size=1, enabled=True)
+        broken = MagicMock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool('worker died')
+        pool._executor = broken
+
+        with self.assertRaises(BrokenProcessPool):
+            pool.run_file_job(len, 'in', 'out', {})
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        self.assertIsNone(pool._executor)
+        # The failed job gave its queue slot back
+        self.assertTrue(pool._slots.acquire(timeout=0))
+        self.assertTrue(pool._slots.acquire(timeout=0))
+
+
+class ProcessingFormatTest(TestCase):
+    class Segment:
+        def __init__(self, channels, frame_rate, sample_width, calls=()):
+            self.channels, self.frame_rate, self.sample_width, self.calls = channels, frame_rate, sample_width, calls
+
+        def set_channels(self, channels):
+            return type(self)(channels, self.frame_rate, self.sample_width, self.calls + ('channels',))
+
+        def set_frame_rate(self, frame_rate):
+            return type(self)(self.channels, frame_rate, self.sample_width, self.calls + ('frame_rate',))
+
+        def set_sample_width(self, sample_width):
+            return type(self)(self.channels, self.frame_rate, sample_width, self.calls + ('sample_width',))
+
+    def test_conversion_skips_matching_and_native_properties(self):
+        audio = self.Segment(2, 44100, 2)
+        converted = to_format(audio, AudioFormat(22050, 1, 2))
+
+        # Downmix before resampling; the sample width already matches
+        self.assertEqual(converted.calls, ('channels', 'frame_rate'))
+        self.assertEqual((converted.channels, converted.frame_rate), (1, 22050))
+        self.assertIs(to_format(audio, NATIVE_FORMAT), audio)
+
+    def test_encoder_converts_to_output_format(self):
+        self.assertEqual(encoder_parameters(AudioFormat(44100, 2, 0)), ['-ar', '44100', '-ac', '2'])
+        self.assertEqual(encoder_parameters(NATIVE_FORMAT), [])
+
+
+class MemoryProfilingTest(TestCase):
+    def test_stage_memory_is_attached_to_the_trace(self):
+        with patch.object(profiling, 'GENERATION_MEMORY_PROFILE', True):
+            with generation_trace('test') as trace:
+                with timed_stage('mix'):
+                    buffers = [bytes(1024 * 1024) for _ in range(4)]
+                    del buffers[1:]
+
+        memory = trace.stages[0]['memory']
+        self.assertGreaterEqual(memory['peak_traced_bytes'], 4 * 1024 * 1024)
+        self.assertLess(memory['retained_bytes'], 2 * 1024 * 1024)
+        self.assertTrue(memory['top_sites'])
+
+    def test_profiling_is_off_by_default(self):
+        with generation_trace('test') as trace:
+            with timed_stage('llm'):
+                pass
+
+        self.assertNotIn('memory', trace.stages[0])
+
+
+class TracingTest(TestCase):
+    def setUp(self):
+        self.exporter = MagicMock()
+        self.tracer = Tracer('test', exporter=self.exporter, enabled=True)
+
+    def exported(self):
+        return {call.args[0]['name']: call.args[0] for call in self.exporter.export.call_args_list}
+
+    def test_spans_continue_the_incoming_trace(self):
+        incoming = SpanContext.parse('00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01')
+        with self.tracer.span('POST /sleep', parent=incoming, kind='server') as server:
+            headers = self.tracer.inject({})
+            def synthesize(_):
+                with self.tracer.span('elevenlabs.tts'):
+                    pass
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                list(pool.map(self.tracer.wrap(synthesize), range(2)))
+            with self.tracer.span('stage.tts'):
+                pass
+
+        spans = self.exported()
+        self.assertEqual(headers['traceparent'], server.context.traceparent)
+        self.assertEqual(spans['POST /sleep']['parent_span_id'], '00f067aa0ba902b7')
+        self.assertEqual(spans['stage.tts']['parent_span_id'], server.context.span_id)
+        self.assertEqual(spans['elevenlabs.tts']['parent_span_id'], server.context.span_id)
+        self.assertEqual(spans['stage.tts']['trace_id'], '4bf92f3577b34da6a3ce929d0e0e4736')
+
+    def test_nested_spans_report_the_service_of_their_request_span(self):
+        generator = Tracer('vela-generator', exporter=self.exporter, enabled=True)
+        with generator.span('POST /sleep', kind='server'):
+            with self.tracer.span('stage.tts'):
+                pass
+        with self.tracer.span('GET /plans', kind='server'):
+            pass
+
+        spans = self.exported()
+        self.assertEqual(spans['POST /sleep']['service'], 'vela-generator')
+        self.assertEqual(spans['stage.tts']['service'], 'vela-generator')
+        self.assertEqual(spans['GET /plans']['service'], 'test')
+        self.assertEqual(self.tracer.service_name, 'test')
+
+    def test_unsampled_and_malformed_parents(self):
+        self.assertIsNone(SpanContext.parse('not-a-traceparent'))
+        unsampled = SpanContext.parse('00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00')
+        with self.tracer.span('POST /calm', parent=unsampled) as span:
+            self.assertIsNone(span)
+        self.exporter.export.assert_not_called()
+
+
+@skipUnless(METRICS_ENABLED, 'prometheus_client is not installed')
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsEndpointTest(APITestCase):
+    def scrape(self):
+        from prometheus_client.parser import text_string_to_metric_families
+
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+
+    def test_requests_are_counted_per_view(self):
+        key = ('vela_http_requests_total', (('method', 'GET'), ('status', '200'), ('view', 'plans')))
+        before = self.scrape().get(key, 0)
+        self.client.get('/api/auth/plans/')
+        samples = self.scrape()
+
+        self.assertEqual(samples[key], before + 1)
+        self.assertIn(('vela_db_queries_per_request_count', (('view', 'plans'),)), samples)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_provider_outcomes(self):
+        self.assertEqual(provider_outcome(), 'ok')
+        self.assertEqual(provider_outcome(MagicMock(status_code=429)), 'throttled')
+        self.assertEqual(provider_outcome(ValueError('bad response')), 'error')
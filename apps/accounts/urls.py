@@ -27,6 +27,12 @@ from apps.accounts.views import (
 	UserLifeVisionStatsView,
 	ExternalMeditationAPIView,
 	MeditationGenerateDetailView,
+	GenerationQueueStatsView,
+	GenerationEstimateView,
+	RevoiceMeditationView,
+	RemixMeditationView,
+	MeditationWaveformView,
+	MeditationLibraryWaveformView,
 	CustomUserDetailUpdateView,
 	DeviceTokenRegistrationView,
 	GetDeviceTokensView,
@@ -51,8 +57,15 @@ urlpatterns = [
 	# External Meditation API
 	path('meditation/external/', ExternalMeditationAPIView.as_view(), name='external-meditation'),
 	
+	# Generation Queue Stats API
+	path('meditation/queue-stats/', GenerationQueueStatsView.as_view(), name='generation-queue-stats'),
+	path('meditation/estimate/', GenerationEstimateView.as_view(), name='generation-estimate'),
+	
 	# Meditation Detail API
 	path('meditation/<int:meditation_id>/', MeditationGenerateDetailView.as_view(), name='meditation-detail'),
+	path('meditation/<int:meditation_id>/revoice/', RevoiceMeditationView.as_view(), name='meditation-revoice'),
+	path('meditation/<int:meditation_id>/remix/', RemixMeditationView.as_view(), name='meditation-remix'),
+	path('meditation/<int:meditation_id>/waveform/', MeditationWaveformView.as_view(), name='meditation-waveform'),
  
 	# Like Meditation API
 	path('like-meditation/<int:id>/', LikeMeditationView.as_view(), name='like-meditation'),
@@ -66,6 +79,7 @@ urlpatterns = [
  
 	# Meditation Library API
 	path('meditation-library/', MeditationLibraryView.as_view(), name='meditation-library'),
+	path('meditation-library/<int:library_id>/waveform/', MeditationLibraryWaveformView.as_view(), name='meditation-library-waveform'),
  
 	# Delete Meditation API
 	path('delete-meditation/<int:id>/', DeleteMeditationView.as_view(), name='delete-meditation'),
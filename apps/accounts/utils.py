@@ -72,4 +72,73 @@ def get_or_create_user_detail(user):
             'happiness': ''
         }
     )
-    return user_detail 
\ No newline at end of file
+    return user_detail 
+
+
+def get_plan_type(user_plan):
+    """
+    Get the type of a user plan if it is still within its validity window
+    
+    Uses the same validity windows as plan checks elsewhere: free trial 5 days,
+    monthly 30 days, annual 365 days.
+    
+    Args:
+        user_plan: The UserPlan object
+        
+    Returns:
+        str: 'annual', 'monthly' or 'free_trial', or None if expired
+    """
+    from django.utils import timezone
+    
+    now = timezone.now()
+    plan = user_plan.plan
+    if plan.is_free_trial:
+        if (now - user_plan.created_at).days <= 5:
+            return 'free_trial'
+    elif plan.is_monthly:
+        if (now - user_plan.start_date).days <= 30:
+            return 'monthly'
+    elif plan.is_annual:
+        if (now - user_plan.start_date).days <= 365:
+            return 'annual'
+    return None
+
+
+def get_active_user_plan(user):
+    """
+    Get the user's best currently valid plan (annual over monthly over free trial)
+    
+    Args:
+        user: The user object
+        
+    Returns:
+        UserPlan: The valid user plan, or None if the user has no valid plan
+    """
+    from apps.accounts.models import UserPlan
+    
+    if user is None or user.is_anonymous:
+        return None
+    
+    ranking = {'annual': 0, 'monthly': 1, 'free_trial': 2}
+    best_plan = None
+    best_rank = None
+    for user_plan in UserPlan.objects.filter(user=user, is_active=True).select_related('plan'):
+        plan_type = get_plan_type(user_plan)
+        if plan_type and (best_rank is None or ranking[plan_type] < best_rank):
+            best_plan = user_plan
+            best_rank = ranking[plan_type]
+    return best_plan
+
+
+def get_active_plan_type(user):
+    """
+    Get the type of the user's currently valid plan
+    
+    Args:
+        user: The user object
+        
+    Returns:
+        str: 'annual', 'monthly' or 'free_trial', or None if no valid plan
+    """
+    user_plan = get_active_user_plan(user)
+    return get_plan_type(user_plan) if user_plan else None
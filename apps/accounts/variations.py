@@ -0,0 +1,126 @@
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from apps.accounts.generate.functions import synthesize_script
+from apps.accounts.generate.dsp_pool import audio_pool
+from apps.accounts.generate.music import DEFAULT_MUSIC_PATH
+from apps.accounts.generate.timing import timed_stage
+from apps.accounts.models import MeditationGenerate, Rituals
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MUSIC_BEDS = {
+    'default': DEFAULT_MUSIC_PATH,
+}
+
+
+class VariationUnavailableError(Exception):
+    """Raised when a meditation has no stored script or speech to build a variation from"""
+
+
+def get_music_beds():
+    return getattr(settings, 'MEDITATION_MUSIC_BEDS', DEFAULT_MUSIC_BEDS)
+
+
+def store_generation_artifacts(meditation, checkpoint):
+    """
+    Keep the script and raw speech of a finished generation on its MeditationGenerate.
+
+    Args:
+        meditation: The saved MeditationGenerate.
+        checkpoint: GenerationCheckpoint holding the completed "script" and "speech" stages.
+    """
+    script = checkpoint.load('script')
+    speech = checkpoint.load('speech')
+    update_fields = ['updated_at']
+    if script is not None:
+        meditation.script = script.decode('utf-8')
+        update_fields.append('script')
+    if speech is not None:
+        meditation.speech_file.save(_file_name(meditation, 'speech'), ContentFile(speech), save=False)
+        update_fields.append('speech_file')
+    meditation.save(update_fields=update_fields)
+
+
+def _file_name(meditation, suffix):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ritual_type_name = meditation.ritual_type.name.lower().replace(' ', '_')
+    return f"meditation_{ritual_type_name}_{timestamp}_{suffix}.mp3"
+
+
+class MeditationVariationService:
+    """
+    Create variations of a meditation from its stored script and speech.
+
+    Re-voicing synthesizes the stored script with another voice (no LLM
+    call); re-mixing mixes the stored speech with another music bed or gain
+    (no LLM or TTS call). Each variation is saved as a new MeditationGenerate
+    so the original stays available.
+    """
+
+    def revoice(self, meditation, voice):
+        if not meditation.script:
+            raise VariationUnavailableError("This meditation has no stored script to re-voice.")
+
+        with timed_stage("tts"):
+            speech = synthesize_script(meditation.script, voice)
+        mixed = self._mix(speech, meditation.music_bed, meditation.music_gain, meditation.speech_gain)
+        return self._create_variation(
+            meditation, mixed, speech=speech, voice=voice
+        )
+
+    def remix(self, meditation, music_bed=None, music_gain=None, speech_gain=None):
+        if not meditation.speech_file:
+            raise VariationUnavailableError("This meditation has no stored speech to re-mix.")
+
+        music_bed = music_bed or meditation.music_bed
+        music_gain = meditation.music_gain if music_gain is None else music_gain
+        speech_gain = meditation.speech_gain if speech_gain is None else speech_gain
+
+        with meditation.speech_file.open('rb') as f:
+            speech = f.read()
+        mixed = self._mix(speech, music_bed, music_gain, speech_gain)
+        return self._create_variation(
+            meditation, mixed, speech_file=meditation.speech_file.name,
+            music_bed=music_bed, music_gain=music_gain, speech_gain=speech_gain
+        )
+
+    def _mix(self, speech, music_bed, music_gain, speech_gain):
+        music_path = get_music_beds().get(music_bed, DEFAULT_MUSIC_PATH)
+        with timed_stage("mix"):
+            return audio_pool.mix(speech, music_path=music_path, music_gain=music_gain, speech_gain=speech_gain)
+
+    def _create_variation(self, source, mixed, speech=None, speech_file=None, voice=None,
+                          music_bed=None, music_gain=None, speech_gain=None):
+        ritual = source.details
+        with transaction.atomic():
+            details = Rituals.objects.create(
+                name=ritual.name,
+                description=ritual.description,
+                ritual_type=ritual.ritual_type,
+                tone=ritual.tone,
+                voice=voice or ritual.voice,
+                duration=ritual.duration,
+            )
+            variation = MeditationGenerate(
+                user=source.user,
+                details=details,
+                ritual_type=source.ritual_type,
+                script=source.script,
+                music_bed=music_bed or source.music_bed,
+                music_gain=source.music_gain if music_gain is None else music_gain,
+                speech_gain=source.speech_gain if speech_gain is None else speech_gain,
+            )
+            variation.file.save(_file_name(source, 'variation'), ContentFile(mixed), save=False)
+            if speech is not None:
+                variation.speech_file.save(_file_name(source, 'speech'), ContentFile(speech), save=False)
+            else:
+                # Re-mixes share the source's speech file
+                variation.speech_file.name = speech_file
+            variation.save()
+        logger.info(f"Created variation {variation.id} of meditation {source.id}")
+        return variation
@@ -1,10 +1,11 @@
 import requests
 import json
 import logging
+import math
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -12,6 +13,7 @@ from django.conf import settings
 from urllib.parse import urlparse, parse_qs
 
 from django.core.files.base import ContentFile
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
 from django.shortcuts import get_object_or_404
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -25,17 +27,38 @@ from apps.accounts.serializers import (
 	PasswordUpdateSerializer, PlanSerializer, CombinedProfileSerializer,
 	UserCheckInSerializer, MeditationGenerateListSerializer, MeditationLibraryListSerializer, RitualTypeListSerializer,
 	UserLifeVisionSerializer, UserLifeVisionListSerializer, UserLifeVisionCreateSerializer, UserLifeVisionUpdateSerializer,
-	ExternalMeditationSerializer, ExternalMeditationWithUserCheckSerializer, CustomUserDetailUpdateSerializer
+	ExternalMeditationSerializer, ExternalMeditationWithUserCheckSerializer, CustomUserDetailUpdateSerializer,
+	RevoiceMeditationSerializer, RemixMeditationSerializer
 )
 from apps.accounts.services import GoogleLoginService, FacebookLoginService, ExternalMeditationService
-from apps.accounts.models import LikeMeditation, Plans, MeditationGenerate, MeditationLibrary, UserPlan, UserLifeVision, CustomUserDetail, UserDeviceToken
+from apps.accounts.models import LikeMeditation, Plans, MeditationGenerate, MeditationLibrary, RitualType, UserPlan, UserLifeVision, CustomUserDetail, UserDeviceToken
 from apps.accounts.utils import get_user_from_token, get_user_from_request, get_or_create_user_detail
+from apps.accounts.idempotency import IdempotencyService, SingleFlightTimeout
+from apps.accounts.scheduling import generation_scheduler
+from apps.accounts.rate_limit import generation_limiter
+from apps.accounts.backpressure import generation_estimator
+from apps.accounts.fallback import fallback_catalog
+from apps.accounts.generate.timing import stage_stats, recent_traces
+from apps.accounts.generate.llm_router import llm_router
+from apps.accounts.generate.metrics import render_metrics, scrape_allowed
+from apps.accounts.generate.tokens import token_stats
+from apps.accounts.variations import MeditationVariationService, VariationUnavailableError
+from apps.accounts.media import (
+    is_protected, token_allows, user_can_access, send_media, protected_media_url, media_version, media_version_for_path
+)
+from apps.accounts.waveforms import waveform_exists, waveform_name, schedule_waveform
+from config.exceptions import GenerationCapacityError, GenerationRateLimitError
 
 User = get_user_model()
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+	'Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+	description="Unique key per logical request. Retries with the same key return the original result."
+)
+
 
 class GoogleLoginAPIView(APIView):
 	permission_classes = [AllowAny]
@@ -433,49 +456,107 @@ class CombinedProfileView(APIView):
 					"file_url": openapi.Schema(type=openapi.TYPE_STRING, description="URL to the generated meditation file"),
 				}
 			),
-			400: "Bad Request: Validation error"
+			400: "Bad Request: Validation error",
+			409: "Conflict: An identical request is still being generated",
+			422: "Unprocessable: Idempotency-Key reused with a different request",
+			429: "Too Many Requests: Generation rate limit reached, see Retry-After",
+			503: "Service Unavailable: Generation is overloaded, see Retry-After"
 		},
-		operation_description="Create or update user profile and generate meditation based on plan type.",
+		manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+		operation_description="Create or update user profile and generate meditation based on plan type. Send an Idempotency-Key header to safely retry the request without generating the meditation twice.",
 		tags=['Profile']
 	)
 	def post(self, request):
 		serializer = CombinedProfileSerializer(data=request.data, context={'request': request})
 		if serializer.is_valid():
 			try:
-				result = serializer.save()
-				
-				# Get the latest meditation file for this user
-				latest_meditation = MeditationGenerate.objects.filter(
-					user=request.user
-				).order_by('-created_at').first()
+				def produce():
+					# Shed load before consuming rate limit tokens or queueing
+					try:
+						estimate = generation_estimator.admit(request.user, 'local')
+					except GenerationCapacityError:
+						# Serve a pre-rendered meditation instead of a 503 while the fallback tier has one for the plan type
+						plan_type_name = RitualType.objects.filter(
+							id=serializer.validated_data['plan_type']
+						).values_list('name', flat=True).first()
+						if not fallback_catalog.available(plan_type_name):
+							raise
+						estimate = None
+					if estimate is None:
+						# Fallback records are upgraded by a full render later, so they spend the same tokens
+						with generation_limiter.acquire(request.user):
+							result = serializer.save(fallback_reason=MeditationGenerate.FallbackReason.OVERLOAD)
+						queue_wait = 0
+					else:
+						with generation_limiter.acquire(request.user), generation_scheduler.slot(request.user) as ticket:
+							result = serializer.save()
+						queue_wait = ticket.waited
+					
+					# Get the latest meditation file for this user
+					latest_meditation = MeditationGenerate.objects.visible().filter(
+						user=request.user
+					).order_by('-created_at').first()
+					
+					# Build response with file URL
+					response_data = {
+						"message": "Profile updated and meditation generated successfully",
+						"meditation_id": result['meditation_id'],
+						"is_preview": result.get('is_preview', False),
+						"is_fallback": result.get('is_fallback', False),
+						"user_detail": {
+							"id": result['user_detail'].id,
+							"dream": result['user_detail'].dream,
+							"goals": result['user_detail'].goals,
+							"age_range": result['user_detail'].age_range,
+							"gender": result['user_detail'].gender,
+							"happiness": result['user_detail'].happiness,
+						},
+						"ritual": {
+							"id": result['ritual'].id if result['ritual'] else None,
+							"name": result['ritual'].name if result['ritual'] else None,
+							"description": result['ritual'].description if result['ritual'] else None,
+							"ritual_type": result['ritual'].ritual_type if result['ritual'] else None,
+							"tone": result['ritual'].tone if result['ritual'] else None,
+							"voice": result['ritual'].voice if result['ritual'] else None,
+							"duration": result['ritual'].duration if result['ritual'] else None,
+						} if result['ritual'] else None
+					}
+					
+					# Return response with file URL if meditation was generated
+					if latest_meditation and latest_meditation.file:
+						response_data["file_url"] = protected_media_url(
+							latest_meditation.file.name, request.user, request, version=media_version(latest_meditation)
+						)
+					
+					if result.get('stream_path'):
+						response_data["stream_url"] = protected_media_url(
+							result['stream_path'], request.user, request, scope=result['stream_path'].rsplit('/', 1)[0] + '/'
+						)
+					
+					response_data["eta_seconds"] = estimate['estimated_completion_seconds'] if estimate else 0
+					response_data["queue_wait_seconds"] = round(queue_wait, 1)
+					return response_data, status.HTTP_201_CREATED
 				
-				# Build response with file URL
-				response_data = {
-					"message": "Profile updated and meditation generated successfully",
-					"user_detail": {
-						"id": result['user_detail'].id,
-						"dream": result['user_detail'].dream,
-						"goals": result['user_detail'].goals,
-						"age_range": result['user_detail'].age_range,
-						"gender": result['user_detail'].gender,
-						"happiness": result['user_detail'].happiness,
-					},
-					"ritual": {
-						"id": result['ritual'].id if result['ritual'] else None,
-						"name": result['ritual'].name if result['ritual'] else None,
-						"description": result['ritual'].description if result['ritual'] else None,
-						"ritual_type": result['ritual'].ritual_type if result['ritual'] else None,
-						"tone": result['ritual'].tone if result['ritual'] else None,
-						"voice": result['ritual'].voice if result['ritual'] else None,
-						"duration": result['ritual'].duration if result['ritual'] else None,
-					} if result['ritual'] else None
-				}
-				
-				# Return response with file URL if meditation was generated
-				if latest_meditation and latest_meditation.file:
-					response_data["file_url"] = request.build_absolute_uri(latest_meditation.file.url)
-				
-				return Response(response_data, status=status.HTTP_201_CREATED)
+				# Retries with the same Idempotency-Key (or identical concurrent requests) share one generation
+				response_data, status_code, replayed = IdempotencyService().execute(
+					request, 'combined-profile', request.data, produce
+				)
+				response = Response(response_data, status=status_code)
+				if replayed:
+					response['Idempotent-Replayed'] = 'true'
+				return response
+			except SingleFlightTimeout:
+				return Response({
+					"error": "An identical meditation request is still being generated. Please retry shortly."
+				}, status=status.HTTP_409_CONFLICT)
+			except GenerationCapacityError as e:
+				return Response({
+					"error": str(e.detail)
+				}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(math.ceil(e.wait or 30))})
+			except GenerationRateLimitError as e:
+				return Response({
+					"error": str(e.detail)
+				}, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(math.ceil(e.wait or 1))})
 			except Exception as e:
 				return Response({
 					"error": f"Failed to process request: {str(e)}"
@@ -493,7 +574,7 @@ class LikeMeditationView(APIView):
 	)
 	def get(self, request, *args, **kwargs):
 		meditation_id = kwargs.get('id')
-		meditation = get_object_or_404(MeditationGenerate, id=meditation_id)
+		meditation = get_object_or_404(MeditationGenerate.objects.visible(), id=meditation_id)
 		like_meditation = LikeMeditation.objects.filter(user=request.user, meditation=meditation).first()
 		
 		if not like_meditation:
@@ -513,7 +594,7 @@ class UnlikeMeditationView(APIView):
 	)
 	def get(self, request, *args, **kwargs):
 		meditation_id = kwargs.get('id')
-		meditation = get_object_or_404(MeditationGenerate, id=meditation_id)
+		meditation = get_object_or_404(MeditationGenerate.objects.visible(), id=meditation_id)
 		like_meditation = LikeMeditation.objects.filter(user=request.user, meditation=meditation).first()
 		
 		if like_meditation:
@@ -549,7 +630,7 @@ class MyMeditationView(APIView):
 		tags=['My Meditations']
 	)
 	def get(self, request):
-		meditations = MeditationGenerate.objects.filter(user=request.user, is_deleted=False)
+		meditations = MeditationGenerate.objects.active().filter(user=request.user)
 		serializer = MeditationGenerateListSerializer(meditations, many=True, context={'request': request})
 		return Response(serializer.data, status=status.HTTP_200_OK)
 	
@@ -578,7 +659,7 @@ class DeleteMeditationView(APIView):
 	)
 	def delete(self, request, *args, **kwargs):
 		meditation_id = kwargs.get('id')
-		meditation = get_object_or_404(MeditationGenerate, id=meditation_id)
+		meditation = get_object_or_404(MeditationGenerate.objects.visible(), id=meditation_id)
 		meditation.is_deleted = True
 		meditation.save()
 		return Response({"message": "Meditation deleted successfully."}, status=status.HTTP_200_OK)
@@ -593,7 +674,7 @@ class RestoreMeditationView(APIView):
 		tags=['Meditation Library']
 	)
 	def get(self, request, *args, **kwargs):
-		meditations = MeditationGenerate.objects.all().filter(is_deleted=True)
+		meditations = MeditationGenerate.objects.visible().filter(is_deleted=True)
 		serializer = MeditationGenerateListSerializer(meditations, many=True, context={'request': request})
 		return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -776,9 +857,9 @@ class CountMeditationView(APIView):
 	)
 	def get(self, request):
 		user = request.user
-		meditations = MeditationGenerate.objects.filter(user=user, is_deleted=False)
+		meditations = MeditationGenerate.objects.active().filter(user=user)
 		count = meditations.count()
-		archive_meditations = MeditationGenerate.objects.filter(user=user, is_deleted=True)		
+		archive_meditations = MeditationGenerate.objects.visible().filter(user=user, is_deleted=True)		
 		archive_count = archive_meditations.count()
 		return Response({"count": count, "archive_count": archive_count}, status=status.HTTP_200_OK)
 
@@ -1015,8 +1096,13 @@ class ExternalMeditationAPIView(APIView):
             ),
             400: "Bad Request: Invalid plan type or missing required fields",
             401: "Unauthorized: User must be authenticated",
-            500: "Internal Server Error: API request failed"
+            409: "Conflict: An identical request is still being generated",
+            422: "Unprocessable: Idempotency-Key reused with a different request",
+            429: "Too Many Requests: Generation rate limit reached, see Retry-After",
+            500: "Internal Server Error: API request failed",
+            503: "Service Unavailable: Generation is overloaded, see Retry-After"
         },
+        manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
         operation_description="Send meditation request to external API based on plan type ID. This endpoint checks if the user exists in MeditationGenerate model. If user exists, only plan_type, ritual_type, tone, voice, duration are required. If user doesn't exist, all fields are required (gender, dream, goals, age_range, happiness, plan_type, ritual_type, tone, voice, duration). The plan_type field should be a valid RitualType ID that exists in the database. For choice fields, send keys instead of values: ritual_type ('story', 'guided'), tone ('dreamy', 'asmr'), voice ('male', 'female'), duration ('2', '5', '10'). The response includes the plan type name, saved file URL and meditation record ID.",
         tags=['External Meditation API']
     )
@@ -1040,22 +1126,51 @@ class ExternalMeditationAPIView(APIView):
                     "user_exists_in_meditation": user_exists_in_meditation
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Process the meditation request using the service
-            meditation_service = ExternalMeditationService()
-            result = meditation_service.process_meditation_request(
-                user=request.user,
-                validated_data=serializer.validated_data
-            )
-            
-            # Add user existence information to the response
-            result["user_exists_in_meditation"] = user_exists_in_meditation
+            def produce():
+                # Process the meditation request using the service
+                meditation_service = ExternalMeditationService()
+                # Shed load before consuming rate limit tokens or queueing
+                estimate = generation_estimator.admit(request.user, 'external')
+                with generation_limiter.acquire(request.user), generation_scheduler.slot(request.user) as ticket:
+                    result = meditation_service.process_meditation_request(
+                        user=request.user,
+                        validated_data=serializer.validated_data
+                    )
+                
+                # Add user existence information to the response
+                result["user_exists_in_meditation"] = user_exists_in_meditation
+                result["eta_seconds"] = estimate['estimated_completion_seconds']
+                result["queue_wait_seconds"] = round(ticket.waited, 1)
+                
+                # Return the result - always return 200 if we have a meditation_id (successful creation)
+                if result.get("meditation_id"):
+                    return result, status.HTTP_200_OK
+                return result, status.HTTP_500_INTERNAL_SERVER_ERROR
             
-            # Return the result - always return 200 if we have a meditation_id (successful creation)
-            if result.get("meditation_id"):
-                return Response(result, status=status.HTTP_200_OK)
-            else:
-                return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Retries with the same Idempotency-Key (or identical concurrent requests) share one generation
+            result, status_code, replayed = IdempotencyService().execute(
+                request, 'external-meditation', request.data, produce
+            )
+            response = Response(result, status=status_code)
+            if replayed:
+                response['Idempotent-Replayed'] = 'true'
+            return response
                 
+        except SingleFlightTimeout:
+            return Response({
+                "success": False,
+                "error": "An identical meditation request is still being generated. Please retry shortly."
+            }, status=status.HTTP_409_CONFLICT)
+        except GenerationCapacityError as e:
+            return Response({
+                "success": False,
+                "error": str(e.detail)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(math.ceil(e.wait or 30))})
+        except GenerationRateLimitError as e:
+            return Response({
+                "success": False,
+                "error": str(e.detail)
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(math.ceil(e.wait or 1))})
         except UnicodeDecodeError as e:
             logger.error(f"Unicode decode error in ExternalMeditationAPIView: {str(e)}")
             logger.error(f"Error details: position {e.start}, reason: {e.reason}")
@@ -1092,7 +1207,7 @@ class MeditationGenerateDetailView(APIView):
         try:
             # Get the meditation record, ensuring it belongs to the authenticated user
             meditation = get_object_or_404(
-                MeditationGenerate, 
+                MeditationGenerate.objects.visible(), 
                 id=meditation_id, 
                 user=request.user
             )
@@ -1102,7 +1217,7 @@ class MeditationGenerateDetailView(APIView):
             
             return Response(serializer.data, status=status.HTTP_200_OK)
             
-        except MeditationGenerate.DoesNotExist:
+        except Http404:
             return Response({
                 "error": "Meditation not found"
             }, status=status.HTTP_404_NOT_FOUND)
@@ -1113,6 +1228,206 @@ class MeditationGenerateDetailView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class RevoiceMeditationView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Re-voice a meditation",
+        operation_description="Synthesize the stored script of a meditation with a different voice and mix it again, skipping the LLM. The result is saved as a new meditation.",
+        tags=['Meditation'],
+        request_body=RevoiceMeditationSerializer,
+        responses={
+            201: MeditationGenerateListSerializer(),
+            404: "Meditation not found",
+            409: "Conflict: The meditation has no stored script",
+            429: "Too Many Requests: Generation rate limit reached, see Retry-After",
+            503: "Service Unavailable: Generation is overloaded, see Retry-After"
+        }
+    )
+    def post(self, request, meditation_id):
+        meditation = get_object_or_404(MeditationGenerate.objects.active(), id=meditation_id, user=request.user)
+        serializer = RevoiceMeditationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            with generation_limiter.acquire(request.user), generation_scheduler.slot(request.user):
+                variation = MeditationVariationService().revoice(meditation, serializer.validated_data['voice'])
+        except VariationUnavailableError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except GenerationCapacityError as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(math.ceil(e.wait or 30))})
+        except GenerationRateLimitError as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(math.ceil(e.wait or 1))})
+        except Exception as e:
+            logger.error(f"Error re-voicing meditation {meditation_id}: {str(e)}")
+            return Response({
+                "error": "An error occurred while re-voicing the meditation"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response(
+            MeditationGenerateListSerializer(variation, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class RemixMeditationView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Re-mix a meditation",
+        operation_description="Mix the stored speech of a meditation with a different music bed or gain, skipping the LLM and speech synthesis. The result is saved as a new meditation.",
+        tags=['Meditation'],
+        request_body=RemixMeditationSerializer,
+        responses={
+            201: MeditationGenerateListSerializer(),
+            404: "Meditation not found",
+            409: "Conflict: The meditation has no stored speech",
+            429: "Too Many Requests: Generation rate limit reached, see Retry-After",
+            503: "Service Unavailable: Generation is overloaded, see Retry-After"
+        }
+    )
+    def post(self, request, meditation_id):
+        meditation = get_object_or_404(MeditationGenerate.objects.active(), id=meditation_id, user=request.user)
+        serializer = RemixMeditationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            # Decoding, mixing and encoding are CPU heavy, so re-mixes are admitted like generations
+            with generation_limiter.acquire(request.user), generation_scheduler.slot(request.user):
+                variation = MeditationVariationService().remix(meditation, **serializer.validated_data)
+        except VariationUnavailableError as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except GenerationCapacityError as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": str(math.ceil(e.wait or 30))})
+        except GenerationRateLimitError as e:
+            return Response({
+                "error": str(e.detail)
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(math.ceil(e.wait or 1))})
+        except Exception as e:
+            logger.error(f"Error re-mixing meditation {meditation_id}: {str(e)}")
+            return Response({
+                "error": "An error occurred while re-mixing the meditation"
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response(
+            MeditationGenerateListSerializer(variation, context={'request': request}).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+def waveform_response(field_file, request, protected, version=None):
+    """
+    Serve the waveform peaks of an audio file, or 202 while they are computed.
+    """
+    if not field_file:
+        raise Http404("No audio file")
+    if not waveform_exists(field_file):
+        schedule_waveform(field_file)
+        return Response(
+            {"detail": "The waveform is being computed."},
+            status=status.HTTP_202_ACCEPTED, headers={"Retry-After": "5"}
+        )
+    # Versioned requests (?v=) are cached for a year like other media
+    return send_media(request, waveform_name(field_file.name), protected=protected, version=version)
+
+
+class MeditationWaveformView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Meditation waveform",
+        operation_description="Precomputed min/max waveform peaks of a meditation as JSON: {\"buckets\": n, \"peaks\": [min0, max0, ...]} scaled to -128..127. Use the versioned waveform_url from the meditation list for long-lived caching.",
+        tags=['Meditation'],
+        responses={
+            200: "Waveform peaks",
+            202: "Accepted: The waveform is being computed, see Retry-After",
+            304: "Not Modified",
+            404: "Meditation not found"
+        }
+    )
+    def get(self, request, meditation_id):
+        meditation = get_object_or_404(MeditationGenerate.objects.active(), id=meditation_id, user=request.user)
+        return waveform_response(meditation.file, request, protected=True, version=media_version(meditation))
+
+
+class MeditationLibraryWaveformView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Library meditation waveform",
+        operation_description="Precomputed min/max waveform peaks of a library meditation, in the same format as the meditation waveform.",
+        tags=['Meditation Library'],
+        responses={
+            200: "Waveform peaks",
+            202: "Accepted: The waveform is being computed, see Retry-After",
+            304: "Not Modified",
+            404: "Library meditation not found"
+        }
+    )
+    def get(self, request, library_id):
+        library = get_object_or_404(MeditationLibrary, id=library_id, is_deleted=False)
+        return waveform_response(library.file, request, protected=False, version=media_version(library))
+
+
+class GenerationEstimateView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Estimated meditation generation time",
+        operation_description="Estimate how long a new meditation generation would take for the authenticated user, based on the current queue and recent stage durations. Use pipeline=external for the external meditation endpoint.",
+        tags=['Meditation'],
+        manual_parameters=[
+            openapi.Parameter('pipeline', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['local', 'external'], required=False)
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "queue_depth": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "jobs_ahead": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "expected_job_seconds": openapi.Schema(type=openapi.TYPE_NUMBER),
+                    "estimated_queue_seconds": openapi.Schema(type=openapi.TYPE_NUMBER),
+                    "estimated_completion_seconds": openapi.Schema(type=openapi.TYPE_NUMBER),
+                    "accepting": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                }
+            )
+        }
+    )
+    def get(self, request):
+        pipeline = 'external' if request.query_params.get('pipeline') == 'external' else 'local'
+        estimate = generation_estimator.estimate(request.user, pipeline)
+        estimate['accepting'] = estimate['estimated_completion_seconds'] <= generation_estimator.max_wait
+        return Response(estimate, status=status.HTTP_200_OK)
+
+
+class GenerationQueueStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_summary="Generation queue statistics",
+        operation_description="Queue depth, active generations, queue-wait time per plan priority class, rate limiter counters, stage durations, LLM backend wins/latencies and LLM tokens per ritual type for the serving worker.",
+        tags=['Meditation'],
+        responses={
+            200: "Generation queue statistics",
+            403: "Forbidden"
+        }
+    )
+    def get(self, request):
+        stats = generation_scheduler.stats()
+        stats['rate_limiter'] = generation_limiter.metrics()
+        stats['stage_durations'] = stage_stats.snapshot()
+        stats['generation_traces'] = list(recent_traces)
+        stats['llm_backends'] = llm_router.stats()
+        stats['llm_tokens'] = token_stats.snapshot()
+        return Response(stats, status=status.HTTP_200_OK)
+
+
 class DeviceTokenRegistrationView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -1669,4 +1984,44 @@ class GenerateFCMTokenView(APIView):
             'message': 'Valid FCM token format generated for testing',
             'token_format': 'fMEP0vJqR0:APA91bH... (152 characters)',
             'note': 'This is a test token format. For real notifications, use actual FCM tokens from mobile apps.'
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+def protected_media_view(request, path, token=None):
+    """
+    Serve media files, checking ownership of generated meditations.
+
+    Files under PROTECTED_MEDIA_PREFIXES need a signed token in the URL
+    (/media/s/<token>/<path>) or an authenticated owner (or staff user);
+    anything else is served as before. The transfer itself is handed to the
+    front proxy or to a byte-range FileResponse by send_media.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    protected = is_protected(path)
+    if protected:
+        allowed = token_allows(token, path) if token else user_can_access(get_user_from_request(request), path)
+        if not allowed:
+            # Same answer as a missing file so other users' files cannot be probed
+            raise Http404("File not found")
+    # Only versioned requests need the owner's current version
+    requested = request.GET.get('v')
+    version = media_version_for_path(path, requested) if requested else None
+    return send_media(request, path, protected=protected, version=version)
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics of all API workers (request latency, database queries,
+    generation queue and stages, provider errors, ElevenLabs quota, push results).
+
+    Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; without
+    a configured token the endpoint does not exist.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if not scrape_allowed(request.headers.get('Authorization'), getattr(settings, 'METRICS_TOKEN', '')):
+        raise Http404("Page not found")
+    body, content_type = render_metrics()
+    if body is None:
+        raise Http404("Metrics are disabled")
+    return HttpResponse(body, content_type=content_type)
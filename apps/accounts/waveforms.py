@@ -0,0 +1,82 @@
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.accounts.generate.dsp_pool import audio_pool
+from apps.accounts.renditions import schedule_background
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'waveform:pending:{}'
+
+
+def waveform_name(name):
+    """
+    Storage name of a file's waveform peaks: <dir>/waveforms/<stem>.json
+    """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'waveforms', f"{stem}.json")
+
+
+def waveform_exists(field_file):
+    return bool(field_file) and os.path.isfile(field_file.storage.path(waveform_name(field_file.name)))
+
+
+def compute_waveform(field_file):
+    """
+    Compute the min/max peaks of an audio FileField if they are missing.
+
+    The work runs in the audio process pool; the JSON is written next to
+    the audio under waveforms/ and served like any other media file.
+
+    Returns:
+        str: Storage name of the peaks file, or None if there is no audio file.
+    """
+    if not field_file:
+        return None
+    storage = field_file.storage
+    source_path = storage.path(field_file.name)
+    if not os.path.isfile(source_path):
+        return None
+
+    name = waveform_name(field_file.name)
+    target_path = storage.path(name)
+    if os.path.exists(target_path):
+        return name
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    # A job of another worker may be writing the same waveform
+    temp_path = f"{target_path}.{uuid.uuid4().hex}.part"
+    try:
+        audio_pool.peaks(source_path, temp_path, buckets=getattr(settings, 'WAVEFORM_BUCKETS', 1000))
+        os.replace(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    logger.info(f"Created waveform {name} ({os.path.getsize(target_path)} bytes)")
+    return name
+
+
+def schedule_waveform(field_file):
+    """
+    Compute waveform peaks of a saved file in the background.
+
+    A job already pending for the file (from any worker) is not scheduled
+    again, so clients polling the 202 response do not queue duplicates.
+    """
+    if not getattr(settings, 'WAVEFORMS_ENABLED', True) or not field_file:
+        return
+    key = PENDING_KEY.format(field_file.name)
+    if not cache.add(key, 1, timeout=getattr(settings, 'WAVEFORM_PENDING_TIMEOUT', 600)):
+        return
+    schedule_background(_compute_pending_waveform, field_file)
+
+
+def _compute_pending_waveform(field_file):
+    try:
+        return compute_waveform(field_file)
+    finally:
+        cache.delete(PENDING_KEY.format(field_file.name))
@@ -34,6 +34,24 @@ class MeditationGenerationError(APIException):
     default_detail = 'Failed to generate meditation. Please try again.'
     default_code = 'meditation_generation_failed'
 
+class GenerationCapacityError(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Meditation generation is at capacity. Please try again shortly.'
+    default_code = 'generation_capacity_exceeded'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+class GenerationRateLimitError(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'Too many meditation generation requests. Please try again later.'
+    default_code = 'generation_rate_limited'
+
+    def __init__(self, detail=None, code=None, wait=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
 def custom_exception_handler(exc, context):
     """
     Custom exception handler that provides appropriate HTTP status codes
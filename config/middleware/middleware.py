@@ -1,7 +1,15 @@
 # Import necessary modules and functions
-from django.http import JsonResponse
+import time
+
+from django.db import connection
+from django.http import Http404, JsonResponse
 from rest_framework import status
 
+from apps.accounts.generate.metrics import (
+    METRICS_ENABLED, http_requests, http_request_duration, db_queries, db_query_duration, db_queries_per_request
+)
+from apps.accounts.generate.tracing import tracer, SpanContext, TRACEPARENT_HEADER
+
 
 # Middleware for handling JSON error responses
 class JsonErrorResponseMiddleware:
@@ -14,6 +22,9 @@ class JsonErrorResponseMiddleware:
         return response
 
     def process_exception(self, request, exception):
+        # Http404 from plain Django views is left to Django (and Custom404Middleware)
+        if isinstance(exception, Http404):
+            return None
         # Process exceptions and return JSON error response
         error_message = str(exception)
         response_data = {"error": error_message}
@@ -43,3 +54,73 @@ class Custom404Middleware:
         data = {"detail": "Page not Found"}
         return JsonResponse(data, status=status.HTTP_404_NOT_FOUND)
 
+
+# Middleware recording a server span per request (W3C traceparent in and out)
+class TracingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        parent = SpanContext.parse(request.headers.get(TRACEPARENT_HEADER))
+        with tracer.span(f"{request.method} {request.path}", parent=parent, kind="server") as span:
+            response = self.get_response(request)
+            if span:
+                # Name by route so spans of the same view group together
+                match = getattr(request, 'resolver_match', None)
+                if match and match.route:
+                    span.name = f"{request.method} /{match.route}"
+                span.set_attribute("http.method", request.method)
+                span.set_attribute("http.target", request.path)
+                span.set_attribute("http.status_code", response.status_code)
+                if match:
+                    span.set_attribute("django.view", match.view_name or "")
+                # Lets clients and logs quote the trace of a slow request
+                response[TRACEPARENT_HEADER] = span.context.traceparent
+            return response
+
+
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+# Counts the database queries of a request and the time spent in them
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# Middleware recording request count, latency and database queries per view for /metrics
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not METRICS_ENABLED:
+            return self.get_response(request)
+
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            # Label by URL name, not path, so ids in URLs do not multiply the series
+            match = getattr(request, 'resolver_match', None)
+            view = (match.view_name if match else '') or 'unmatched'
+            method = request.method if request.method in HTTP_METHODS else 'OTHER'
+            http_requests.labels(view, method, status_code).inc()
+            http_request_duration.labels(view, method).observe(time.perf_counter() - started)
+            db_queries.labels(view).inc(queries.count)
+            db_query_duration.labels(view).inc(queries.seconds)
+            db_queries_per_request.labels(view).observe(queries.count)
@@ -46,6 +46,8 @@ LOCAL_MIDDLEWARE = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.middleware.MetricsMiddleware',
+    'config.middleware.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -229,6 +231,154 @@ DJANGO_SERVER_URL = os.environ.get('DJANGO_SERVER_URL', 'http://31.97.98.47:8080
 # External meditation API settings
 EXTERNAL_MEDITATION_API_ENABLED = os.environ.get('EXTERNAL_MEDITATION_API_ENABLED', 'False').lower() == 'true'
 
+# Cache (shared across gunicorn workers when REDIS_URL is set)
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Generation request deduplication
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))  # seconds
+SINGLE_FLIGHT_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 600))  # seconds
+
+# Generation scheduling (per worker process)
+GENERATION_MAX_CONCURRENCY = int(os.environ.get('GENERATION_MAX_CONCURRENCY', 4))
+GENERATION_QUEUE_TIMEOUT = int(os.environ.get('GENERATION_QUEUE_TIMEOUT', 600))  # seconds
+GENERATION_PRIORITY_WEIGHTS = {
+    'annual': 3.0,
+    'monthly': 2.0,
+    'free_trial': 1.0,
+    'none': 1.0,
+}
+# Priority points gained per second spent waiting, so lower classes are never starved
+GENERATION_PRIORITY_AGING = float(os.environ.get('GENERATION_PRIORITY_AGING', 1 / 30))
+
+# Generation rate limits for users without a valid plan (plan users get limits from their Plans row)
+GENERATION_RATE_LIMIT_DEFAULTS = {
+    'generations_per_hour': 3,
+    'generation_burst': 1,
+    'max_concurrent_generations': 1,
+}
+GENERATION_CONCURRENCY_RETRY_AFTER = int(os.environ.get('GENERATION_CONCURRENCY_RETRY_AFTER', 30))  # seconds
+
+# Backpressure: shed generation requests whose estimated completion exceeds this many seconds
+GENERATION_MAX_ESTIMATED_WAIT = int(os.environ.get('GENERATION_MAX_ESTIMATED_WAIT', 600))
+# Stage durations assumed until real measurements are available
+GENERATION_STAGE_DEFAULT_SECONDS = {
+    'llm': 20,
+    'tts': 60,
+    'mix': 10,
+}
+
+# Media delivery: hand transfers to the front proxy instead of streaming them from Python.
+# nginx: set MEDIA_ACCEL_REDIRECT_PREFIX to an `internal` location aliased to MEDIA_ROOT, e.g. /protected-media/
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+# Apache mod_xsendfile / lighttpd
+MEDIA_X_SENDFILE = os.environ.get('MEDIA_X_SENDFILE', 'False').lower() == 'true'
+# Lifetime of signed media URLs for generated meditations
+MEDIA_URL_TOKEN_MAX_AGE = int(os.environ.get('MEDIA_URL_TOKEN_MAX_AGE', 60 * 60 * 24 * 7))
+
+# Low-bitrate audio renditions, picked by clients with ?format=<name> or the Accept header
+AUDIO_RENDITIONS_ENABLED = os.environ.get('AUDIO_RENDITIONS_ENABLED', 'True').lower() == 'true'
+AUDIO_RENDITION_WORKERS = int(os.environ.get('AUDIO_RENDITION_WORKERS', 1))
+AUDIO_RENDITIONS = {
+    'opus': {'format': 'ogg', 'codec': 'libopus', 'bitrate': '32k', 'extension': 'ogg', 'content_types': ['audio/ogg', 'audio/opus']},
+    'aac': {'format': 'mp4', 'codec': 'aac', 'bitrate': '48k', 'extension': 'm4a', 'content_types': ['audio/mp4', 'audio/aac', 'audio/x-m4a']},
+}
+
+# Min/max waveform peaks computed in the background for every audio file
+WAVEFORMS_ENABLED = os.environ.get('WAVEFORMS_ENABLED', 'True').lower() == 'true'
+WAVEFORM_BUCKETS = int(os.environ.get('WAVEFORM_BUCKETS', 1000))
+# Seconds a scheduled waveform job blocks further scheduling for the same file
+WAVEFORM_PENDING_TIMEOUT = int(os.environ.get('WAVEFORM_PENDING_TIMEOUT', 600))
+
+# Durable storage for completed generation stages (script, speech, mix) so retries resume
+GENERATION_CHECKPOINT_DIR = os.environ.get('GENERATION_CHECKPOINT_DIR', os.path.join(BASE_DIR, 'generation_checkpoints'))
+# Checkpoints of jobs untouched this long are pruned by the nightly pregenerate_meditations run
+GENERATION_CHECKPOINT_TTL = 60 * 60 * 24  # seconds
+
+# Sentence-level TTS segment cache (read by the generation package from the environment):
+# TTS_SENTENCE_CACHE=True, TTS_CACHE_DIR, TTS_CACHE_MEMORY_MB=64, TTS_CACHE_DISK_MB=1024, TTS_SENTENCE_CONCURRENCY=3
+# ElevenLabs throttles (429, too_many_concurrent_requests, system_busy) are retried: TTS_THROTTLE_RETRIES=3,
+# TTS_THROTTLE_BACKOFF_SECONDS=1.0 (doubling, jittered)
+
+# LLM backends for script generation (read by the generation package from the environment):
+# LLM_BACKENDS="<model>:<key env var>,..." in failover order, LLM_HEDGE_PERCENTILE=95,
+# LLM_HEDGE_DELAY_SECONDS=20 (until enough latency samples), LLM_REQUEST_TIMEOUT=60
+
+# Cached LLM digest of long profiles (goals, dream life, happiness) used in generation prompts
+PROFILE_DIGEST_ENABLED = os.environ.get('PROFILE_DIGEST_ENABLED', 'True').lower() == 'true'
+# Profiles shorter than this (characters over the three fields) are sent as they are
+PROFILE_DIGEST_MIN_CHARS = int(os.environ.get('PROFILE_DIGEST_MIN_CHARS', 600))
+
+# Process pool for audio mixing/encoding (read by the generation package from the environment):
+# DSP_OFFLOAD=True, DSP_WORKERS=<cpus/2>, DSP_QUEUE_SIZE=8, DSP_QUEUE_TIMEOUT=60, DSP_TEMP_DIR=/dev/shm
+
+# Internal mixing format and MP3 output format (read by the generation package from the environment,
+# 0 keeps the decoded value; compare with python manage.py benchmark_mix):
+# MIX_SAMPLE_RATE=22050, MIX_CHANNELS=1, MIX_SAMPLE_WIDTH=2,
+# MIX_OUTPUT_SAMPLE_RATE=44100, MIX_OUTPUT_CHANNELS=2, MIX_OUTPUT_BITRATE=128k
+# Measured on a 10-minute speech mix with a cached bed (1 CPU, ffmpeg 6.0): 19.8s / 664 MB peak as decoded,
+# 13.5s / 365 MB with the internal format, 8.4s / 308 MB with MIX_OUTPUT_* matching it; same MP3 size.
+# On a 30-second clip with a cold bed the conversions cost about 1s more (5.6s vs 4.7s).
+
+# Generation memory profiling (read by the generation package from the environment): with
+# GENERATION_MEMORY_PROFILE=True every stage records tracemalloc peaks, RSS and the top allocation sites
+# in its generation trace (logged and listed by the queue statistics view);
+# GENERATION_MEMORY_TOP_SITES=10, GENERATION_MEMORY_TRACE_FRAMES=1, GENERATION_RSS_SAMPLE_INTERVAL=0.05
+
+# Distributed tracing across this API and the FastAPI generator (read from the environment by both):
+# TRACING_ENABLED=False, TRACE_SAMPLE_RATE=1.0, TRACE_SERVICE_NAME (vela-api / vela-generator),
+# TRACE_EXPORT_FILE=traces.jsonl (one span per line), TRACE_EXPORT_OTLP_URL (e.g. http://localhost:4318/v1/traces)
+
+# Prometheus metrics (read from the environment by the generation package): METRICS_ENABLED=True,
+# METRICS_ELEVENLABS_QUOTA_REFRESH=300. gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a shared
+# directory so /metrics aggregates all workers.
+# /metrics only exists when this is set; scrapers send "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Background music beds available for re-mixing meditations (name -> audio file)
+MEDITATION_MUSIC_BEDS = {
+    'default': 'music.mp3',
+}
+
+# Generic pre-rendered meditations served instead of a 503 when generation is overloaded
+# or a provider is out of quota; python manage.py upgrade_fallback_meditations personalizes them later
+MEDITATION_FALLBACK_ENABLED = os.environ.get('MEDITATION_FALLBACK_ENABLED', 'True').lower() == 'true'
+# Only entries of the requested plan type are served (others get a 503); then voice, then the closest
+# duration (minutes) is matched. Add an entry per plan type to cover every request.
+MEDITATION_FALLBACK_CATALOG = [
+    {'plan_type': 'Sleep Manifestation', 'voice': 'female', 'duration': 2, 'source': os.path.join(BASE_DIR, 'apps', 'accounts', 'muzic', 'sleep_manifestation.mp3')},
+]
+# After a provider quota error new requests go straight to the fallback tier for this long
+MEDITATION_FALLBACK_QUOTA_COOLDOWN = int(os.environ.get('MEDITATION_FALLBACK_QUOTA_COOLDOWN', 300))  # seconds
+
+# Segmented (HLS) output for streamed generation
+GENERATION_HLS_SEGMENT_SECONDS = int(os.environ.get('GENERATION_HLS_SEGMENT_SECONDS', 6))
+GENERATION_HLS_MERGE_MP3 = os.environ.get('GENERATION_HLS_MERGE_MP3', 'True').lower() == 'true'
+# Previews and streams whose background generation has not finished after this long (e.g. the worker
+# restarted) are rendered again by python manage.py upgrade_fallback_meditations
+GENERATION_STALE_PREVIEW_AFTER = int(os.environ.get('GENERATION_STALE_PREVIEW_AFTER', 3600))  # seconds
+
+# Nightly pre-generation (python manage.py pregenerate_meditations)
+PREGENERATION_ACTIVE_DAYS = int(os.environ.get('PREGENERATION_ACTIVE_DAYS', 7))
+PREGENERATION_RITUALS_PER_USER = int(os.environ.get('PREGENERATION_RITUALS_PER_USER', 1))
+PREGENERATION_WORKERS = int(os.environ.get('PREGENERATION_WORKERS', 2))
+# Concurrent Groq requests of the batched script generation
+PREGENERATION_LLM_CONCURRENCY = int(os.environ.get('PREGENERATION_LLM_CONCURRENCY', 4))
+PREGENERATION_TTL_HOURS = int(os.environ.get('PREGENERATION_TTL_HOURS', 36))
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -1,6 +1,5 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.static import serve
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -9,6 +8,8 @@ from drf_yasg.views import get_schema_view
 
 from rest_framework import permissions
 
+from apps.accounts.views import protected_media_view, metrics_view
+
 
 schema_view: get_schema_view = get_schema_view(
     openapi.Info(
@@ -25,6 +26,7 @@ schema_view: get_schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += [
@@ -39,5 +41,7 @@ urlpatterns += [
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-urlpatterns += [re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT, }, ), ]
+urlpatterns += [
+    re_path(r"^media/s/(?P<token>[^/]+)/(?P<path>.*)$", protected_media_view, name='protected-media-signed'),
+    re_path(r"^media/(?P<path>.*)$", protected_media_view, name='protected-media'),
+]
@@ -0,0 +1,22 @@
+# gunicorn config.wsgi picks this file up from the working directory
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus values here and /metrics sums them; the variable
+# must be set before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'vela-prometheus'))
+
+
+def on_starting(server):
+    # Values of a previous run would otherwise be added to this one's
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges (queued/active generations) of a dead worker
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)